@@ -1,15 +1,18 @@
 import customtkinter as ctk
 import threading
-import asyncio
 import speech_recognition as sr
-from Voice import speak, listen, generate_speech
+from Voice import speak, listen, prewarm_speech, warm_up_stt, get_audio_output
 from agent import get_agent
+from audio_capture import get_capture
+from barge_in import BargeInMonitor
 
 # Inställningar för utseende
 ctk.set_appearance_mode("Dark")  
 ctk.set_default_color_theme("dark-blue")
 
 class EnigmaApp(ctk.CTk):
+    READY_MESSAGE = "Enigma är redo. Jag lyssnar."
+
     def __init__(self):
         super().__init__()
 
@@ -30,6 +33,9 @@ class EnigmaApp(ctk.CTk):
         # create the ui
         self.setup_ui()
         
+        # the greeting is always the same, so have it in the tts cache before auto_start
+        prewarm_speech([self.READY_MESSAGE])
+
         # Start the listening automatically after 1 second
         self.after(1000, self.auto_start)
 
@@ -71,7 +77,7 @@ class EnigmaApp(ctk.CTk):
 
     def auto_start(self):
         """Funktion som körs automatiskt vid start"""
-        speak("Enigma är redo. Jag lyssnar.")
+        speak(self.READY_MESSAGE)
         self.start_listening()
 
     def toggle_listening(self):
@@ -99,12 +105,15 @@ class EnigmaApp(ctk.CTk):
     def process_voice_command_loop(self):
         """Den eviga loopen som lyssnar efter 'Enigma'"""
         r = sr.Recognizer()
-        r.pause_threshold = 1.0
+        r.pause_threshold = 1.0  # upper bound, the adaptive endpointer in Voice.py usually ends sooner
         
         try:
-            with sr.Microphone() as source:
+            # reads from the shared, always-open microphone instead of opening its own
+            with get_capture().source() as source:
                 self.status_label.configure(text="Kalibrerar...", text_color="yellow")
                 r.adjust_for_ambient_noise(source, duration=1.0)
+                warm_up_stt()  # load (or calibrate) before the first command, not during it
+                barge_in = BargeInMonitor(get_capture(), get_audio_output()).start()
                 
                 
                 # here is the loop that runs as long as self.listening is True
@@ -113,7 +122,8 @@ class EnigmaApp(ctk.CTk):
                     
                    
                     # listen (without timeout, so it listens forever until sound is heard)
-                    user_text = listen(recognizer=r, source=source, timeout=None)
+                    # the cheap spotter drops background chatter before the big whisper model runs
+                    user_text = listen(recognizer=r, source=source, timeout=None, wake_word="enigma")
                     
                     if user_text:
                         # WAKE WORD logic
@@ -141,8 +151,14 @@ class EnigmaApp(ctk.CTk):
                                         ai_reply = "." # silence if no answear
                                     else:
                                         self.log_message("Enigma", ai_reply)
-                                        # speak (this pauses listening temporarily which is good so it doesn't hear itself)
-                                        asyncio.run(generate_speech(ai_reply))
+                                        # speak and wait. the barge-in monitor keeps listening meanwhile,
+                                        # and saying "enigma" stops the answer (wait returns right away then)
+                                        speak(ai_reply, wait=True)
+                                        barge_position = barge_in.take_position()
+                                        if barge_position is not None:
+                                            source.reader.position = barge_position
+                                        else:
+                                            source.reader.skip_to_now()  # don't transcribe our own voice
                                     
                                 except Exception as e:
                                     self.log_message("System", f"Fel: {e}")
@@ -151,6 +167,8 @@ class EnigmaApp(ctk.CTk):
                             # Debug: show in the terminal wwhat it ignored
                             print(f"Ignorerade: '{user_text}' (Inget vakna-ord)", flush=True)
 
+                barge_in.stop()
+
         except Exception as e:
             print(f"Loop error: {e}")
             self.listening = False
@@ -1,16 +1,28 @@
+import asyncio
+import itertools
 import customtkinter as ctk
+import speech_recognition as sr
 import threading
 import math
 import time
 from PIL import Image, ImageTk
-from agent import get_agent
-from Voice import listen, speak
+from agent import get_agent, get_agent_loop
+from audio_capture import get_capture
+from barge_in import BargeInMonitor
+from Voice import listen, speak, speak_stream, prewarm_speech, warm_up_stt, get_audio_output, PRIORITY_OFFER
 
 # The look
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
 
 class EnigmaUI(ctk.CTk):
+    # What the screen monitor offers for each detected activity
+    HELP_OFFERS = {
+        "research": "Jag ser att du forskar på en hemsida. Vill du att jag skriver ner eller organiserar information om det du läser?",
+        "note_taking": "Jag ser att du skriver anteckningar. Kan jag organisera eller förbättra dem?",
+        "writing": "Du skriver något. Behöver du hjälp med stavning, struktur eller innehållet?",
+    }
+
     def __init__(self):
         super().__init__()
 
@@ -22,6 +34,8 @@ class EnigmaUI(ctk.CTk):
         # Varibles
         self.agent = None
         self.is_processing = False
+        self.in_flight = 0  # requests running on the agent loop
+        self.reply_ids = itertools.count(1)  # names the text mark of each streamed reply
         self.stop_listening = False
         self.screen_monitoring = False
         self.circle_radius = 60
@@ -66,6 +80,7 @@ class EnigmaUI(ctk.CTk):
 
         # Start the system
         self.animate_circle() 
+        prewarm_speech(list(self.HELP_OFFERS.values()))  # fixed phrases play straight from the tts cache
         threading.Thread(target=self.system_boot, daemon=True).start()
 
     def system_boot(self):
@@ -83,6 +98,11 @@ class EnigmaUI(ctk.CTk):
             self.log_to_chat("SYSTEM", step)
         
         self.agent = get_agent()
+        warm_up_stt()  # first run on a new computer calibrates here instead of on the first command
+        # keeps listening while we talk, saying the wake word cuts the answer off
+        self.barge_in = BargeInMonitor(get_capture(), get_audio_output(), self.wake_word,
+                                       on_barge_in=lambda position: self.log_to_chat("SYSTEM", "Avbruten."))
+        self.barge_in.start()
         self.log_to_chat("SYSTEM", "Ready.")
         
         threading.Thread(target=self.listen_loop, daemon=True).start()
@@ -110,40 +130,69 @@ class EnigmaUI(ctk.CTk):
             self.after(30, self.animate_circle)
         except: pass
 
-    def log_to_chat(self, sender, message):
-        """Skriver till terminalen"""
+    def log_to_chat(self, sender, message, reply=None):
+        """Skriver till terminalen. reply namnger ett strömmat svar, så att ENIGMA_MORE hamnar på rätt rad."""
         self.chat_display.configure(state="normal")
         if sender == "SYSTEM":
             self.chat_display.insert("end", f"> {message}\n")
         elif sender == "ENIGMA":
             self.chat_display.insert("end", f"\n[ENIGMA]: {message}\n")
+            if reply:
+                # right gravity: the mark follows each sentence inserted at it
+                self.chat_display.mark_set(reply, "end-2c")
+                self.chat_display.mark_gravity(reply, "right")
+        elif sender == "ENIGMA_MORE": # Next sentence of a streamed answer, after the previous one of the same reply
+            where = reply if reply in self.chat_display.mark_names() else "end-2c"
+            self.chat_display.insert(where, f" {message}")
         elif sender == "IGNORED": # To show that the microphone heard but ignored
             self.chat_display.insert("end", f"> (Hörde men ignorerade): {message}\n")
+        elif sender == "PARTIAL": # Live transcription, replaced on every update
+            # the live line is tagged, so lines logged after it (replies, typed input) are left alone
+            where = "end"
+            ranges = self.chat_display.tag_ranges("partial")
+            if ranges:
+                where = str(ranges[0])
+                self.chat_display.delete(ranges[0], ranges[-1])
+            if message:
+                self.chat_display.insert(where, f"> ... {message}\n", "partial")
         else:
             self.chat_display.insert("end", f"\n[USER]: {message}\n")
             
         self.chat_display.see("end")
         self.chat_display.configure(state="disabled")
 
-    def process_ai(self, user_text):
+    async def process_ai(self, user_text):
+        """Körs på agentens event-loop (get_agent_loop), flera meddelanden kan vara igång samtidigt."""
         if not self.agent: return
 
+        self.in_flight += 1
         self.is_processing = True
         self.header.configure(text="PROCESSING DATA...", text_color="#FF3300")
         
         try:
-            response = self.agent.invoke({"input": user_text})
-            ai_text = response.get("output", "Error.")
-            
-            self.log_to_chat("ENIGMA", ai_text)
-            self.header.configure(text="SYSTEM ONLINE", text_color="#00FFFF")
-            
-            threading.Thread(target=speak, args=(ai_text,), daemon=True).start()
+            # sentences are logged and spoken as the model writes them
+            speech = speak_stream()
+            said = []
+            reply = f"reply{next(self.reply_ids)}"
+
+            def on_sentence(sentence):
+                self.log_to_chat("ENIGMA" if not said else "ENIGMA_MORE", sentence, reply)
+                said.append(sentence)
+                speech.add(sentence)
+
+            try:
+                await self.agent.astream({"input": user_text}, on_sentence=on_sentence)
+            finally:
+                speech.close()
+                self.chat_display.mark_unset(reply)
             
         except Exception as e:
             self.log_to_chat("SYSTEM", f"Critical Failure: {e}")
         
-        self.is_processing = False
+        self.in_flight -= 1
+        self.is_processing = self.in_flight > 0
+        if not self.is_processing:
+            self.header.configure(text="SYSTEM ONLINE", text_color="#00FFFF")
 
     def on_enter_pressed(self, event):
         self.send_text()
@@ -155,23 +204,46 @@ class EnigmaUI(ctk.CTk):
         
         # IF your using the write function you dont need to write engima 
         self.log_to_chat("USER", text)
-        threading.Thread(target=self.process_ai, args=(text,), daemon=True).start()
+        # every message shares the agent's event loop instead of getting its own thread
+        asyncio.run_coroutine_threadsafe(self.process_ai(text), get_agent_loop())
 
     def listen_loop(self):
         """Lyssnar alltid men reagerar BARA på 'Enigma'"""
+        # one reader on the always-open microphone for the whole session. while we are
+        # busy the audio keeps landing in the ring buffer and is read when we get back.
+        r = sr.Recognizer()
+        r.pause_threshold = 0.6
+        r.dynamic_energy_threshold = False
+        source = get_capture().source()
+        r.adjust_for_ambient_noise(source, duration=0.5)
+
+        output = get_audio_output()
+        heard_ourselves = False
         while not self.stop_listening:
-            if not self.is_processing and self.agent:
+            if not self.is_processing and self.agent and not output.is_busy():
+                barge_position = self.barge_in.take_position()
+                if barge_position is not None:
+                    # the new turn starts where the user interrupted, "Enigma" included
+                    source.reader.position = barge_position
+                elif heard_ourselves:
+                    # the buffer is full of our own voice, nothing in it is for us
+                    source.reader.skip_to_now()
+                heard_ourselves = False
                 try:
-                    text = listen()
+                    text = listen(recognizer=r, source=source, wake_word=self.wake_word,
+                                  on_partial=lambda partial: self.log_to_chat("PARTIAL", partial))
+                    self.log_to_chat("PARTIAL", "")  # the final text replaces the live line
                     if text:
                         
                         if self.wake_word in text.lower():
                             self.log_to_chat("USER", f"(Röst) {text}")
-                            self.process_ai(text)
+                            asyncio.run_coroutine_threadsafe(self.process_ai(text), get_agent_loop()).result()
                         else:
                             pass
                 except: pass
-            time.sleep(0.5)
+            else:
+                heard_ourselves = heard_ourselves or output.is_busy()
+                time.sleep(0.05)
 
     def toggle_screen_monitoring(self):
         """Toggle screen monitoring on/off"""
@@ -221,18 +293,10 @@ class EnigmaUI(ctk.CTk):
                             (current_time - self.last_help_offered) > self.help_offer_cooldown):
                             
                             # Give help based on detected activity
-                            if activity == "research":
-                                message = "Jag ser att du forskar på en hemsida. Vill du att jag skriver ner eller organiserar information om det du läser?"
-                                self.log_to_chat("ENIGMA", message)
-                                threading.Thread(target=speak, args=(message,), daemon=True).start()
-                            elif activity == "note_taking":
-                                message = "Jag ser att du skriver anteckningar. Kan jag organisera eller förbättra dem?"
-                                self.log_to_chat("ENIGMA", message)
-                                threading.Thread(target=speak, args=(message,), daemon=True).start()
-                            elif activity == "writing":
-                                message = "Du skriver något. Behöver du hjälp med stavning, struktur eller innehållet?"
+                            message = self.HELP_OFFERS.get(activity)
+                            if message:
                                 self.log_to_chat("ENIGMA", message)
-                                threading.Thread(target=speak, args=(message,), daemon=True).start()
+                                speak(message, priority=PRIORITY_OFFER)
                             
                             # Logg detected words (first 100 characters)
                             text_preview = result.get("text", "")[:100]
@@ -2,11 +2,28 @@ import os
 import sys
 import threading
 import asyncio
+import queue
+import time
+import multiprocessing
+from collections import deque
+import numpy as np
 import pygame
 import speech_recognition as sr
-import edge_tts
 import re
+import hashlib
+import io
+import itertools
+import uuid
+from collections import OrderedDict
 from faster_whisper import WhisperModel
+from vad import Endpointer, SPEECH_START_S
+from wakeword import spot_wake_word, WAKE_WINDOW_S
+from whisper_setup import resolve_whisper_config
+from audio_capture import get_capture
+from echo import playback_reference
+from tts_backends import TTS_VOICE, TTS_RATE, ranked_backends, demote
+from stt_worker import get_stt_worker
+from config import STT_WORKER_PROCESS
 
 
 def add_nvidia_paths():
@@ -29,92 +46,697 @@ def add_nvidia_paths():
 if os.name == 'nt':
     add_nvidia_paths()
 
-# fast modell
-# medium is kinda 2-3x faster than large-v3 but understands swedish almost as good.
-WHISPER_SIZE = "medium" 
-DEVICE = "cuda"
+# the model is picked per computer (whisper_setup.py, overridable in config.py)
+# and only loaded the first time something needs it
+_whisper_model = None
+_whisper_lock = threading.Lock()
 
-print(f"Laddar Whisper ({WHISPER_SIZE}) på {DEVICE}...", flush=True)
+def get_whisper_model():
+    """Laddar Whisper med de inställningar som passar den här datorn."""
+    global _whisper_model
+    with _whisper_lock:
+        if _whisper_model is None:
+            cfg = resolve_whisper_config()
+            print(f"Laddar Whisper ({cfg['size']}, {cfg['compute_type']}) på {cfg['device']}...", flush=True)
+            try:
+                _whisper_model = WhisperModel(cfg["size"], device=cfg["device"], compute_type=cfg["compute_type"],
+                                              cpu_threads=cfg["cpu_threads"], num_workers=cfg["num_workers"])
+                print("Whisper är redo!", flush=True)
+            except Exception:
+                _whisper_model = WhisperModel(cfg["size"], device="cpu", compute_type="int8",
+                                              cpu_threads=cfg["cpu_threads"], num_workers=cfg["num_workers"])
+    return _whisper_model
 
-try:
-    # float16 is standard for rtx cards
-    whisper_model = WhisperModel(WHISPER_SIZE, device=DEVICE, compute_type="float16")
-    print("Whisper är redo (High Performance Mode)!", flush=True)
-except Exception:
-    whisper_model = WhisperModel(WHISPER_SIZE, device="cpu", compute_type="int8")
+def warm_up_stt():
+    """
+    Startar tal-till-text innan första kommandot: STT-processen (se stt_worker.py)
+    eller, om den är avstängd i config.py eller inte startar, modellen i den här processen.
+    """
+    if STT_WORKER_PROCESS:
+        worker = get_stt_worker()
+        if worker.wait_ready():
+            print(f"Whisper ({worker.cfg['size']}, {worker.cfg['compute_type']}) körs i en egen process.", flush=True)
+            return
+        print("STT-processen startade inte, kör Whisper här istället.", flush=True)
+    get_whisper_model()
 
-# sound initialization
-try:
-    pygame.mixer.init()
-except Exception:
-    pass
+# sound initialization (not in the stt worker process, which re-imports the main script)
+if multiprocessing.parent_process() is None:
+    try:
+        pygame.mixer.init()
+    except Exception:
+        pass
 
-def play_audio(filename):
+def play_audio(audio, cancel=None):
+    """
+    Spelar upp ljuddata (mp3/wav-bytes) direkt från minnet, eller en fil om en sökväg ges.
+    Avbryts direkt om cancel (threading.Event) sätts.
+    """
     try:
-        pygame.mixer.music.load(filename)
-        pygame.mixer.music.play()
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10)
-        pygame.mixer.music.unload()
+        # a Sound gets its own channel, so parallel calls don't fight over mixer.music
+        sound = pygame.mixer.Sound(file=io.BytesIO(audio) if isinstance(audio, (bytes, bytearray)) else audio)
+        # what we play is the reference the echo gate compares the mic against (barge-in)
+        try: segment = playback_reference.start(pygame.sndarray.array(sound), pygame.mixer.get_init()[0])
+        except Exception: segment = None
+        channel = sound.play()
+        while channel and channel.get_busy():
+            if cancel is not None and cancel.is_set():
+                channel.stop()
+                if segment: playback_reference.stop(segment)
+                break
+            pygame.time.Clock().tick(100)
     except Exception as e:
         print(f"Ljudfel: {e}")
 
-async def generate_speech_sentence(text, index):
-    if not text.strip(): return
-    output_file = f"temp_sent_{index}.mp3"
-    # 
-    communicate = edge_tts.Communicate(text, "sv-SE-SofieNeural", rate="+10%")
-    try:
-        await communicate.save(output_file)
-        if os.path.exists(output_file):
-            play_audio(output_file)
-            try: os.remove(output_file)
-            except: pass
-    except: pass
-
-async def generate_speech(text):
-    sentences = re.split(r'(?<=[.!?]) +', text)
-    for i, sentence in enumerate(sentences):
-        if sentence.strip():
-            await generate_speech_sentence(sentence, i)
-
-def speak(text):
+TTS_LOOKAHEAD = 2         # how many sentences synthesis may run ahead of playback
+MIN_SENTENCE_CHARS = 40   # shorter sentences are merged with the next one (one tts call instead of two)
+CANCEL_POLL_S = 0.05      # how often a stream waiting for the llm checks whether it was cancelled
+
+# marks the end of the synthesis queue
+_TTS_DONE = object()
+
+def split_sentences(text):
+    """Delar upp texten i meningar och slår ihop för korta meningar."""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?]) +', text) if s.strip()]
+    merged = []
+    pending = ""
+    for sentence in sentences:
+        pending = f"{pending} {sentence}".strip()
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            merged.append(pending)
+            pending = ""
+    if pending:
+        # a short tail rides along with the sentence before it
+        if merged: merged[-1] = f"{merged[-1]} {pending}"
+        else: merged.append(pending)
+    return merged
+
+TTS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache")
+TTS_CACHE_MAX_BYTES = 50 * 1024 * 1024
+TTS_MEMORY_CACHE_BYTES = 8 * 1024 * 1024  # hot phrases are served from ram
+CACHE_SUFFIX = ".audio"  # mp3 from edge-tts, wav from piper; pygame tells them apart itself
+
+class PhraseCache:
+    """
+    Ljudcache adresserad på (text, röst, hastighet), med LRU-rensning.
+    Heta fraser ligger i minnet, disken är bara till för att de ska överleva
+    omstarter och skrivs i bakgrunden, aldrig på talvägen.
+    Filernas mtime används som LRU-ordning på disk.
+    """
+
+    def __init__(self, folder=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, memory_bytes=TTS_MEMORY_CACHE_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # on disk: key -> size in bytes, least recently used first
+        self.memory = OrderedDict()   # in ram: key -> audio bytes, least recently used first
+        os.makedirs(folder, exist_ok=True)
+
+        for f in os.listdir(folder):
+            # leftovers from a write that was interrupted
+            if f.endswith(".part"):
+                try: os.remove(os.path.join(folder, f))
+                except OSError: pass
+        files = [f for f in os.listdir(folder) if f.endswith(CACHE_SUFFIX)]
+        files.sort(key=lambda f: os.path.getmtime(os.path.join(folder, f)))
+        for f in files:
+            self.entries[f[:-len(CACHE_SUFFIX)]] = os.path.getsize(os.path.join(folder, f))
+
+    @staticmethod
+    def key(text, voice=TTS_VOICE, rate=TTS_RATE):
+        return hashlib.sha256(f"{voice}|{rate}|{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, f"{key}{CACHE_SUFFIX}")
+
+    def get(self, key):
+        """Ljuddata för nyckeln, eller None. En träff flyttar posten längst bak i LRU-kön."""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                if key in self.entries: self.entries.move_to_end(key)
+                return self.memory[key]
+            if key not in self.entries: return None
+            self.entries.move_to_end(key)
+
+        # only the first hit after a restart reads the disk, after that it's in ram
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+            os.utime(self.path(key))
+        except OSError:
+            with self.lock: self.entries.pop(key, None)
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """Lägger ljuddata i minnet direkt och skriver till disk i en bakgrundstråd."""
+        self._remember(key, data)
+        threading.Thread(target=self._write, args=(key, data), daemon=True).start()
+
+    def _remember(self, key, data):
+        with self.lock:
+            self.memory[key] = data
+            self.memory.move_to_end(key)
+            total = sum(len(d) for d in self.memory.values())
+            while total > self.memory_bytes and len(self.memory) > 1:
+                old_key, old_data = self.memory.popitem(last=False)
+                total -= len(old_data)
+
+    def _write(self, key, data):
+        # unique temp name so two writers of the same phrase never share a half-written file
+        temp_file = os.path.join(self.folder, f"{key}.{uuid.uuid4().hex}.part")
+        try:
+            with open(temp_file, "wb") as f:
+                f.write(data)
+            os.replace(temp_file, self.path(key))
+        except OSError as e:
+            print(f"TTS-cache: kunde inte spara ({e})", flush=True)
+            try: os.remove(temp_file)
+            except OSError: pass
+            return
+        with self.lock:
+            self.entries[key] = len(data)
+            self.entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self.entries.values())
+        while total > self.max_bytes and len(self.entries) > 1:
+            old_key, size = self.entries.popitem(last=False)
+            total -= size
+            try: os.remove(self.path(old_key))
+            except OSError: pass
+
+# made on first use: the stt worker process re-imports this script, and a cache made
+# there would delete the .part files the parent's prewarm is still writing
+_phrase_cache = None
+_phrase_cache_lock = threading.Lock()
+
+def get_phrase_cache():
+    """Den gemensamma ljudcachen."""
+    global _phrase_cache
+    with _phrase_cache_lock:
+        if _phrase_cache is None:
+            _phrase_cache = PhraseCache()
+    return _phrase_cache
+
+async def synthesize_sentence(text):
+    """
+    Hämtar meningen ur cachen, annars syntetiseras den i minnet av den
+    snabbaste tillgängliga backend (se tts_backends.py). Returnerar ljudbytes (None vid fel).
+    """
+    for backend in await ranked_backends():
+        key = PhraseCache.key(text, backend.voice, backend.rate)
+        cached = get_phrase_cache().get(key)
+        if cached: return cached
+
+        try:
+            data = await backend.synthesize(text)
+        except Exception as e:
+            print(f"TTS-fel ({backend.name}): {e}", flush=True)
+            demote(backend)
+            continue
+        if data:
+            get_phrase_cache().put(key, data)
+            return data
+    return None
+
+async def prewarm_phrases(phrases):
+    """Syntetiserar kända fasta fraser i förväg så att de spelas direkt ur cachen."""
+    for phrase in phrases:
+        # same split as generate_speech, otherwise the cache keys would not match
+        for sentence in split_sentences(phrase):
+            await synthesize_sentence(sentence)
+
+def prewarm_speech(phrases):
+    """Förvärmer cachen i en egen tråd, blockerar inte anroparen."""
     def _run():
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(generate_speech(text))
-            loop.close()
-        except: pass
-    threading.Thread(target=_run).start()
-
-def listen(recognizer=None, source=None, timeout=None):
-    if recognizer: r = recognizer
-    else: r = sr.Recognizer()
+            asyncio.run(prewarm_phrases(phrases))
+        except Exception as e:
+            print(f"TTS-förvärmning misslyckades: {e}", flush=True)
+    threading.Thread(target=_run, daemon=True).start()
+
+async def generate_speech(text, cancel=None):
+    """
+    Läser upp texten. Syntesen ligger några meningar före uppspelningen,
+    så nästa mening är klar när den förra har spelats färdigt.
+    cancel (threading.Event) stoppar både syntes och uppspelning.
+    """
+    sentences = split_sentences(text)
+    if not sentences: return None
+    return await generate_speech_stream(sentences, cancel)
+
+async def generate_speech_stream(sentences, cancel=None):
+    """
+    Som generate_speech, men meningarna kan vara en lista eller en queue.Queue
+    som fylls medan vi läser upp (None avslutar kön).
+    """
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Queue(maxsize=TTS_LOOKAHEAD)
+    t_start = time.perf_counter()
+    stats = {"sentences": 0, "first_audio_ms": None, "gaps_ms": []}
+
+    async def _sentences():
+        if isinstance(sentences, queue.Queue):
+            while True:
+                sentence = await loop.run_in_executor(None, sentences.get)
+                if sentence is None: return
+                yield sentence
+        else:
+            for sentence in sentences:
+                yield sentence
+
+    async def _producer():
+        cancelled = False
+        try:
+            async for sentence in _sentences():
+                if cancel is not None and cancel.is_set(): break
+                stats["sentences"] += 1
+                audio = await synthesize_sentence(sentence)
+                if audio: await ready.put(audio)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # cancelled means playback is over: nobody reads ready, and it may be full
+            if not cancelled:
+                await ready.put(_TTS_DONE)
+
+    async def _next():
+        # cancel is a threading.Event set from other threads, it can't wake the loop:
+        # check it while waiting, a stream may wait on the llm for a long time
+        if cancel is None: return await ready.get()
+        while not cancel.is_set():
+            try:
+                return await asyncio.wait_for(ready.get(), CANCEL_POLL_S)
+            except asyncio.TimeoutError:
+                pass
+        return _TTS_DONE
+
+    producer = asyncio.create_task(_producer())
+    last_end = None
+    try:
+        while True:
+            audio = await _next()
+            if audio is _TTS_DONE: break
+            if cancel is not None and cancel.is_set(): break
+
+            t_play = time.perf_counter()
+            if last_end is None: stats["first_audio_ms"] = (t_play - t_start) * 1000
+            else: stats["gaps_ms"].append((t_play - last_end) * 1000)
+
+            # playback blocks, so it runs in a worker thread while the loop keeps synthesizing
+            await loop.run_in_executor(None, play_audio, audio, cancel)
+            last_end = time.perf_counter()
+    finally:
+        producer.cancel()
+        if isinstance(sentences, queue.Queue):
+            sentences.put(None)  # wakes the executor thread that may be waiting in sentences.get
+
+    if stats["first_audio_ms"] is not None:
+        gaps = stats["gaps_ms"]
+        gap_text = f"max {max(gaps):.0f} ms, snitt {sum(gaps) / len(gaps):.0f} ms" if gaps else "-"
+        print(f"TTS: {stats['sentences']} meningar | första ljud {stats['first_audio_ms']:.0f} ms | glapp {gap_text}", flush=True)
+    return stats
+
+# priorities for the audio output, lower number is more important
+PRIORITY_REPLY = 0  # answers to something the user asked
+PRIORITY_OFFER = 1  # unprompted things like the screen monitor offers
+
+# an utterance that waited longer than this in the queue is no longer relevant
+STALE_AFTER = {PRIORITY_REPLY: 30.0, PRIORITY_OFFER: 10.0}
+
+class Utterance:
+    _ids = itertools.count(1)
+
+    def __init__(self, text, priority, sentences=None):
+        self.id = next(Utterance._ids)
+        self.text = text
+        self.sentences = sentences  # queue.Queue when the text is still arriving
+        self.priority = priority
+        self.created = time.time()
+        self.cancel = threading.Event()
+        self.done = threading.Event()
 
-    
-    # optimize clip of silence
-    r.energy_threshold = 300
-    r.pause_threshold = 0.6  
-    r.dynamic_energy_threshold = False 
+class SpeechStream:
+    """Text som kommer mening för mening (t.ex. från en LLM-ström)."""
+
+    def __init__(self):
+        self.sentences = queue.Queue()
+        self.pending = ""
+        self.utterance = None
+
+    def add(self, sentence):
+        # same merging as split_sentences, a tts call per tiny sentence costs more than it saves
+        self.pending = f"{self.pending} {sentence}".strip()
+        if len(self.pending) >= MIN_SENTENCE_CHARS:
+            self.sentences.put(self.pending)
+            self.pending = ""
+
+    def close(self):
+        """Skickar det som är kvar och markerar att inget mer kommer."""
+        if self.pending:
+            self.sentences.put(self.pending)
+            self.pending = ""
+        self.sentences.put(None)
+
+class AudioOutput:
+    """
+    En enda långlivad tråd som äger mixern och tts-loopen och läser upp en sak i taget.
+    Svar går före erbjudanden, dubbletter och gamla poster slängs, och det som
+    spelas kan avbrytas.
+    """
+
+    def __init__(self):
+        self.queue = queue.PriorityQueue()  # (priority, id, utterance)
+        self.lock = threading.Lock()
+        self.pending = {}    # id -> queued utterance
+        self.current = None  # utterance being spoken right now
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def say(self, text, priority=PRIORITY_REPLY):
+        """Köar text för uppläsning. Returnerar Utterance, eller None om den var en dubblett."""
+        text = text.strip()
+        if not text: return None
+        with self.lock:
+            same_text = [u for u in self.pending.values() if u.text == text]
+            if self.current and self.current.text == text and not self.current.cancel.is_set():
+                same_text.append(self.current)
+            if same_text:
+                print(f"Ljud: hoppar över dubblett '{text[:40]}'", flush=True)
+                return None
+            utterance = Utterance(text, priority)
+            self.pending[utterance.id] = utterance
+            # an answer should not have to wait for a monitor offer to finish
+            if self.current and priority < self.current.priority:
+                self.current.cancel.set()
+        self.queue.put((priority, utterance.id, utterance))
+        return utterance
+
+    def say_stream(self, priority=PRIORITY_REPLY):
+        """Öppnar en SpeechStream: meningar som läggs till läses upp medan de kommer."""
+        stream = SpeechStream()
+        utterance = Utterance("", priority, sentences=stream.sentences)
+        stream.utterance = utterance
+        with self.lock:
+            self.pending[utterance.id] = utterance
+            if self.current and priority < self.current.priority:
+                self.current.cancel.set()
+        self.queue.put((priority, utterance.id, utterance))
+        return stream
+
+    def cancel_current(self):
+        """Avbryter det som läses upp just nu."""
+        with self.lock:
+            if self.current: self.current.cancel.set()
+
+    def cancel(self, utterance_id):
+        """Avbryter en köad eller pågående uppläsning."""
+        with self.lock:
+            utterance = self.pending.get(utterance_id)
+            if utterance is None and self.current and self.current.id == utterance_id:
+                utterance = self.current
+            if utterance: utterance.cancel.set()
+
+    def cancel_all(self):
+        """Tömmer kön och avbryter pågående uppläsning."""
+        with self.lock:
+            for utterance in self.pending.values():
+                utterance.cancel.set()
+            if self.current: self.current.cancel.set()
+
+    def is_speaking(self):
+        """True medan något spelas upp just nu."""
+        with self.lock:
+            return self.current is not None
+
+    def is_busy(self):
+        """True om något spelas eller väntar i kön."""
+        with self.lock:
+            return self.current is not None or bool(self.pending)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            priority, _, utterance = self.queue.get()
+            with self.lock:
+                self.pending.pop(utterance.id, None)
+                waited = time.time() - utterance.created
+                if utterance.cancel.is_set() or waited > STALE_AFTER.get(priority, 30.0):
+                    if not utterance.cancel.is_set():
+                        print(f"Ljud: slänger inaktuell '{utterance.text[:40]}' ({waited:.0f}s i kön)", flush=True)
+                    utterance.done.set()
+                    continue
+                self.current = utterance
+            try:
+                if utterance.sentences is not None:
+                    loop.run_until_complete(generate_speech_stream(utterance.sentences, cancel=utterance.cancel))
+                else:
+                    loop.run_until_complete(generate_speech(utterance.text, cancel=utterance.cancel))
+            except Exception as e:
+                print(f"Ljudfel: {e}", flush=True)
+            finally:
+                with self.lock: self.current = None
+                utterance.done.set()
+
+_audio_output = None
+_audio_output_lock = threading.Lock()
+
+def get_audio_output():
+    """Den gemensamma ljudutgången (skapas första gången)."""
+    global _audio_output
+    with _audio_output_lock:
+        if _audio_output is None:
+            _audio_output = AudioOutput()
+    return _audio_output
+
+def speak_stream(priority=PRIORITY_REPLY):
+    """Öppnar en ström på den gemensamma ljudutgången, se SpeechStream."""
+    return get_audio_output().say_stream(priority)
+
+def speak(text, priority=PRIORITY_REPLY, wait=False):
+    """Läser upp text via den gemensamma ljudutgången. wait=True blockerar tills den är klar."""
+    utterance = get_audio_output().say(text, priority)
+    if wait and utterance: utterance.done.wait()
+    return utterance
+
+# whisper wants 16 kHz mono float32 in [-1, 1]
+SAMPLE_RATE = 16000
+
+def audio_to_array(audio):
+    """Gör om sr.AudioData till en float32-array direkt i minnet (ingen wav-fil)."""
+    # the recognizer always records mono, so we only need to fix rate and width
+    raw = audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2)
+    return np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+
+# print the per-call timing line (benchmarks turn it off)
+STT_TIMING_LOG = True
+
+def transcribe_audio(audio, timings=None, prompt=None, model=None, beam_size=1):
+    """
+    Transkriberar sr.AudioData eller en färdig float32-array och mäter varje steg.
+    model/beam_size finns för benchmarks, listen() använder standardmodellen.
+    """
+    t_start = time.perf_counter()
+    samples = audio_to_array(audio) if isinstance(audio, sr.AudioData) else audio
+    t_converted = time.perf_counter()
+
+    # optimize beam size = 1 for faster results
+    # this makes it not "think" as much about the translation, which saves a lot of time.
+    text = None
+    if model is None and STT_WORKER_PROCESS:
+        worker = get_stt_worker()
+        try:
+            if worker.wait_ready():
+                text, _ = worker.transcribe(samples, prompt=prompt, beam_size=beam_size)
+        except Exception as e:
+            print(f"STT-processen misslyckades ({e}), kör Whisper här istället.", flush=True)
+    if text is None:
+        model = model or get_whisper_model()
+        segments, info = model.transcribe(samples, language="sv", beam_size=beam_size, initial_prompt=prompt)
+        # segments is a generator, the actual decoding happens while we join it
+        text = "".join([segment.text for segment in segments]).strip()
+    t_done = time.perf_counter()
+
+    stats = {
+        "audio_s": len(samples) / SAMPLE_RATE,
+        "convert_ms": (t_converted - t_start) * 1000,
+        "transcribe_ms": (t_done - t_converted) * 1000,
+        "total_ms": (t_done - t_start) * 1000,
+    }
+    if timings is not None:
+        timings.update(stats)
+    if STT_TIMING_LOG:
+        print(f"STT: {stats['audio_s']:.2f}s ljud | konvertering {stats['convert_ms']:.1f} ms | "
+              f"whisper {stats['transcribe_ms']:.0f} ms | totalt {stats['total_ms']:.0f} ms", flush=True)
+    return text
+
+UTTERANCE_PRE_ROLL = 0.3  # keep this much audio from before speech started
+
+def utterance_frames(r, src, timeout=None):
+    """
+    Läser ramar från källan och ger (ram, tal_i_ramen) från frasstart till frasslut.
+    Slutet avgörs av Endpointer (adaptivt brusgolv och efterhäng), med
+    r.pause_threshold som längsta tillåtna tystnad och vad.MAX_UTTERANCE_S som
+    längsta fras. Ger inget om timeout går ut.
+    """
+    frame_s = src.CHUNK / src.SAMPLE_RATE
+    endpointer = Endpointer(frame_s, energy_threshold=r.energy_threshold, max_hangover=r.pause_threshold)
+    # the endpointer starts SPEECH_START_S into the speech, the pre-roll has to cover that too
+    pre_roll = deque(maxlen=max(1, int((UTTERANCE_PRE_ROLL + SPEECH_START_S) / frame_s)))
+    waited_s = 0.0
+    started = False
+    while True:
+        buf = src.stream.read(src.CHUNK)
+        if not buf: return
+        state, speech = endpointer.process(buf)
+        if not started:
+            if state != "start":
+                pre_roll.append(buf)
+                waited_s += frame_s
+                if timeout and waited_s > timeout: return
+                continue
+            started = True
+            for old in pre_roll:
+                yield old, False
+        yield buf, speech
+        if state == "end":
+            ended = (f"efter {endpointer.silence_s * 1000:.0f} ms tystnad" if endpointer.utterance_s < endpointer.max_utterance
+                     else f"vid maxlängden {endpointer.max_utterance:.0f}s")
+            print(f"Frasslut {ended} (brusgolv {endpointer.noise_floor:.0f}, tröskel {endpointer.threshold:.0f})", flush=True)
+            return
+
+# streaming mode: the utterance is cut at short pauses and every chunk is transcribed
+# while the user is still talking, so only the last chunk is left when they stop
+STREAM_CHUNK_PAUSE = 0.25  # seconds of silence that closes a chunk
+STREAM_MIN_CHUNK = 1.0     # don't cut chunks shorter than this, whisper needs some context
+STREAM_MAX_CHUNK = 4.0     # force a cut in long runs without any pause
+STREAM_WAKE_OVERLAP = 1.0  # the end of the previous chunk is spotted again, so a wake word cut in two is heard
+
+def listen_streaming(r, src, timeout=None, on_partial=None, wake_word=None):
+    """Lyssnar och transkriberar bitvis under tiden användaren pratar."""
+    frame_s = src.CHUNK / src.SAMPLE_RATE
+
+    pieces = []
+    rejected = []
+    chunks = queue.Queue()
+
+    def _to_samples(frames):
+        return audio_to_array(sr.AudioData(b"".join(frames), src.SAMPLE_RATE, src.SAMPLE_WIDTH))
+
+    def _worker():
+        held = []       # chunks before the wake word, transcribed once it is heard
+        heard = []      # what the spotter heard in them
+        tail = np.zeros(0, dtype=np.float32)
+        accepted = not wake_word
+        offset_s = 0.0  # how much of the utterance has arrived
+        while True:
+            chunk = chunks.get()
+            if chunk is None: break
+            if rejected: continue
+            offset_s += len(chunk) / src.SAMPLE_RATE
+            todo = [chunk]
+            if not accepted:
+                # only the new chunk and a bit of the last one, not everything held: chatter
+                # that goes on and on costs the spotter the same per chunk
+                found, spotted = spot_wake_word(np.concatenate([tail, chunk]), wake_word, src.SAMPLE_RATE)
+                tail = chunk[-int(STREAM_WAKE_OVERLAP * src.SAMPLE_RATE):]
+                if spotted: heard.append(spotted)
+                if not found:
+                    held.append(chunk)
+                    if WAKE_WINDOW_S is not None and offset_s >= WAKE_WINDOW_S:
+                        # past the window without the wake word, drain the rest without the big model
+                        rejected.append(" ".join(heard))
+                    continue
+                accepted = True
+                todo = held + [chunk]
+                held.clear()
+            for piece_audio in todo:
+                try:
+                    # earlier chunks as prompt keeps spelling and context consistent across cuts
+                    piece = transcribe_audio(piece_audio, prompt=" ".join(pieces) or None)
+                except Exception as e:
+                    print(f"STT-fel (stream): {e}", flush=True)
+                    continue
+                if piece:
+                    pieces.append(piece)
+                    if on_partial: on_partial(" ".join(pieces))
+        if not accepted and not rejected and held:
+            rejected.append(" ".join(heard))
+        if rejected:
+            print(f"Ignorerade (spotter): '{rejected[0]}'", flush=True)
+
+    worker = threading.Thread(target=_worker, daemon=True)
+    worker.start()
+
+    frames = []
+    chunk_s = 0.0
+    silence_s = 0.0
+    heard_anything = False
+    try:
+        for buf, speech in utterance_frames(r, src, timeout):
+            heard_anything = True
+            frames.append(buf)
+            chunk_s += frame_s
+            silence_s = 0.0 if speech else silence_s + frame_s
+
+            if (silence_s >= STREAM_CHUNK_PAUSE and chunk_s >= STREAM_MIN_CHUNK) or chunk_s >= STREAM_MAX_CHUNK:
+                chunks.put(_to_samples(frames))
+                frames = []
+                chunk_s = 0.0
+
+        t_end_of_speech = time.perf_counter()
+        if frames: chunks.put(_to_samples(frames))
+    finally:
+        chunks.put(None)
+
+    if not heard_anything: return None
+    worker.join()
+    if rejected: return None
+    text = " ".join(pieces).strip()
+    print(f"STT (stream): slutlig text {(time.perf_counter() - t_end_of_speech) * 1000:.0f} ms efter tal-slut", flush=True)
+    return text
+
+def listen(recognizer=None, source=None, timeout=None, on_partial=None, wake_word=None):
+    """
+    Lyssnar efter en fras och returnerar texten (None vid tystnad/fel).
+    Med wake_word körs först en billig spotter, och stora modellen bara om den slår till.
+    """
+    if recognizer: r = recognizer
+    else:
+        r = sr.Recognizer()
+        # optimize clip of silence
+        # (only for our own recognizer, a caller's calibrated one is left alone)
+        # pause_threshold is the longest the endpointer may wait, it usually ends sooner
+        r.energy_threshold = 300
+        r.pause_threshold = 0.6  
+        r.dynamic_energy_threshold = False 
 
     def _listen_loop(src):
         print("Lyssnar...", flush=True)
         try:
-            audio = r.listen(src, timeout=timeout, phrase_time_limit=None)
-            
-            temp_wav = "temp_listen.wav"
-            with open(temp_wav, "wb") as f:
-                f.write(audio.get_wav_data())
-
-            
-            # optimize beam size = 1 for faster results
-            # this makes it not "think" as much about the translation, which saves a lot of time.
-            segments, info = whisper_model.transcribe(temp_wav, language="sv", beam_size=1)
-            text = "".join([segment.text for segment in segments]).strip()
-            
-            try: os.remove(temp_wav)
-            except: pass
+            if on_partial:
+                # partial hypotheses go to on_partial, the final one is returned
+                text = listen_streaming(r, src, timeout=timeout, on_partial=on_partial, wake_word=wake_word)
+            else:
+                frames = [buf for buf, speech in utterance_frames(r, src, timeout)]
+                if not frames: return None
+                samples = audio_to_array(sr.AudioData(b"".join(frames), src.SAMPLE_RATE, src.SAMPLE_WIDTH))
+
+                if wake_word:
+                    found, heard = spot_wake_word(samples, wake_word)
+                    if not found:
+                        print(f"Ignorerade (spotter): '{heard}'", flush=True)
+                        return None
+
+                # straight from the mic buffer to whisper, no temp_listen.wav round-trip
+                text = transcribe_audio(samples)
 
             if text:
                 print(f"Hörde: '{text}'", flush=True)
@@ -125,6 +747,7 @@ def listen(recognizer=None, source=None, timeout=None):
 
     if source: return _listen_loop(source)
     else:
-        with sr.Microphone() as source:
-            if not recognizer: r.adjust_for_ambient_noise(source, duration=0.5)
-            return _listen_loop(source)
\ No newline at end of file
+        # the microphone is always open, we just start reading from it (plus a little pre-roll)
+        capture = get_capture()
+        if not recognizer: r.energy_threshold = capture.ambient_threshold()
+        return _listen_loop(capture.source())
\ No newline at end of file
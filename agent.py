@@ -1,165 +1,634 @@
+import asyncio
+import importlib
 import json
 import re
-import pygetwindow as gw
-from langchain_ollama import ChatOllama
-from config import MODEL_NAME, TEMPERATURE
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from llm_clients import get_llm
+from intent_router import route, router_stats
+from llm_metrics import llm_stats, tool_call_stats
+from response_cache import response_cache
+from conversation_memory import ConversationMemory
+from tool_prefetch import speculate
+from pydantic import ValidationError
 
+# tool -> module, imported only when an agent gets the tool. the desktop tools pull in
+# pygetwindow, pyautogui and spotify at import, which agent_server.py on linux can't
+TOOL_MODULES = {
+    "improve_active_document": "tools.editors_tools",
+    "read_active_document": "tools.editors_tools",
+    "write_to_document": "tools.editors_tools",
+    "get_current_time": "tools.time_tools",
+    "open_application": "tools.system_tools",
+    "play_music": "tools.spotify_tools",
+    "create_word_document": "tools.office_tools",
+    "create_notes_document": "tools.office_tools",
+    "create_research_document": "tools.office_tools",
+    "search_web": "tools.web_tools",
+    "create_documentation": "tools.file_tools",
+    "take_screenshot": "tools.screen_tools",
+    "describe_screen": "tools.screen_tools",
+}
 
-from tools.system_tools import open_application 
-from tools.file_tools import create_documentation
-from tools.screen_tools import take_screenshot, describe_screen
-from tools.spotify_tools import play_music
-from tools.web_tools import search_web 
-from tools.office_tools import create_word_document, create_notes_document, create_research_document
-from tools.time_tools import get_current_time
+def load_tools(tool_names=None):
+    """Verktygen i tool_names (None = alla), bara deras moduler importeras."""
+    return [getattr(importlib.import_module(module), name) for name, module in TOOL_MODULES.items()
+            if tool_names is None or name in tool_names]
 
-from tools.editors_tools import improve_active_document, read_active_document, write_to_document
+# the system prompt in sections. build_prompt leaves out every section that names a tool the
+# agent doesn't have, so agent_server.py's sessions aren't told about the desktop tools
+PROMPT_SECTIONS = [
+"""Du är Enigma. En kraftfull AI-assistent som styr datorn.
+""",
+"""=== VERKTYG ===
+Du anropar verktygen med funktionsanrop (tool calls). Namn och parametrar för varje verktyg får du separat.
+- Behövs ett verktyg: anropa det direkt, ingen förklaring före.
+- Skriv ALDRIG verktygsanropet som JSON eller text i svaret.
+- Behövs inget verktyg: svara naturligt på svenska.
+""",
+"""=== PRIORITETORDER FÖR KOMMANDON ===
+BÖRJA ALLTID MED DENNA CHECKLIST:
+1. Innehåller ordet "fakta" eller "forskning"? → create_research_document
+2. Innehåller ordet "Word" eller "word"? → create_notes_document
+3. Innehåller "strukturera", "rätta", "förbättra"? → improve_active_document
+4. Är det en faktafråga om politik/nyheter/händelser? → search_web
+5. Annat? → svara naturligt
+""",
+"""=== REGLER FÖR FAKTAFRÅGOR ===
+KRITISKT: Om användaren frågor om:
+- Nuvarande politiker, presidenter, statsministrar eller regeringsledare
+- Aktuella nyheter, händelser eller händelser från senaste tiden
+- Fakta om länder, städer, personer eller organisationer
+- NÅGOT som kan ha ändrats sedan träningsdata
+DÅ MÅSTE du OMEDELBART anropa search_web. ALDRIG förklaringar!
+""",
+"""=== REGLER FÖR TEXTHANTERING ===
+1. Om användaren säger "strukturera", "rätta", "förbättra", "polera" texten → anropa improve_active_document direkt
+2. Ingen förklaring före anropet!
+3. Du är en EXPERT på att redigera text.
+4. VÄGRA ALDRIG att redigera text.
+""",
+"""=== REGLER FÖR ANTECKNINGAR & FORSKNING ===
+TRIGGER KEYWORDS FÖR create_research_document:
+- Något innehållande "fakta om"
+- Något innehållande "forskning om"
+- Något innehållande "skriv fakta"
+- Något innehållande "word" OCH ett ämne/fråga
+→ ALLTID create_research_document, ALDRIG något annat!
 
-def get_agent():
-    # keep_alive="1h" Makes the modell faster
-    llm = ChatOllama(model=MODEL_NAME, temperature=TEMPERATURE, keep_alive="1h") 
-    
-    tools = [improve_active_document, read_active_document, write_to_document, get_current_time, open_application, play_music, create_word_document, create_notes_document, create_research_document, search_web, create_documentation, take_screenshot, describe_screen]
-
-    prompt_text = """Du är Enigma. En kraftfull AI-assistent som styr datorn.
-
-    === KRITISK REGEL: JSONONLY ===
-    NÄR DU ANVÄNDER ETT VERKTYG:
-    - Returnera ENDAST giltigt JSON
-    - INGEN förklaring, INGEN text före/efter JSON
-    - Formatet: {"name": "verktygsnamn", "parameters": {PARAMETRAR}}
-
-    === PRIORITETORDER FÖR KOMMANDON ===
-    BÖRJA ALLTID MED DENNA CHECKLIST:
-    1. Innehåller ordet "fakta" eller "forskning"? → create_research_document
-    2. Innehåller ordet "Word" eller "word"? → create_notes_document
-    3. Innehåller "strukturera", "rätta", "förbättra"? → improve_active_document
-    4. Är det en faktafråga om politik/nyheter/händelser? → search_web
-    5. Annat? → svara naturligt
-
-    === REGLER FÖR FAKTAFRÅGOR ===
-    KRITISKT: Om användaren frågor om:
-    - Nuvarande politiker, presidenter, statsministrar eller regeringsledare
-    - Aktuella nyheter, händelser eller händelser från senaste tiden
-    - Fakta om länder, städer, personer eller organisationer
-    - NÅGOT som kan ha ändrats sedan träningsdata
-    DÅ MÅSTE du OMEDELBAR returnera JSON för search_web. ALDRIG förklaringar!
-
-    === REGLER FÖR TEXTHANTERING ===
-    1. Om användaren säger "strukturera", "rätta", "förbättra", "polera" texten → OMEDELBAR JSON för improve_active_document
-    2. Ingen förklaring, bara JSON!
-    3. Du är en EXPERT på att redigera text.
-    4. VÄGRA ALDRIG att redigera text.
-
-    === REGLER FÖR ANTECKNINGAR & FORSKNING ===
-    TRIGGER KEYWORDS FÖR create_research_document:
-    - Något innehållande "fakta om"
-    - Något innehållande "forskning om"
-    - Något innehållande "skriv fakta"
-    - Något innehållande "word" OCH ett ämne/fråga
-    → ALLTID create_research_document, ALDRIG något annat!
-    
-    TRIGGER KEYWORDS FÖR create_notes_document:
-    - "skriv ner" UTAN "fakta"
-    - "anteckningar" UTAN "fakta"
-    - "word" UTAN ämne/fråga
-    
-    VIKTIGT:
-    - create_research_document: Googla, sammanfatta, skriv till Word
-    - create_notes_document: Bara skriva anteckningar utan att googla
-
-    === TILLGÄNGLIGA VERKTYG ===
-    - "create_research_document": Googla, sammanfatta och skriv till Word. {"name": "create_research_document", "parameters": {"topic": "ämnet", "filename": "namn"}}
-    - "create_notes_document": Öppna Word och skriv anteckningar. {"name": "create_notes_document", "parameters": {"content": "texten", "filename": "namn"}}
-    - "search_web": Sök information. {"name": "search_web", "parameters": {"query": "söksträng"}}
-    - "improve_active_document": Redigera aktiv text. {"name": "improve_active_document", "parameters": {"instruction": "vad ska göras"}}
-    - "describe_screen": Beskriver vad som visas på skärmen. {"name": "describe_screen", "parameters": {}}
-    - "open_application": Starta program. {"name": "open_application", "parameters": {"app_name": "namn"}}
-    - "get_current_time": Tid. {"name": "get_current_time", "parameters": {}}
-
-    === RÄTTA EXEMPEL (JSON ONLY) ===
-    User: "Enigma öppna word och skriv fakta om vad Trump gjorde"
-    AI RESPONSE: {"name": "create_research_document", "parameters": {"topic": "Trump verksamhet och presidentperiod", "filename": "Trump Fakta"}}
-    
-    User: "Skriv fakta av vad Trump gjorde under sin period"
-    AI RESPONSE: {"name": "create_research_document", "parameters": {"topic": "Trump presidentperiod verksamhet", "filename": "Trump Information"}}
-    
-    User: "Öppna word och skriv mitt möte anteckningar"
-    AI RESPONSE: {"name": "create_notes_document", "parameters": {"content": "Mötesanteckningar från dagens möte", "filename": "Mötesanteckningar"}}
-    
-    User: "Vem är Sveriges statsminister?"
-    AI RESPONSE: {"name": "search_web", "parameters": {"query": "Sveriges statsminister 2026"}}
-    
-    User: "Strukturera min text"
-    AI RESPONSE: {"name": "improve_active_document", "parameters": {"instruction": "Strukturera texten för bättre läsbarhet"}}
-    
-    INGEN förklaring, INGEN intro, INGEN outro. BARA JSON!
+TRIGGER KEYWORDS FÖR create_notes_document:
+- "skriv ner" UTAN "fakta"
+- "anteckningar" UTAN "fakta"
+- "word" UTAN ämne/fråga
+
+VIKTIGT:
+- create_research_document: Googla, sammanfatta, skriv till Word
+- create_notes_document: Bara skriva anteckningar utan att googla
+""",
+"=== NÄR VERKTYGEN ANVÄNDS ===",
+"- create_research_document: Googla, sammanfatta och skriv till Word.",
+"- create_notes_document: Öppna Word och skriv anteckningar.",
+"- search_web: Sök information.",
+"- improve_active_document: Redigera aktiv text.",
+"- describe_screen: Beskriver vad som visas på skärmen.",
+"- open_application: Starta program.",
+"""- get_current_time: Tid och datum.
+""",
+"=== RÄTTA EXEMPEL ===",
+"""User: "Enigma öppna word och skriv fakta om vad Trump gjorde"
+→ create_research_document(topic="Trump verksamhet och presidentperiod", filename="Trump Fakta")
+""",
+"""User: "Skriv fakta av vad Trump gjorde under sin period"
+→ create_research_document(topic="Trump presidentperiod verksamhet", filename="Trump Information")
+""",
+"""User: "Öppna word och skriv mitt möte anteckningar"
+→ create_notes_document(content="Mötesanteckningar från dagens möte", filename="Mötesanteckningar")
+""",
+"""User: "Vem är Sveriges statsminister?"
+→ search_web(query="Sveriges statsminister 2026")
+""",
+"""User: "Strukturera min text"
+→ improve_active_document(instruction="Strukturera texten för bättre läsbarhet")
+""",
+"""Ett verktygsanrop är bara anropet, INGEN förklaring, INGEN intro, INGEN outro.""",
+]
+
+def build_prompt(tool_names):
+    """Systemprompten utan de delar som nämner verktyg utanför tool_names."""
+    missing = [name for name in TOOL_MODULES if name not in tool_names]
+    return "\n".join(section for section in PROMPT_SECTIONS if not any(name in section for name in missing))
+
+# a sentence ends at . ! ? followed by whitespace, or at a line break.
+# requiring the whitespace means "3." at the end of a chunk waits for the next one.
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+class SentenceSplitter:
+    """Plockar ut hela meningar ur text som kommer bit för bit."""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        parts = SENTENCE_END.split(self.buffer)
+        self.buffer = parts.pop()
+        return [p.strip() for p in parts if p.strip()]
+
+    def flush(self):
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+def split_into_sentences(text):
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+def stream_sentences(chunks, on_sentence):
+    """Skickar varje färdig mening ur en LLM-ström till on_sentence och returnerar hela texten."""
+    splitter = SentenceSplitter()
+    content = ""
+    for chunk in chunks:
+        content += chunk.content
+        for sentence in splitter.feed(chunk.content):
+            on_sentence(sentence)
+    for sentence in splitter.flush():
+        on_sentence(sentence)
+    return content
+
+# names the model has invented for real tools
+TOOL_ALIASES = {"Fakta": "search_web", "edit_document": "improve_active_document", "open_app": "open_application"}
+
+def find_json_object(text):
+    """Det första kompletta {...}-objektet i texten, eller None om inget har stängts än."""
+    start = text.find("{")
+    if start < 0: return None
+    depth = 0
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped: escaped = False
+            elif c == "\\": escaped = True
+            elif c == '"': in_string = False
+        elif c == '"': in_string = True
+        elif c == "{": depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0: return text[start:i + 1]
+    return None
+
+def say_sentences(text, on_sentence):
+    for sentence in split_into_sentences(text):
+        on_sentence(sentence)
+
+async def astream_sentences(chunks, on_sentence):
+    """Som stream_sentences, för en asynkron LLM-ström."""
+    splitter = SentenceSplitter()
+    content = ""
+    async for chunk in chunks:
+        content += chunk.content
+        for sentence in splitter.feed(chunk.content):
+            on_sentence(sentence)
+    for sentence in splitter.flush():
+        on_sentence(sentence)
+    return content
+
+class StreamTurn:
+    """
+    Ett strömmat svar bit för bit: hela meningar går till on_sentence, text som
+    ser ut som JSON hålls tillbaka, och feed() svarar True så fort ett
+    verktygsanrop är klart (då finns det i tool_call).
+    """
+
+    def __init__(self, agent, on_sentence):
+        self.agent = agent
+        self.on_sentence = on_sentence
+        self.splitter = SentenceSplitter()
+        self.t_start = time.perf_counter()
+        self.content = ""
+        self.fed = 0          # how much of content has gone through the splitter
+        self.holding = False  # a "{" showed up after fed, this is probably a tool call and must not be spoken
+        self.tool_call = None
+        self.ttft_ms = None
+        self.metadata = {}
+
+    def feed(self, chunk):
+        if self.ttft_ms is None and (chunk.content or chunk.tool_calls):
+            self.ttft_ms = (time.perf_counter() - self.t_start) * 1000
+        # the eval counters come with the last chunk
+        self.metadata.update(chunk.response_metadata or {})
+        self.tool_call = self.agent._tool_call_from_message(chunk)
+        if self.tool_call: return True
+        self.content += chunk.content
+        if not self.holding and "{" in self.content[self.fed:]:
+            self.holding = True
+        if self.holding and find_json_object(self.content[self.fed:]) is not None:
+            # the object just closed: dispatch now instead of after generation ends
+            self.tool_call = self.agent._tool_call_from_text(self.content[self.fed:])
+            if self.tool_call: return True
+            # braces in an ordinary answer: the held text is said after all, and streaming goes on
+            self.holding = False
+        if not self.holding:
+            for sentence in self.splitter.feed(self.content[self.fed:]):
+                self.on_sentence(sentence)
+            self.fed = len(self.content)
+        return False
+
+    def done(self, kind):
+        router_stats.record_llm((time.perf_counter() - self.t_start) * 1000)
+        llm_stats.record(kind, self.metadata, self.ttft_ms)
+
+    def flush(self):
+        for sentence in self.splitter.feed(self.content[self.fed:]) + self.splitter.flush():
+            self.on_sentence(sentence)
+
+class AgentRequest:
+    """En fråga på väg genom agenten: det som stegen före och efter LLM-anropet delar."""
+    __slots__ = ("user_text", "memory", "title", "fast", "history_key", "context", "prefetched")
+
+    def __init__(self, user_text, memory, title=None):
+        self.user_text = user_text
+        self.memory = memory
+        self.title = title          # the client's window title, None = ours
+        self.fast = None            # (tool, args) from intent_router, the llm is skipped
+        self.history_key = ""       # the conversation as text, plain answers are cached on it
+        self.context = None         # messages for the llm
+        self.prefetched = None      # tool_prefetch.Speculation started next to the llm call
+
+# the async api: how many requests may work at once, and the threads blocking tools run in
+AGENT_MAX_CONCURRENCY = 4
+TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+_agent_loop = None
+_agent_loop_lock = threading.Lock()
+
+def get_agent_loop():
+    """
+    En event-loop i en egen tråd som alla agentförfrågningar delar, istället
+    för en tråd per meddelande. Skicka in med asyncio.run_coroutine_threadsafe.
     """
+    global _agent_loop
+    with _agent_loop_lock:
+        if _agent_loop is None:
+            _agent_loop = asyncio.new_event_loop()
+            threading.Thread(target=_agent_loop.run_forever, daemon=True, name="agent-loop").start()
+    return _agent_loop
+
+def get_agent(tool_names=None):
+    """Agenten. tool_names begränsar vilka verktyg den får använda (agent_server.py), None = alla."""
+    # shared clients with one keep_alive for everything (see llm_clients.py), so nothing unloads the model
+    llm = get_llm("router")
+    summarizer = get_llm("summarizer")
+    
+    tools = load_tools(tool_names)
+    # ollama gets the json schema of every @tool and returns tool_calls instead of json in the text
+    llm_tools = llm.bind_tools(tools)
+
+    # only the rules and examples for the tools this agent has, the server must not offer the desktop
+    prompt_text = build_prompt([t.name for t in tools])
+
+    def summarize_turns(summary, turns):
+        # runs in the memory's background thread, never while someone waits for an answer
+        dialogue = "\n".join(f"Användare: {user}\nEnigma: {answer}" for user, answer in turns)
+        summary_prompt = (
+            f"TIDIGARE SAMMANFATTNING: {summary or '(ingen)'}\n"
+            f"NYA REPLIKER:\n{dialogue}\n"
+            f"INSTRUKTION: Skriv en uppdaterad sammanfattning av samtalet på svenska, högst 5 meningar. "
+            f"Behåll namn, fakta och önskemål som kan behövas senare."
+        )
+        return summarizer.invoke(summary_prompt).content
 
     class AgentExecutorCompat:
         def __init__(self, tool_list):
             self.tool_map = {t.name: t for t in tool_list}
-            self.chat_history = [] 
+            # recent turns verbatim, older ones folded into a summary in the background
+            self.memory = self.new_memory()
+            self.limits = {}       # event loop -> semaphore, see _limit
 
-        def invoke(self, payload: dict):
-            user_text = payload.get("input", "")
-            try: title = gw.getActiveWindow().title
-            except: title = "Okänt"
+        def new_memory(self):
+            """
+            Ett tomt samtalsminne. Skickas det med som payload["memory"] används det
+            istället för agentens eget (agent_server.py har ett per session).
+            """
+            return ConversationMemory(summarize=summarize_turns)
+
+        def _build_context(self, user_text, memory=None, title=None):
+            """
+            Meddelandena till modellen. Systemprompten ligger alltid först och
+            ändras aldrig, så Ollama kan återanvända KV-cachen för den (och för
+            historiken) mellan turerna. Det som ändras varje gång, aktivt fönster
+            och frågan, ligger sist.
+            """
+            memory = memory or self.memory
+            # a remote client sends its own window title, ours says nothing about its desktop
+            if title is None:
+                try:
+                    import pygetwindow as gw
+                    title = gw.getActiveWindow().title
+                except: title = "Okänt"
             
-            history_text = "\n".join(self.chat_history[-4:]) if self.chat_history else ""
-            context = f"SYSTEM: {prompt_text}\nCONTEXT (Aktivt fönster): {title}\nHISTORIK: {history_text}\nUSER: {user_text}"
+            return ([SystemMessage(content=prompt_text)] + memory.messages() +
+                    [HumanMessage(content=f"CONTEXT (Aktivt fönster): {title}\n{user_text}")])
+
+        def _run_tool(self, tool_name, args):
+            """Kör verktyget. Returnerar (resultat, misslyckades)."""
+            try:
+                return self.tool_map[tool_name].invoke(args), False
+            except Exception as e:
+                print(f"DEBUG: Tool execution error ({tool_name}): {e}", flush=True)
+                return f"Fel vid körning: {e}", True
+
+        async def _arun_tool(self, tool_name, args):
+            """Som _run_tool, men blockerande verktyg körs i TOOL_EXECUTOR så event-loopen är fri."""
+            tool = self.tool_map[tool_name]
+            try:
+                if getattr(tool, "coroutine", None):
+                    return await tool.ainvoke(args), False
+                return await asyncio.get_running_loop().run_in_executor(TOOL_EXECUTOR, tool.invoke, args), False
+            except Exception as e:
+                print(f"DEBUG: Tool execution error ({tool_name}): {e}", flush=True)
+                return f"Fel vid körning: {e}", True
+
+        def _tool_reply(self, tool_name, args, res, user_text):
+            """
+            Formulerar svaret på ett verktygsresultat. Returnerar (svar, None),
+            eller (None, analysprompt) när LLM:en ska sammanfatta.
+            """
+            if tool_name == "search_web":
+                analysis_prompt = (
+                    f"FRÅGA: {user_text}\n"
+                    f"DATA: {str(res)}\n"
+                    f"INSTRUKTION: Svara kort på svenska."
+                )
+                return None, analysis_prompt
             
+            if tool_name == "improve_active_document":
+                return f"Text uppdaterad: {str(res)}", None
+
+            if tool_name == "open_application":
+                return f"Startar {args.get('app_name')}.", None
+
+            return f"Klart: {str(res)}", None
+
+        def _dispatch(self, tool_name, args, user_text, on_sentence=None, prefetched=None):
+            """
+            Kör verktyget och formulerar svaret. Returnerar (svar, strömmat, misslyckades).
+            prefetched är en Speculation (tool_prefetch.py); stämmer den används dess resultat.
+            """
+            future = prefetched.take(tool_name, args) if prefetched else None
+            res, failed = future.result() if future else self._run_tool(tool_name, args)
+            reply, analysis_prompt = self._tool_reply(tool_name, args, res, user_text)
+            if analysis_prompt is None:
+                return reply, False, failed
+            if on_sentence:
+                return stream_sentences(llm.stream(analysis_prompt), on_sentence), True, failed
+            return llm.invoke(analysis_prompt).content, False, failed
+
+        async def _adispatch(self, tool_name, args, user_text, on_sentence=None, prefetched=None):
+            future = prefetched.take(tool_name, args) if prefetched else None
+            res, failed = await asyncio.wrap_future(future) if future else await self._arun_tool(tool_name, args)
+            reply, analysis_prompt = self._tool_reply(tool_name, args, res, user_text)
+            if analysis_prompt is None:
+                return reply, False, failed
+            if on_sentence:
+                return await astream_sentences(llm.astream(analysis_prompt), on_sentence), True, failed
+            return (await llm.ainvoke(analysis_prompt)).content, False, failed
+
+        def _fast_path(self, user_text):
+            """
+            (verktyg, argument) om intent_router känner igen kommandot
+            (se intent_router.py), så att LLM:en kan hoppas över. Annars None.
+            """
+            t_start = time.perf_counter()
+            routed = route(user_text)
+            route_ms = (time.perf_counter() - t_start) * 1000
+            if routed is None or routed[1] not in self.tool_map:
+                return None
+            intent, tool_name, args = routed
+            router_stats.record_hit(intent, route_ms)
+            print(f"DEBUG: Fast path {intent} -> {tool_name}({args}), LLM skipped", flush=True)
+            return tool_name, args
+
+        def _history_key(self, memory=None):
+            # plain answers depend on what was said before, cached answers are keyed on it
+            return (memory or self.memory).key()
+
+        def _remember(self, user_text, output, tool_name=None, history_key="", failed=False, memory=None):
+            """Lägger turen i minnet och svaret i svarscachen (om det får cachas)."""
+            # the answer the user got is remembered, not the raw tool data
+            (memory or self.memory).add(user_text, output)
+            if tool_name is not None:
+                if not failed:
+                    response_cache.put(user_text, output, tool=tool_name)
+            elif find_json_object(output) is None:  # a broken tool call is not an answer
+                response_cache.put(user_text, output, context=history_key)
+
+        def _begin(self, payload):
+            """Läser payload och provar snabbvägen. Blockerar inte, får köras på event-loopen."""
+            request = AgentRequest(payload.get("input", ""), payload.get("memory") or self.memory, payload.get("window"))
+            request.fast = self._fast_path(request.user_text)
+            return request
+
+        def _prepare(self, request):
+            """
+            Ett svar ur svarscachen, eller None och då meddelandena till LLM:en
+            (och ett spekulativt verktyg) i request. Kan blockera på inbäddningar,
+            så från event-loopen körs den i TOOL_EXECUTOR.
+            """
+            cached = self._cached(request.user_text, request.memory)
+            if cached is not None:
+                return cached
+            request.history_key = self._history_key(request.memory)
+            request.context = self._build_context(request.user_text, request.memory, request.title)
+            # a likely search/time/screen tool starts now instead of after the routing call
+            request.prefetched = speculate(request.user_text, self.tool_map, self._run_tool, TOOL_EXECUTOR)
+            return None
+
+        def _finish(self, request, output, tool_name=None, failed=False):
+            """Lägger turen i minnet och svarscachen. Blockerar som _prepare."""
+            self._remember(request.user_text, output, tool_name, request.history_key, failed, request.memory)
+            return {"output": output}
+
+        def _offload(self, func, *args):
+            # the cache and memory steps block (embeddings), keep them off the shared loop
+            return asyncio.get_running_loop().run_in_executor(TOOL_EXECUTOR, func, *args)
+
+        def _cached(self, user_text, memory=None):
+            """Ett sparat svar på samma (eller nästan samma) fråga, None om det saknas eller gått ut."""
+            memory = memory or self.memory
+            hit = response_cache.get(user_text, self._history_key(memory))
+            if hit is None:
+                return None
+            output, tool_name = hit
+            print(f"DEBUG: Response cache hit ({tool_name or 'answer'}), LLM skipped", flush=True)
+            memory.add(user_text, output)
+            return output
+
+        def _resolve_tool_call(self, name, args, source):
+            """
+            Kontrollerar ett verktygsanrop mot tool_map och verktygets schema.
+            Returnerar (verktyg, argument) eller None om anropet är trasigt.
+            """
+            outcome = tool_call_stats.OK
+            if name not in self.tool_map and name in TOOL_ALIASES:
+                name = TOOL_ALIASES[name]
+                outcome = tool_call_stats.RENAMED
+            if name not in self.tool_map:
+                tool_call_stats.record(source, "unknown_tool", name)
+                return None
+            args = args or {}
+            schema = self.tool_map[name].args_schema
+            if hasattr(schema, "model_validate"):
+                try:
+                    schema.model_validate(args)
+                except ValidationError as e:
+                    tool_call_stats.record(source, "bad_args", f"{name}: {e.errors()[0].get('msg', e)}")
+                    return None
+            tool_call_stats.record(source, outcome)
+            return name, args
+
+        def _tool_call_from_text(self, content):
+            """
+            (verktyg, argument) om svarstexten är ett JSON-verktygsanrop, annars None.
+            Bara en reserv: prompten ber om riktiga tool_calls, men modellen skriver ibland ändå JSON.
+            """
+            raw = find_json_object(content)
+            if raw is None or '"name"' not in raw:
+                return None
             try:
-                response = llm.invoke(context)
-                content = response.content
-            except Exception as e: return {"output": f"Fel: {e}"}
+                data = json.loads(raw)
+            except json.JSONDecodeError as e:
+                tool_call_stats.record("text", "bad_json", str(e))
+                return None
+            if not isinstance(data, dict) or not isinstance(data.get("name"), str):
+                tool_call_stats.record("text", "bad_json", raw[:80])
+                return None
+            args = data.get("arguments", {}) or data.get("parameters", {})
+            return self._resolve_tool_call(data["name"], args, "text")
+
+        def _tool_call_from_message(self, message):
+            """(verktyg, argument) ur Ollamas egna tool_calls, annars None."""
+            for invalid in getattr(message, "invalid_tool_calls", None) or []:
+                tool_call_stats.record("native", "bad_json", invalid.get("error") or invalid.get("args"))
+            for call in getattr(message, "tool_calls", None) or []:
+                resolved = self._resolve_tool_call(call.get("name"), call.get("args"), "native")
+                if resolved:
+                    return resolved
+            return None
+
+        def invoke(self, payload: dict):
+            request = self._begin(payload)
+            tool_call = request.fast
+            if tool_call is None:
+                cached = self._prepare(request)
+                if cached is not None:
+                    return {"output": cached}
+                try:
+                    t_start = time.perf_counter()
+                    response = llm_tools.invoke(request.context)
+                    router_stats.record_llm((time.perf_counter() - t_start) * 1000)
+                    llm_stats.record("invoke", response.response_metadata)
+                except Exception as e: return {"output": f"Fel: {e}"}
+                tool_call = self._tool_call_from_message(response) or self._tool_call_from_text(response.content)
+                if tool_call is None:
+                    return self._finish(request, response.content)
+
+            output, _, failed = self._dispatch(*tool_call, request.user_text, prefetched=request.prefetched)
+            return self._finish(request, output, tool_call[0], failed)
 
-            if "{" in content and "name" in content:
+        def stream(self, payload: dict, on_sentence):
+            """
+            Som invoke, men svaret lämnas mening för mening till on_sentence medan
+            modellen skriver, så talet kan börja innan hela svaret är klart.
+            Ser strömmen ut som ett JSON-verktygsanrop hålls den tillbaka, och verktyget
+            körs så fort objektet är stängt (resten av genereringen väntar vi inte på).
+            """
+            request = self._begin(payload)
+            tool_call = request.fast
+            if tool_call is None:
+                cached = self._prepare(request)
+                if cached is not None:
+                    say_sentences(cached, on_sentence)
+                    return {"output": cached}
+                turn = StreamTurn(self, on_sentence)
                 try:
-                    match = re.search(r'\{.*\}', content, re.DOTALL)
-                    if match:
-                        data = json.loads(match.group(0))
-                        tool_name = data.get("name")
-                        
-                        # error handling
-                        if tool_name == "Fakta": tool_name = "search_web"
-                        if tool_name == "edit_document": tool_name = "improve_active_document"
-                        if tool_name == "open_app": tool_name = "open_application"
-
-                        args = data.get("arguments", {}) or data.get("parameters", {})
-                        
-                        if tool_name in self.tool_map:
-                            # run the tools
-                            try:
-                                res = self.tool_map[tool_name].invoke(args)
-                            except Exception as e:
-                                print(f"DEBUG: Tool execution error ({tool_name}): {e}", flush=True)
-                                res = f"Fel vid körning: {e}"
-                            
-                            self.chat_history.append(f"User: {user_text}")
-                            self.chat_history.append(f"AI (Data): {str(res)[:100]}...") 
-
-                            
-                            if tool_name == "search_web":
-                                analysis_prompt = (
-                                    f"FRÅGA: {user_text}\n"
-                                    f"DATA: {str(res)}\n"
-                                    f"INSTRUKTION: Svara kort på svenska."
-                                )
-                                final_ans = llm.invoke(analysis_prompt).content
-                                return {"output": final_ans}
-                            
-                            if tool_name == "improve_active_document":
-                                return {"output": f"Text uppdaterad: {str(res)}"}
-
-                            if tool_name == "open_application":
-                                return {"output": f"Startar {args.get('app_name')}."}
-
-                            return {"output": f"Klart: {str(res)}"}
-                except: pass
-            
-            self.chat_history.append(f"User: {user_text}")
-            self.chat_history.append(f"AI: {content}")
-            return {"output": content}
+                    for chunk in llm_tools.stream(request.context):
+                        if turn.feed(chunk): break
+                except Exception as e:
+                    on_sentence(f"Fel: {e}")
+                    return {"output": f"Fel: {e}"}
+                turn.done("stream")
+                tool_call = turn.tool_call
+                if tool_call is None:
+                    # plain answer (or json that wasn't a tool call): say whatever is left
+                    turn.flush()
+                    return self._finish(request, turn.content)
+
+            output, streamed, failed = self._dispatch(*tool_call, request.user_text, on_sentence, request.prefetched)
+            if not streamed: say_sentences(output, on_sentence)
+            return self._finish(request, output, tool_call[0], failed)
+
+        def _limit(self):
+            # one semaphore per event loop, asyncio primitives can't be shared between loops
+            loop = asyncio.get_running_loop()
+            if loop not in self.limits:
+                self.limits[loop] = asyncio.Semaphore(AGENT_MAX_CONCURRENCY)
+            return self.limits[loop]
+
+        async def ainvoke(self, payload: dict):
+            """
+            Som invoke, men som coroutine: LLM-anropen är asynkrona och blockerande
+            verktyg körs i en trådpool. Högst AGENT_MAX_CONCURRENCY förfrågningar
+            arbetar samtidigt, resten väntar på sin tur.
+            """
+            async with self._limit():
+                request = self._begin(payload)
+                tool_call = request.fast
+                if tool_call is None:
+                    cached = await self._offload(self._prepare, request)
+                    if cached is not None:
+                        return {"output": cached}
+                    try:
+                        t_start = time.perf_counter()
+                        response = await llm_tools.ainvoke(request.context)
+                        router_stats.record_llm((time.perf_counter() - t_start) * 1000)
+                        llm_stats.record("ainvoke", response.response_metadata)
+                    except Exception as e: return {"output": f"Fel: {e}"}
+                    tool_call = self._tool_call_from_message(response) or self._tool_call_from_text(response.content)
+                    if tool_call is None:
+                        return await self._offload(self._finish, request, response.content)
+
+                output, _, failed = await self._adispatch(*tool_call, request.user_text, prefetched=request.prefetched)
+                return await self._offload(self._finish, request, output, tool_call[0], failed)
+
+        async def astream(self, payload: dict, on_sentence):
+            """Som stream, fast som coroutine (on_sentence anropas från event-loopen)."""
+            async with self._limit():
+                request = self._begin(payload)
+                tool_call = request.fast
+                if tool_call is None:
+                    cached = await self._offload(self._prepare, request)
+                    if cached is not None:
+                        say_sentences(cached, on_sentence)
+                        return {"output": cached}
+                    turn = StreamTurn(self, on_sentence)
+                    try:
+                        # leaving the loop early closes the generator, which stops generation
+                        async for chunk in llm_tools.astream(request.context):
+                            if turn.feed(chunk): break
+                    except Exception as e:
+                        on_sentence(f"Fel: {e}")
+                        return {"output": f"Fel: {e}"}
+                    turn.done("astream")
+                    tool_call = turn.tool_call
+                    if tool_call is None:
+                        turn.flush()
+                        return await self._offload(self._finish, request, turn.content)
 
-    return AgentExecutorCompat(tools)
\ No newline at end of file
+                output, streamed, failed = await self._adispatch(*tool_call, request.user_text, on_sentence,
+                                                                 request.prefetched)
+                if not streamed: say_sentences(output, on_sentence)
+                return await self._offload(self._finish, request, output, tool_call[0], failed)
+    return AgentExecutorCompat(tools)
@@ -0,0 +1,372 @@
+"""
+Enigma utan fönster: agenten som en lokal HTTP/WebSocket-server.
+
+Förut fanns agenten bara inuti EnigmaUI eller Enigma.py. Här kan flera
+datorer dela en maskin med Ollama. Varje klient har en session med eget
+samtalsminne. En rättvis kö släpper fram förfrågningarna en session i
+taget (round robin) och högst SERVER_MAX_INFLIGHT samtidigt, så att en
+pratsam klient inte kan tränga undan de andra. Är kön full svarar
+servern direkt med 429 istället för att låta väntetiden växa.
+
+    POST /chat        {"input": "...", "session": "...", "window": "...", "stream": false}
+                      -> {"session": "...", "output": "..."}, med stream: en JSON-rad per mening
+    GET  /ws?session= WebSocket, skicka {"input": "..."} och få {"type": "sentence"/"done"/"error", ...}
+    DELETE /sessions/<id>
+    GET  /stats
+
+Verktygen körs på servern, inte hos klienten, så sessionerna får bara
+SERVER_TOOLS (sökning och tid). Program, skärm, tangentbord och Word på
+servern är inte åtkomliga över nätet. Förfrågningar från andra datorer än
+servern själv måste skicka "Authorization: Bearer <SERVER_TOKEN>"; utan
+token i config.py startar servern bara på 127.0.0.1.
+
+Kör från projektmappen:
+    python agent_server.py [--host 127.0.0.1] [--port 8765] [--token ...]
+"""
+import argparse
+import asyncio
+import atexit
+import hmac
+import ipaddress
+import json
+import statistics
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from aiohttp import web, WSMsgType
+from agent import get_agent, AGENT_MAX_CONCURRENCY
+from config import SERVER_HOST, SERVER_PORT, SERVER_TOKEN
+
+# tools that only return text: nothing on the server's desktop is touched or read
+SERVER_TOOLS = ("search_web", "get_current_time")
+
+SERVER_MAX_INFLIGHT = AGENT_MAX_CONCURRENCY  # requests working on the agent at once
+SERVER_MAX_QUEUED = 32        # waiting requests across all sessions, more than this gets 429
+SESSION_MAX_QUEUED = 4        # waiting requests per session
+SERVER_QUEUE_TIMEOUT = 60     # seconds a request may wait for its turn
+MAX_SESSIONS = 256
+SESSION_IDLE_SECONDS = 30 * 60
+STATS_WINDOW = 1000           # latency percentiles over the last this many requests
+
+
+class QueueFull(Exception):
+    pass
+
+
+class FairQueue:
+    """
+    Släpper fram förfrågningar round robin mellan sessionerna, högst en per
+    session åt gången (turerna i ett samtal måste komma i ordning) och högst
+    max_inflight totalt. Används från en och samma event-loop.
+    """
+    def __init__(self, max_inflight=SERVER_MAX_INFLIGHT, max_queued=SERVER_MAX_QUEUED,
+                 per_session=SESSION_MAX_QUEUED):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.per_session = per_session
+        self.waiting = OrderedDict()  # session -> deque of futures, next session to serve first
+        self.running = set()          # sessions with a request in flight
+        self.queued = 0
+
+    async def acquire(self, session_id):
+        """Väntar tills sessionen får köra. QueueFull om det redan står för många i kö."""
+        # room left means nobody who could run is waiting (release() would have let them in)
+        if len(self.running) < self.max_inflight and session_id not in self.running:
+            self.running.add(session_id)
+            return
+        mine = self.waiting.get(session_id, ())
+        if self.queued >= self.max_queued or len(mine) >= self.per_session:
+            raise QueueFull(f"{self.queued} i kö totalt, {len(mine)} för sessionen")
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(session_id, deque()).append(future)
+        self.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(session_id)  # got the turn just as the wait was cancelled
+            else:
+                self._forget(session_id, future)
+            raise
+
+    def release(self, session_id):
+        self.running.discard(session_id)
+        self._grant()
+
+    def _forget(self, session_id, future):
+        queue = self.waiting.get(session_id)
+        if queue and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self.waiting[session_id]
+
+    def _grant(self):
+        while len(self.running) < self.max_inflight:
+            # the first session in line that isn't already running, then it goes to the back
+            session_id = next((s for s in self.waiting if s not in self.running), None)
+            if session_id is None:
+                return
+            queue = self.waiting.pop(session_id)
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.waiting[session_id] = queue
+            if future.done():
+                continue
+            self.running.add(session_id)
+            future.set_result(None)
+
+
+class Session:
+    __slots__ = ("id", "memory", "last_used", "turns")
+
+    def __init__(self, session_id, memory):
+        self.id = session_id
+        self.memory = memory
+        self.last_used = time.monotonic()
+        self.turns = 0
+
+
+class SessionStore:
+    """Sessionerna och deras samtalsminnen. Sessioner som legat oanvända länge tas bort."""
+
+    def __init__(self, agent, max_sessions=MAX_SESSIONS, idle_seconds=SESSION_IDLE_SECONDS):
+        self.agent = agent
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.sessions = {}
+
+    def get(self, session_id=None):
+        """Sessionen med id:t, eller en ny. QueueFull om servern redan har max_sessions."""
+        now = time.monotonic()
+        for old in [s for s in self.sessions.values() if now - s.last_used > self.idle_seconds]:
+            del self.sessions[old.id]
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            if len(self.sessions) >= self.max_sessions:
+                raise QueueFull(f"{len(self.sessions)} sessioner")
+            session = Session(session_id or uuid.uuid4().hex, self.agent.new_memory())
+            self.sessions[session.id] = session
+        session.last_used = now
+        return session
+
+    def drop(self, session_id):
+        return self.sessions.pop(session_id, None) is not None
+
+
+class ServerStats:
+    """Väntetid i kön, hela svarstiden och avvisade förfrågningar."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wait_ms = deque(maxlen=STATS_WINDOW)
+        self.total_ms = deque(maxlen=STATS_WINDOW)
+        self.served = 0
+        self.rejected = 0
+
+    def record(self, wait_ms, total_ms):
+        with self.lock:
+            self.served += 1
+            self.wait_ms.append(wait_ms)
+            self.total_ms.append(total_ms)
+
+    def record_reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self.lock:
+            def pct(values, q):
+                return round(statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values or [0])[0], 1)
+            return {
+                "served": self.served,
+                "rejected": self.rejected,
+                "wait_ms_p50": pct(self.wait_ms, 50), "wait_ms_p95": pct(self.wait_ms, 95),
+                "total_ms_p50": pct(self.total_ms, 50), "total_ms_p95": pct(self.total_ms, 95),
+            }
+
+    def summary(self):
+        s = self.snapshot()
+        if not s["served"] and not s["rejected"]:
+            return ""
+        return (f"Server: {s['served']} served, {s['rejected']} rejected, queue wait p50/p95 "
+                f"{s['wait_ms_p50']:.0f}/{s['wait_ms_p95']:.0f} ms, total p50/p95 "
+                f"{s['total_ms_p50']:.0f}/{s['total_ms_p95']:.0f} ms")
+
+
+server_stats = ServerStats()
+atexit.register(lambda: server_stats.summary() and print(server_stats.summary(), flush=True))
+
+
+class AgentServer:
+    def __init__(self, agent, queue=None, sessions=None):
+        self.agent = agent
+        self.queue = queue or FairQueue()
+        self.sessions = sessions or SessionStore(agent)
+
+    async def turn(self, session, user_text, window=None, on_sentence=None):
+        """En tur för sessionen: köar, kör agenten och returnerar svaret. QueueFull om kön är full."""
+        t_start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.queue.acquire(session.id), SERVER_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise QueueFull(f"väntade mer än {SERVER_QUEUE_TIMEOUT} s")
+        t_granted = time.perf_counter()
+        try:
+            payload = {"input": user_text, "memory": session.memory, "window": window or "Okänt"}
+            if on_sentence:
+                result = await self.agent.astream(payload, on_sentence)
+            else:
+                result = await self.agent.ainvoke(payload)
+        finally:
+            self.queue.release(session.id)
+        session.turns += 1
+        session.last_used = time.monotonic()
+        t_end = time.perf_counter()
+        server_stats.record((t_granted - t_start) * 1000, (t_end - t_start) * 1000)
+        return result.get("output", "")
+
+    async def streamed_turn(self, session, user_text, window, send):
+        """Som turn, men varje mening skickas med send({"type": "sentence", ...}) medan svaret skrivs."""
+        events = asyncio.Queue()
+        task = asyncio.create_task(self.turn(session, user_text, window, events.put_nowait))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (sentence := await events.get()) is not None:
+                await send({"type": "sentence", "text": sentence})
+            return task.result()
+        finally:
+            # the client went away: stop generating for it
+            if not task.done():
+                task.cancel()
+
+    async def chat(self, request):
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response({"error": "ogiltig JSON"}, status=400)
+        if not isinstance(body, dict):
+            return web.json_response({"error": "ett JSON-objekt väntades"}, status=400)
+        user_text = str(body.get("input") or "").strip()
+        if not user_text:
+            return web.json_response({"error": "input saknas"}, status=400)
+        try:
+            session = self.sessions.get(body.get("session"))
+            if not body.get("stream"):
+                output = await self.turn(session, user_text, body.get("window"))
+                return web.json_response({"session": session.id, "output": output})
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+
+            async def send(event):
+                await response.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+
+            try:
+                output = await self.streamed_turn(session, user_text, body.get("window"), send)
+                await send({"type": "done", "session": session.id, "output": output})
+            except QueueFull as e:
+                server_stats.record_reject()
+                await send({"type": "error", "error": "busy", "detail": str(e)})
+            await response.write_eof()
+            return response
+        except QueueFull as e:
+            server_stats.record_reject()
+            return web.json_response({"error": "busy", "detail": str(e)}, status=429, headers={"Retry-After": "1"})
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        try:
+            session = self.sessions.get(request.query.get("session"))
+        except QueueFull as e:
+            server_stats.record_reject()
+            await ws.send_json({"type": "error", "error": "busy", "detail": str(e)})
+            await ws.close()
+            return ws
+        await ws.send_json({"type": "session", "session": session.id})
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                body = json.loads(msg.data)
+                user_text = str(body.get("input") or "").strip()
+            except (json.JSONDecodeError, AttributeError):
+                await ws.send_json({"type": "error", "error": "ogiltig JSON"})
+                continue
+            if not user_text:
+                continue
+            try:
+                output = await self.streamed_turn(session, user_text, body.get("window"), ws.send_json)
+                await ws.send_json({"type": "done", "output": output})
+            except QueueFull as e:
+                server_stats.record_reject()
+                await ws.send_json({"type": "error", "error": "busy", "detail": str(e)})
+            except ConnectionResetError:
+                break
+        return ws
+
+    async def drop_session(self, request):
+        dropped = self.sessions.drop(request.match_info["session"])
+        return web.json_response({"dropped": dropped}, status=200 if dropped else 404)
+
+    async def stats(self, request):
+        return web.json_response({
+            **server_stats.snapshot(),
+            "inflight": len(self.queue.running),
+            "queued": self.queue.queued,
+            "sessions": len(self.sessions.sessions),
+        })
+
+    def app(self, token=None):
+        app = web.Application(middlewares=[require_token(token)])
+        app.add_routes([
+            web.post("/chat", self.chat),
+            web.get("/ws", self.websocket),
+            web.delete("/sessions/{session}", self.drop_session),
+            web.get("/stats", self.stats),
+        ])
+        return app
+
+
+def is_loopback(remote):
+    if remote == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(remote).is_loopback
+    except (TypeError, ValueError):
+        return False
+
+
+def require_token(token):
+    """Släpper igenom servern själv, alla andra bara med rätt token (och ingen alls utan token)."""
+    @web.middleware
+    async def check(request, handler):
+        if not is_loopback(request.remote):
+            sent = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+            if not token or not hmac.compare_digest(sent.encode("utf-8"), token.encode("utf-8")):
+                return web.json_response({"error": "unauthorized"}, status=401)
+        return await handler(request)
+    return check
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enigma-agenten som HTTP/WebSocket-server")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--token", default=SERVER_TOKEN, help="krävs av klienter som inte kör på servern själv")
+    args = parser.parse_args()
+    if not args.token and not is_loopback(args.host):
+        parser.error(f"--host {args.host} tar emot andra datorer: sätt SERVER_TOKEN i config.py eller --token")
+
+    server = AgentServer(get_agent(tool_names=SERVER_TOOLS))
+    print(f"Enigma-servern lyssnar på http://{args.host}:{args.port} "
+          f"(högst {SERVER_MAX_INFLIGHT} samtidigt, {SERVER_MAX_QUEUED} i kö)", flush=True)
+    web.run_app(server.app(args.token), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+En enda mikrofonström som alltid är öppen och skriver till en ringbuffert.
+
+Allt som vill ha ljud (vakna-ord, STT, brusmätning) läser ur bufferten med
+en egen läsare i stället för att öppna mikrofonen själv. Då tappas inget tal
+mellan två lyssningar och strömmen behöver aldrig startas om.
+"""
+import threading
+import time
+import numpy as np
+import pyaudio
+import speech_recognition as sr
+
+CAPTURE_RATE = 16000       # what whisper wants, so nothing has to be resampled later
+CAPTURE_FRAME_MS = 30
+CAPTURE_BUFFER_S = 30.0    # how far behind a reader may fall before audio is lost
+PRE_ROLL_S = 0.3           # a new reader starts this far back so the first syllable is kept
+
+
+class AudioRingBuffer:
+    """
+    Ringbuffert med int16-ljud. Positioner är absoluta (antal samples sedan start),
+    så varje läsare kan hålla reda på var den är utan att störa de andra.
+    """
+
+    def __init__(self, seconds=CAPTURE_BUFFER_S, sample_rate=CAPTURE_RATE):
+        self.sample_rate = sample_rate
+        self.size = int(seconds * sample_rate)
+        self.data = np.zeros(self.size, dtype=np.int16)
+        self.written = 0
+        self.write_time = time.monotonic()  # when the sample at self.written arrived
+        self.cond = threading.Condition()
+
+    def write(self, samples):
+        total = len(samples)
+        if total == 0: return
+        with self.cond:
+            # more than fits: only the newest samples survive, but the position still moves by all of them
+            skipped = max(0, total - self.size)
+            samples = samples[skipped:]
+            n = len(samples)
+            start = (self.written + skipped) % self.size
+            first = min(n, self.size - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:n - first] = samples[first:]
+            self.written += total
+            self.write_time = time.monotonic()
+            self.cond.notify_all()
+
+    def time_of(self, position):
+        """Ungefär när samplet på position spelades in (time.monotonic)."""
+        with self.cond:
+            return self.write_time - (self.written - position) / self.sample_rate
+
+    @property
+    def oldest(self):
+        return max(0, self.written - self.size)
+
+    def read(self, start, end):
+        """Kopia av samples [start, end). start får inte vara äldre än self.oldest."""
+        with self.cond:
+            start = max(start, self.oldest)
+            end = min(end, self.written)
+            if end <= start: return np.zeros(0, dtype=np.int16)
+            idx = np.arange(start, end) % self.size
+            return self.data[idx].copy()
+
+    def wait_until(self, position, timeout=None):
+        """Väntar tills bufferten har skrivits fram till position. False vid timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.written >= position, timeout=timeout)
+
+
+class CaptureReader:
+    """En läsare i ringbufferten med egen position."""
+
+    def __init__(self, buffer, position):
+        self.buffer = buffer
+        self.position = position
+
+    def read(self, n, timeout=None):
+        """Nästa n samples (blockerar tills de finns). Tom array vid timeout."""
+        if not self.buffer.wait_until(self.position + n, timeout):
+            return np.zeros(0, dtype=np.int16)
+        if self.position < self.buffer.oldest:
+            # we fell behind by more than the whole buffer, skip to what is still there
+            lost = self.buffer.oldest - self.position
+            print(f"Mikrofon: läsaren låg efter, hoppar över {lost / self.buffer.sample_rate:.1f}s", flush=True)
+            self.position = self.buffer.oldest
+        samples = self.buffer.read(self.position, self.position + n)
+        self.position += len(samples)
+        return samples
+
+    def skip_to_now(self):
+        self.position = self.buffer.written
+
+
+class _ReaderStream:
+    """Det sr.Recognizer förväntar sig av source.stream."""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def read(self, size):
+        return self.reader.read(size).tobytes()
+
+    def close(self):
+        pass
+
+
+class CaptureSource(sr.AudioSource):
+    """Gör en CaptureReader till en källa som sr.Recognizer.listen och listen() kan använda."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.stream = _ReaderStream(reader)
+        self.SAMPLE_RATE = reader.buffer.sample_rate
+        self.SAMPLE_WIDTH = 2
+        self.CHUNK = int(self.SAMPLE_RATE * CAPTURE_FRAME_MS / 1000)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class MicrophoneCapture:
+    """Den alltid öppna mikrofonen. Callbacken gör inget annat än att skriva till bufferten."""
+
+    def __init__(self, device_index=None, sample_rate=CAPTURE_RATE, buffer_seconds=CAPTURE_BUFFER_S):
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.buffer = AudioRingBuffer(buffer_seconds, sample_rate)
+        self.audio = None
+        self.stream = None
+        self.device_rate = sample_rate
+
+    def start(self):
+        if self.stream is not None: return
+        self.audio = pyaudio.PyAudio()
+        frames = int(self.sample_rate * CAPTURE_FRAME_MS / 1000)
+        try:
+            self.stream = self._open(self.sample_rate, frames)
+        except Exception:
+            # some devices refuse 16 kHz, take their own rate and resample in the callback
+            info = self.audio.get_device_info_by_index(self.device_index) if self.device_index is not None \
+                else self.audio.get_default_input_device_info()
+            self.device_rate = int(info["defaultSampleRate"])
+            self.stream = self._open(self.device_rate, int(self.device_rate * CAPTURE_FRAME_MS / 1000))
+        self.stream.start_stream()
+        print(f"Mikrofon öppen ({self.device_rate} Hz, buffert {self.buffer.size / self.sample_rate:.0f}s)", flush=True)
+
+    def _open(self, rate, frames):
+        return self.audio.open(format=pyaudio.paInt16, channels=1, rate=rate, input=True,
+                               input_device_index=self.device_index, frames_per_buffer=frames,
+                               stream_callback=self._callback)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        samples = np.frombuffer(in_data, dtype=np.int16)
+        if self.device_rate != self.sample_rate:
+            n_out = int(len(samples) * self.sample_rate / self.device_rate)
+            samples = np.interp(np.linspace(0, len(samples) - 1, n_out), np.arange(len(samples)), samples).astype(np.int16)
+        self.buffer.write(samples)
+        return (None, pyaudio.paContinue)
+
+    def reader(self, pre_roll=PRE_ROLL_S):
+        """Ny läsare som börjar pre_roll sekunder bakåt i tiden."""
+        start = max(self.buffer.oldest, self.buffer.written - int(pre_roll * self.sample_rate))
+        return CaptureReader(self.buffer, start)
+
+    def source(self, pre_roll=PRE_ROLL_S):
+        """Ny källa för sr.Recognizer/listen(), med egen läsare."""
+        return CaptureSource(self.reader(pre_roll))
+
+    def ambient_threshold(self, seconds=2.0, ratio=1.5, minimum=50):
+        """
+        Energitröskel från det senaste ljudet i bufferten, utan att vänta på nytt ljud.
+        Tar en låg percentil av ramenergin så att tal i fönstret inte drar upp brusnivån.
+        """
+        samples = self.buffer.read(self.buffer.written - int(seconds * self.sample_rate), self.buffer.written)
+        frame = int(self.sample_rate * CAPTURE_FRAME_MS / 1000)
+        n_frames = len(samples) // frame
+        if n_frames == 0: return 300
+        frames = samples[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        return max(minimum, float(np.percentile(rms, 20)) * ratio)
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
+
+
+_capture = None
+_capture_lock = threading.Lock()
+
+
+def get_capture():
+    """Den gemensamma mikrofonen, startas första gången den behövs."""
+    global _capture
+    with _capture_lock:
+        if _capture is None:
+            _capture = MicrophoneCapture()
+            _capture.start()
+    return _capture
@@ -0,0 +1,105 @@
+"""
+Barge-in: lyssnar medan Enigma pratar och avbryter uppspelningen när
+användaren säger vakna-ordet.
+"""
+import threading
+import time
+import numpy as np
+from echo import EchoGate, playback_reference
+from wakeword import WAKE_WORD, spot_wake_word
+
+BARGE_FRAME_S = 0.03
+BARGE_CHECK_EVERY_S = 0.4   # run the spotter this often while the user is talking over us
+BARGE_END_SILENCE_S = 0.4   # this much silence ends a candidate
+BARGE_PRE_ROLL_S = 0.2
+BARGE_MAX_CANDIDATE_S = 2.0 # to interrupt, "enigma" has to come first in what the user says over us
+
+
+class BargeInMonitor:
+    """
+    Egen läsare på den alltid öppna mikrofonen. Bara aktiv medan ljudutgången
+    pratar; ekodämpat tal körs genom wake word-spottern och vid träff avbryts allt.
+    """
+
+    def __init__(self, capture, audio_output, wake_word=WAKE_WORD, on_barge_in=None):
+        self.capture = capture
+        self.audio_output = audio_output
+        self.wake_word = wake_word
+        self.on_barge_in = on_barge_in
+        self.gate = EchoGate(playback_reference)
+        self.lock = threading.Lock()
+        self.position = None  # where in the capture buffer the interrupting speech began
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def take_position(self):
+        """Position för senaste barge-in (och nollställ), eller None."""
+        with self.lock:
+            position, self.position = self.position, None
+        return position
+
+    def _run(self):
+        buffer = self.capture.buffer
+        rate = buffer.sample_rate
+        frame = int(rate * BARGE_FRAME_S)
+        reader = self.capture.reader(pre_roll=0)
+        threshold = self.capture.ambient_threshold()
+        candidate = []
+        candidate_start = None
+        silence_s = 0.0
+        next_check = BARGE_CHECK_EVERY_S
+
+        while self.running:
+            samples = reader.read(frame, timeout=1.0)
+            if len(samples) == 0: continue
+
+            if not self.audio_output.is_speaking():
+                # nothing to interrupt, keep the noise threshold fresh instead
+                candidate, candidate_start = [], None
+                if reader.position % (rate * 5) < frame:
+                    threshold = self.capture.ambient_threshold()
+                continue
+
+            t = buffer.time_of(reader.position)
+            if self.gate.is_user_speech(samples, t, threshold):
+                if candidate_start is None:
+                    candidate_start = max(buffer.oldest, reader.position - len(samples) - int(BARGE_PRE_ROLL_S * rate))
+                    next_check = BARGE_CHECK_EVERY_S
+                candidate.append(samples)
+                silence_s = 0.0
+            elif candidate:
+                candidate.append(samples)
+                silence_s += BARGE_FRAME_S
+
+            if not candidate: continue
+            heard_s = len(candidate) * BARGE_FRAME_S
+            ended = silence_s >= BARGE_END_SILENCE_S or heard_s >= BARGE_MAX_CANDIDATE_S
+            if heard_s >= next_check or ended:
+                next_check += BARGE_CHECK_EVERY_S
+                audio = np.concatenate(candidate).astype(np.float32) / 32768.0
+                found, heard = spot_wake_word(audio, self.wake_word, rate)
+                if found:
+                    self._interrupt(candidate_start, heard)
+                    ended = True
+            if ended:
+                candidate, candidate_start, silence_s = [], None, 0.0
+
+    def _interrupt(self, position, heard):
+        t_detect = time.perf_counter()
+        self.audio_output.cancel_all()
+        with self.lock:
+            self.position = position
+        # cancellation is polled by the playback loop, measure how long it really took
+        while self.audio_output.is_speaking() and time.perf_counter() - t_detect < 1.0:
+            time.sleep(0.005)
+        print(f"Barge-in: '{heard}' -> uppspelning stoppad efter {(time.perf_counter() - t_detect) * 1000:.0f} ms", flush=True)
+        if self.on_barge_in:
+            try: self.on_barge_in(position)
+            except Exception as e: print(f"Barge-in callback fel: {e}", flush=True)
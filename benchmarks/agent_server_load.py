@@ -0,0 +1,144 @@
+"""
+Lasttest av agent_server.py mot låtsas-Ollama (benchmarks/fake_ollama.py).
+
+Startar båda som egna processer (eller använder --url), låter --sessions
+klienter prata över WebSocket, några turer var, och en girig klient skicka
+--greedy förfrågningar på en gång över HTTP. Skriver ut tid till första
+mening och hela svaret, hur många som avvisades (429), och hur jämnt
+sessionerna betjänades trots den giriga klienten.
+
+Kör från projektmappen:
+    python -m benchmarks.agent_server_load [--sessions 16] [--turns 3] [--greedy 12] [--parallel 1]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import aiohttp
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pct(values, q):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+async def wait_for(http, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(url) as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} svarade inte inom {timeout} s")
+
+
+async def talker(http, base_url, index, turns, results):
+    """En vanlig klient: en WebSocket, en tur i taget."""
+    async with http.ws_connect(f"{base_url}/ws") as ws:
+        await ws.receive_json()  # {"type": "session", ...}
+        for turn in range(turns):
+            # unique questions, otherwise the response cache answers instead of the llm
+            await ws.send_json({"input": f"Berätta om sak nummer {index}-{turn}", "window": "Lasttest"})
+            t_start = time.perf_counter()
+            first = None
+            while True:
+                event = await ws.receive_json()
+                if event["type"] == "sentence" and first is None:
+                    first = (time.perf_counter() - t_start) * 1000
+                elif event["type"] == "done":
+                    results["talkers"].append((index, first or 0.0, (time.perf_counter() - t_start) * 1000))
+                    break
+                elif event["type"] == "error":
+                    results["rejected_talkers"] += 1
+                    break
+
+
+async def greedy(http, base_url, count, results):
+    """En klient som skickar allt på en gång i samma session."""
+    async def one(i):
+        t_start = time.perf_counter()
+        async with http.post(f"{base_url}/chat", json={"session": "greedy", "input": f"Girig fråga {i}"}) as response:
+            await response.read()
+            if response.status == 429:
+                results["rejected_greedy"] += 1
+            else:
+                results["greedy"].append((time.perf_counter() - t_start) * 1000)
+    await asyncio.gather(*(one(i) for i in range(count)))
+
+
+def spawn(args):
+    env = dict(os.environ, OLLAMA_HOST=f"http://127.0.0.1:{args.ollama_port}")
+    ollama = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(args.ollama_port),
+                               "--parallel", str(args.parallel), "--token-ms", str(args.token_ms)],
+                              cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server = subprocess.Popen([sys.executable, "agent_server.py", "--port", str(args.server_port)],
+                              cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return [ollama, server]
+
+
+async def run(args):
+    base_url = args.url or f"http://127.0.0.1:{args.server_port}"
+    results = {"talkers": [], "greedy": [], "rejected_talkers": 0, "rejected_greedy": 0}
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600)) as http:
+        await wait_for(http, f"{base_url}/stats")
+        t_start = time.perf_counter()
+        await asyncio.gather(greedy(http, base_url, args.greedy, results),
+                             *(talker(http, base_url, i, args.turns, results) for i in range(args.sessions)))
+        elapsed = time.perf_counter() - t_start
+        async with http.get(f"{base_url}/stats") as response:
+            server = await response.json()
+
+    firsts = [first for _, first, _ in results["talkers"]]
+    totals = [total for _, _, total in results["talkers"]]
+    print(f"\n{len(totals) + len(results['greedy'])} svar på {elapsed:.1f} s "
+          f"({(len(totals) + len(results['greedy'])) / elapsed:.1f}/s)")
+    print(f"{'klient':<10} {'svar':>5} {'avvisade':>9} {'första mening p50/p95':>22} {'hela svaret p50/p95':>20}")
+    print(f"{'vanliga':<10} {len(totals):>5} {results['rejected_talkers']:>9} "
+          f"{pct(firsts, 50):>10.0f}/{pct(firsts, 95):<10.0f} {pct(totals, 50):>9.0f}/{pct(totals, 95):<9.0f}")
+    greedy_ms = results["greedy"]
+    print(f"{'girig':<10} {len(greedy_ms):>5} {results['rejected_greedy']:>9} {'-':>22} "
+          f"{pct(greedy_ms, 50):>9.0f}/{pct(greedy_ms, 95):<9.0f}")
+
+    # fairness: how far apart the sessions' average answer times are
+    per_session = {}
+    for index, _, total in results["talkers"]:
+        per_session.setdefault(index, []).append(total)
+    means = [statistics.mean(v) for v in per_session.values()]
+    if means:
+        print(f"medelsvarstid per session: {min(means):.0f}-{max(means):.0f} ms")
+    print(f"servern: kö p50/p95 {server['wait_ms_p50']:.0f}/{server['wait_ms_p95']:.0f} ms, "
+          f"{server['rejected']} avvisade, {server['sessions']} sessioner")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest av agent_server.py")
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--greedy", type=int, default=12, help="förfrågningar som en klient skickar på en gång")
+    parser.add_argument("--url", help="en server som redan kör, annars startas server och låtsas-Ollama")
+    parser.add_argument("--parallel", type=int, default=1, help="låtsas-Ollamas OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--server-port", type=int, default=8799)
+    parser.add_argument("--ollama-port", type=int, default=11499)
+    args = parser.parse_args()
+
+    processes = [] if args.url else spawn(args)
+    try:
+        asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
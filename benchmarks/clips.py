@@ -0,0 +1,55 @@
+import json
+import os
+import numpy as np
+import speech_recognition as sr
+from faster_whisper import decode_audio
+
+from Voice import SAMPLE_RATE
+
+CLIP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "voicetest")
+CLIP_EXTENSIONS = (".wav", ".m4a", ".mp3", ".flac", ".ogg")
+# old tts output left in voicetest, not microphone recordings
+TTS_LEFTOVERS = ("temp_sent_",)
+
+
+def find_clips(folder=CLIP_DIR):
+    """Alla ljudklipp i mappen (tomma filer och gammal TTS-utdata hoppas över)."""
+    clips = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.lower().startswith(TTS_LEFTOVERS):
+            continue
+        if name.lower().endswith(CLIP_EXTENSIONS) and os.path.getsize(path) > 0:
+            clips.append(path)
+    return clips
+
+
+def load_clip(path):
+    """Avkodar ett klipp till 16 kHz mono float32, samma format som mikrofonvägen."""
+    return decode_audio(path, sampling_rate=SAMPLE_RATE)
+
+
+def to_audio_data(samples):
+    """Packar en float32-array som sr.AudioData så att den ser ut som en inspelning."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    return sr.AudioData(pcm.tobytes(), SAMPLE_RATE, 2)
+
+
+def load_references(clips, manifest=None):
+    """
+    Facit-texter per klipp: från en JSON-manifest {"klipp.wav": "text", ...}
+    eller en .txt-fil bredvid klippet (klipp.wav -> klipp.txt).
+    """
+    references = {}
+    if manifest:
+        with open(manifest, encoding="utf-8") as f:
+            by_name = json.load(f)
+        for path in clips:
+            if os.path.basename(path) in by_name:
+                references[path] = by_name[os.path.basename(path)]
+    for path in clips:
+        sidecar = os.path.splitext(path)[0] + ".txt"
+        if path not in references and os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as f:
+                references[path] = f.read().strip()
+    return references
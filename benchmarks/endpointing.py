@@ -0,0 +1,127 @@
+"""
+Mäter hur snabbt frasslutet upptäcks: fast tystnadsfönster (som
+sr.Recognizer med pause_threshold 0.6 / 1.0) mot den adaptiva Endpointer.
+
+Varje klipp får brus före och efter (i klippets egen brusnivå) så att det
+finns ett riktigt slut att hitta. "Facit" för talslut är sista ramen i
+klippet som ligger inom ORACLE_DB dB från klippets starka tal. Det beror
+inte på någon av detektorernas trösklar, och samma facit gäller för alla.
+Latens = upptäckt slut - facit; ett slut före facit räknas som avklippt.
+
+    python -m benchmarks.endpointing [--folder voicetest]
+"""
+import argparse
+import os
+import numpy as np
+
+from vad import Endpointer, MIN_THRESHOLD, frame_rms
+from benchmarks.clips import CLIP_DIR, find_clips, load_clip
+
+FRAME_S = 0.03
+RATE = 16000
+PAD_BEFORE_S = 0.5
+PAD_AFTER_S = 2.0
+ORACLE_DB = 35.0          # speech ends at the last frame within this many dB of the clip's loud speech
+SPEECH_PERCENTILE = 95    # "loud speech" level of a clip
+
+
+def frames_of(clip):
+    pcm = (np.clip(clip, -1.0, 1.0) * 32767).astype(np.int16)
+    frame = int(RATE * FRAME_S)
+    return [pcm[i:i + frame] for i in range(0, len(pcm) - frame + 1, frame)]
+
+
+def padded(frames, noise_rms, rng):
+    frame = len(frames[0])
+    noise = lambda: (rng.standard_normal(frame) * noise_rms).astype(np.int16)
+    before = [noise() for _ in range(int(PAD_BEFORE_S / FRAME_S))]
+    after = [noise() for _ in range(int(PAD_AFTER_S / FRAME_S))]
+    return before + frames + after
+
+
+def fixed_window_end(frames, threshold, pause):
+    """Index där ett fast tystnadsfönster avslutar frasen (None om den aldrig börjar)."""
+    started = False
+    silence = 0.0
+    for i, f in enumerate(frames):
+        speech = frame_rms(f) >= threshold
+        if not started:
+            started = speech
+            continue
+        silence = 0.0 if speech else silence + FRAME_S
+        if silence >= pause: return i
+    return None
+
+
+def adaptive_end(frames, threshold, max_hangover):
+    endpointer = Endpointer(FRAME_S, energy_threshold=threshold, max_hangover=max_hangover)
+    for i, f in enumerate(frames):
+        state, speech = endpointer.process(f)
+        if state == "end": return i
+    return None
+
+
+def true_end_of_speech(raw):
+    """Facit: index (i de opaddade ramarna) för sista ramen inom ORACLE_DB från klippets talnivå."""
+    levels = np.array([frame_rms(f) for f in raw])
+    speech_level = float(np.percentile(levels, SPEECH_PERCENTILE))
+    floor = speech_level * 10 ** (-ORACLE_DB / 20)
+    above = np.nonzero(levels >= floor)[0]
+    return int(above[-1]) if len(above) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frasslut: fast fönster mot adaptiv endpointer")
+    parser.add_argument("--folder", default=CLIP_DIR)
+    args = parser.parse_args()
+
+    clips = find_clips(args.folder)
+    if not clips:
+        print(f"Inga klipp hittades i {args.folder}")
+        return
+
+    rng = np.random.default_rng(0)
+    detectors = {
+        "fast 0.6s": lambda frames, thr: fixed_window_end(frames, thr, 0.6),
+        "fast 1.0s": lambda frames, thr: fixed_window_end(frames, thr, 1.0),
+        "adaptiv": lambda frames, thr: adaptive_end(frames, thr, 1.0),
+    }
+    latencies = {name: [] for name in detectors}
+    cuts = {name: 0 for name in detectors}
+
+    print(f"{'klipp':<20} " + " ".join(f"{name:>12}" for name in detectors))
+    for path in clips:
+        raw = frames_of(load_clip(path))
+        if not raw: continue
+        levels = np.array([frame_rms(f) for f in raw])
+        noise_rms = float(np.percentile(levels, 10))
+        frames = padded(raw, noise_rms, rng)
+
+        # what a calibrated recognizer would use; the end of speech is judged without it
+        threshold = max(MIN_THRESHOLD, noise_rms * 1.5)
+        raw_end = true_end_of_speech(raw)
+        if raw_end is None: continue
+        true_end = raw_end + int(PAD_BEFORE_S / FRAME_S)
+
+        cells = []
+        for name, detect in detectors.items():
+            end = detect(frames, threshold)
+            if end is None:
+                cells.append(f"{'-':>12}")
+                continue
+            latency_ms = (end - true_end) * FRAME_S * 1000
+            if end < true_end: cuts[name] += 1
+            latencies[name].append(latency_ms)
+            cells.append(f"{latency_ms:>9.0f} ms")
+        print(f"{os.path.basename(path):<20} " + " ".join(cells))
+
+    print("\n=== Sammanfattning (ms från talslut till upptäckt slut) ===")
+    baseline = np.mean(latencies["fast 0.6s"]) if latencies["fast 0.6s"] else None
+    for name, values in latencies.items():
+        if not values: continue
+        saved = f", sparar {baseline - np.mean(values):.0f} ms mot 0.6s" if baseline is not None and name != "fast 0.6s" else ""
+        print(f"{name:<10} snitt {np.mean(values):6.0f}  max {np.max(values):6.0f}  avklippta {cuts[name]}{saved}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+En låtsas-Ollama för lasttester av agent_server.py utan GPU och utan modell.
+
+Svarar på /api/chat som Ollama (NDJSON-ström eller ett enda JSON-svar) med
+en fast svensk text. Tiden är påhittad men formad som en riktig server:
+först prompt-utvärdering, sedan en token i taget, och högst --parallel
+anrop genereras samtidigt (som OLLAMA_NUM_PARALLEL), resten väntar i kö.
+Räknarna (prompt_eval_count, eval_duration, ...) fylls i, så llm_metrics
+fungerar som vanligt.
+
+Kör från projektmappen:
+    python -m benchmarks.fake_ollama [--port 11435] [--parallel 1] [--token-ms 20]
+och starta servern mot den:
+    OLLAMA_HOST=http://127.0.0.1:11435 python agent_server.py
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from aiohttp import web
+
+NS_PER_MS = 1_000_000
+ANSWER = ("Det här är ett svar från testservern. Det har några meningar så att talet kan börja tidigt. "
+          "Varje ord kommer som en egen token, med en liten paus emellan. Sedan är svaret slut.")
+
+
+class FakeOllama:
+    def __init__(self, parallel=1, prompt_ms=150.0, token_ms=20.0, tokens=40):
+        self.slots = asyncio.Semaphore(parallel)
+        self.prompt_ms = prompt_ms
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.requests = 0
+        self.waiting = 0
+        self.max_waiting = 0
+
+    def _words(self):
+        words = ANSWER.split(" ")
+        return [w + " " for w in (words * (self.tokens // len(words) + 1))[:self.tokens]]
+
+    def _part(self, model, content, done=False, **counters):
+        return {"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                "message": {"role": "assistant", "content": content}, "done": done, **counters}
+
+    async def chat(self, request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        self.requests += 1
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        t_start = time.perf_counter()
+        async with self.slots:
+            self.waiting -= 1
+            await asyncio.sleep(self.prompt_ms / 1000)
+            t_eval = time.perf_counter()
+            words = self._words()
+
+            def final():
+                t_end = time.perf_counter()
+                return {"done_reason": "stop", "total_duration": int((t_end - t_start) * 1000 * NS_PER_MS),
+                        "load_duration": 0, "prompt_eval_count": prompt_tokens,
+                        "prompt_eval_duration": int(self.prompt_ms * NS_PER_MS), "eval_count": len(words),
+                        "eval_duration": int((t_end - t_eval) * 1000 * NS_PER_MS)}
+
+            if not body.get("stream", True):
+                await asyncio.sleep(self.token_ms * len(words) / 1000)
+                return web.json_response(self._part(model, "".join(words).strip(), True, **final()))
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for word in words:
+                await asyncio.sleep(self.token_ms / 1000)
+                await response.write((json.dumps(self._part(model, word), ensure_ascii=False) + "\n").encode("utf-8"))
+            await response.write((json.dumps(self._part(model, "", True, **final())) + "\n").encode("utf-8"))
+            await response.write_eof()
+            return response
+
+    async def stats(self, request):
+        return web.json_response({"requests": self.requests, "waiting": self.waiting, "max_waiting": self.max_waiting})
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post("/api/chat", self.chat),
+            web.get("/api/version", lambda r: web.json_response({"version": "0.0.0-fake"})),
+            web.get("/stats", self.stats),
+            web.get("/", lambda r: web.Response(text="Ollama is running")),
+        ])
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Låtsas-Ollama för lasttester")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--parallel", type=int, default=1, help="anrop som genereras samtidigt (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--prompt-ms", type=float, default=150.0, help="prompt-utvärdering per anrop")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="tid per genererad token")
+    parser.add_argument("--tokens", type=int, default=40, help="tokens per svar")
+    args = parser.parse_args()
+
+    async def make_app():
+        # the semaphore must be created on the loop that serves requests
+        return FakeOllama(args.parallel, args.prompt_ms, args.token_ms, args.tokens).app()
+
+    print(f"Låtsas-Ollama på http://{args.host}:{args.port} ({args.parallel} parallellt, "
+          f"{args.token_ms:.0f} ms/token)", flush=True)
+    web.run_app(make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Jämför den gamla platta prompten ("SYSTEM: ...\\nCONTEXT ...\\nHISTORIK ...\\nUSER ...")
+med strukturerade meddelanden (fast systemmeddelande först) över några turer.
+Siffrorna kommer från Ollamas egna räknare: hur många prompt-tokens som
+utvärderades, hur lång tid det tog, och tid till första token.
+
+Kör från projektmappen (Ollama måste vara igång):
+    python -m benchmarks.prompt_cache [--turns 6]
+"""
+import argparse
+import statistics
+import time
+
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_ollama import ChatOllama
+
+import llm_metrics
+from agent import get_agent
+from config import MODEL_NAME, TEMPERATURE
+
+QUESTIONS = [
+    "Hej, vem är du?",
+    "Vad kan du hjälpa mig med?",
+    "Berätta kort om Stockholm.",
+    "Hur många bor där?",
+    "Vad är huvudstaden i Norge?",
+    "Tack, det var allt.",
+]
+WINDOW_TITLE = "Visual Studio Code"
+
+
+def flat_prompt(system, history, question):
+    history_text = "\n".join(f"User: {m.content}" if isinstance(m, HumanMessage) else f"AI: {m.content}"
+                             for m in history)
+    return f"SYSTEM: {system}\nCONTEXT (Aktivt fönster): {WINDOW_TITLE}\nHISTORIK: {history_text}\nUSER: {question}"
+
+
+def message_prompt(system, history, question):
+    return [SystemMessage(content=system)] + history + [HumanMessage(content=f"CONTEXT (Aktivt fönster): {WINDOW_TITLE}\n{question}")]
+
+
+def run(llm, system, build, turns):
+    history = []
+    rows = []
+    for question in (QUESTIONS * turns)[:turns]:
+        t_start = time.perf_counter()
+        ttft_ms = None
+        content = ""
+        metadata = {}
+        for chunk in llm.stream(build(system, history[-4:], question)):
+            if ttft_ms is None and chunk.content:
+                ttft_ms = (time.perf_counter() - t_start) * 1000
+            metadata.update(chunk.response_metadata or {})
+            content += chunk.content
+        rows.append(llm_metrics.eval_metrics(metadata, ttft_ms))
+        history += [HumanMessage(content=question), AIMessage(content=content)]
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Platt prompt vs fast systemmeddelande")
+    parser.add_argument("--turns", type=int, default=len(QUESTIONS))
+    args = parser.parse_args()
+
+    llm_metrics.LLM_METRICS_LOG = False
+    system = get_agent()._build_context("")[0].content
+    # short answers, we are measuring the prompt side
+    llm = ChatOllama(model=MODEL_NAME, temperature=TEMPERATURE, keep_alive="1h", num_predict=64)
+    llm.invoke("Hej")  # make sure the model is loaded before either run
+
+    print(f"\n{'layout':<12} {'tur':>3} {'prompt tok':>11} {'prompt ms':>10} {'första token ms':>16}")
+    for label, build in (("platt", flat_prompt), ("meddelanden", message_prompt)):
+        rows = run(llm, system, build, args.turns)
+        for i, row in enumerate(rows, 1):
+            print(f"{label:<12} {i:>3} {row['prompt_tokens']:>11} {row['prompt_eval_ms']:>10.0f} {row['ttft_ms'] or 0:>16.0f}")
+        # the first turn is cold either way, the cache shows from the second on
+        warm = rows[1:] or rows
+        print(f"{label:<12} medel (tur 2-): {statistics.mean(r['prompt_tokens'] for r in warm):.0f} tok, "
+              f"{statistics.mean(r['prompt_eval_ms'] for r in warm):.0f} ms prompt, "
+              f"{statistics.mean(r['ttft_ms'] or 0 for r in warm):.0f} ms till första token\n")
+
+
+if __name__ == "__main__":
+    main()
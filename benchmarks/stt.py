@@ -0,0 +1,190 @@
+"""
+STT-benchmark över en mapp med klipp: WER, real-time factor, kall/varm
+latens och högsta minnesanvändning för varje kombination av modellstorlek,
+compute type och beam size. Samma väg som Voice.listen (sr.AudioData ->
+transcribe_audio).
+
+Facit läses från --manifest (JSON {"klipp.wav": "text"}) eller klipp.txt
+bredvid klippet; klipp utan facit mäts men räknas inte in i WER.
+
+Varje konfiguration körs i en egen process så att kall start och
+minnestoppen inte påverkas av föregående modell. Resultatet skrivs som
+JSON och kan jämföras med en tidigare körning:
+
+    python -m benchmarks.stt --sizes tiny,base,small,medium --out stt_ny.json
+    python -m benchmarks.stt --out stt_ny.json --compare stt_gammal.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import statistics
+import time
+
+from benchmarks.clips import CLIP_DIR, find_clips, load_clip, load_references, to_audio_data
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Processens högsta RSS hittills i MB (None om det inte går att mäta)."""
+    if psutil:
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None)  # windows keeps the peak for us
+        if peak: return peak / (1024 * 1024)
+    if resource:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # linux reports KB, macOS bytes
+        return maxrss / 1024 if platform.system() != "Darwin" else maxrss / (1024 * 1024)
+    if psutil:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    return None
+
+
+def normalize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def word_errors(reference, hypothesis):
+    """(antal fel, antal ord i facit) med Levenshtein-avstånd på ordnivå."""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def run_config(config, clips, references, runs):
+    """Körs i en egen process: laddar modellen och mäter alla klipp."""
+    import Voice
+    from faster_whisper import WhisperModel
+    Voice.STT_TIMING_LOG = False
+
+    audios = [(path, to_audio_data(load_clip(path))) for path in clips]
+
+    t_load = time.perf_counter()
+    model = WhisperModel(config["size"], device=config["device"], compute_type=config["compute_type"])
+    load_s = time.perf_counter() - t_load
+
+    # cold = first transcription right after loading, what the first voice command feels like
+    t_first = time.perf_counter()
+    Voice.transcribe_audio(audios[0][1], model=model, beam_size=config["beam_size"])
+    cold_s = time.perf_counter() - t_first
+
+    clip_results = []
+    errors = words = 0
+    for path, audio in audios:
+        latencies = []
+        text = ""
+        for _ in range(runs):
+            timings = {}
+            text = Voice.transcribe_audio(audio, timings, model=model, beam_size=config["beam_size"])
+            latencies.append(timings["total_ms"] / 1000)
+        audio_s = timings["audio_s"]
+        result = {"clip": os.path.basename(path), "audio_s": round(audio_s, 3), "text": text,
+                  "warm_s": round(statistics.median(latencies), 4)}
+        if path in references:
+            e, n = word_errors(references[path], text)
+            errors += e
+            words += n
+            result["wer"] = round(e / n, 4) if n else None
+        clip_results.append(result)
+
+    peak = peak_rss_mb()
+    total_audio = sum(r["audio_s"] for r in clip_results)
+    total_warm = sum(r["warm_s"] for r in clip_results)
+    return {
+        **config,
+        "load_s": round(load_s, 3),
+        "cold_s": round(cold_s, 3),
+        "warm_median_s": round(statistics.median(r["warm_s"] for r in clip_results), 4),
+        "rtf": round(total_warm / total_audio, 4) if total_audio else None,
+        "wer": round(errors / words, 4) if words else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "clips": clip_results,
+    }
+
+
+def print_table(results, previous=None):
+    before = {}
+    for r in (previous or {}).get("results", []):
+        before[(r["size"], r["compute_type"], r["beam_size"])] = r
+
+    print(f"\n{'modell':<8} {'compute':<13} {'beam':>4} {'WER':>7} {'RTF':>6} {'kall s':>7} {'varm s':>7} {'RSS MB':>8}")
+    for r in results:
+        wer = f"{r['wer']:.1%}" if r["wer"] is not None else "-"
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        line = (f"{r['size']:<8} {r['compute_type']:<13} {r['beam_size']:>4} {wer:>7} {r['rtf']:>6.2f} "
+                f"{r['cold_s']:>7.2f} {r['warm_median_s']:>7.3f} {rss:>8}")
+        old = before.get((r["size"], r["compute_type"], r["beam_size"]))
+        if old:
+            line += f"   (RTF {r['rtf'] - old['rtf']:+.2f}, varm {r['warm_median_s'] - old['warm_median_s']:+.3f} s"
+            if r["wer"] is not None and old.get("wer") is not None:
+                line += f", WER {r['wer'] - old['wer']:+.1%}"
+            line += ")"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="STT-benchmark över voicetest/")
+    parser.add_argument("--folder", default=CLIP_DIR)
+    parser.add_argument("--manifest", help="JSON med facit per filnamn")
+    parser.add_argument("--sizes", default="tiny,base,small,medium")
+    parser.add_argument("--compute-types", default="int8,int8_float32")
+    parser.add_argument("--beam-sizes", default="1,5")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--runs", type=int, default=3, help="varma körningar per klipp")
+    parser.add_argument("--out", default="stt_benchmark.json")
+    parser.add_argument("--compare", help="tidigare resultatfil att jämföra med")
+    args = parser.parse_args()
+
+    clips = find_clips(args.folder)
+    if not clips:
+        print(f"Inga klipp hittades i {args.folder}")
+        return
+    references = load_references(clips, args.manifest)
+    print(f"{len(clips)} klipp, {len(references)} med facit")
+
+    configs = [{"size": size, "device": args.device, "compute_type": compute_type, "beam_size": int(beam)}
+               for size in args.sizes.split(",")
+               for compute_type in args.compute_types.split(",")
+               for beam in args.beam_sizes.split(",")]
+
+    # spawn gives every config a clean interpreter, so cold start and peak rss are its own
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for config in configs:
+        print(f"Kör {config['size']} / {config['compute_type']} / beam {config['beam_size']}...", flush=True)
+        with ctx.Pool(1) as pool:
+            try:
+                results.append(pool.apply(run_config, (config, clips, references, args.runs)))
+            except Exception as e:
+                print(f"  misslyckades: {e}", flush=True)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_table(results, previous)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "machine": platform.platform(),
+                   "cpu_count": os.cpu_count(), "runs": args.runs, "results": results}, f, indent=2, ensure_ascii=False)
+    print(f"\nResultat sparat i {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Jämför den gamla temp_listen.wav-vägen med transkribering direkt i minnet.
+
+Kör från projektmappen:
+    python -m benchmarks.stt_inmemory [--runs 5] [--folder voicetest]
+"""
+import argparse
+import os
+import statistics
+import time
+
+from Voice import get_whisper_model, transcribe_audio
+from benchmarks.clips import CLIP_DIR, find_clips, load_clip, to_audio_data
+
+
+def transcribe_via_file(audio, timings):
+    # the old listen() path: encode wav, write it, let whisper re-read and decode it, unlink
+    t_start = time.perf_counter()
+    temp_wav = "temp_listen.wav"
+    with open(temp_wav, "wb") as f:
+        f.write(audio.get_wav_data())
+    t_written = time.perf_counter()
+
+    segments, info = get_whisper_model().transcribe(temp_wav, language="sv", beam_size=1)
+    text = "".join([segment.text for segment in segments]).strip()
+    t_transcribed = time.perf_counter()
+
+    try: os.remove(temp_wav)
+    except: pass
+    t_done = time.perf_counter()
+
+    timings.update({
+        "convert_ms": (t_written - t_start) * 1000 + (t_done - t_transcribed) * 1000,
+        "transcribe_ms": (t_transcribed - t_written) * 1000,
+        "total_ms": (t_done - t_start) * 1000,
+    })
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fil- vs minnesväg för STT")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--folder", default=CLIP_DIR)
+    args = parser.parse_args()
+
+    clips = find_clips(args.folder)
+    if not clips:
+        print(f"Inga klipp hittades i {args.folder}")
+        return
+
+    # both paths use the model in this process (not the stt worker process)
+    model = get_whisper_model()
+    transcribe_in_memory = lambda audio, timings: transcribe_audio(audio, timings, model=model)
+
+    # warm up once so the first clip does not pay for lazy CUDA/CTranslate2 init
+    transcribe_in_memory(to_audio_data(load_clip(clips[0])), {})
+
+    print(f"\n{'klipp':<20} {'väg':<7} {'ljud s':>7} {'io/konv ms':>11} {'whisper ms':>11} {'totalt ms':>10}")
+    for path in clips:
+        audio = to_audio_data(load_clip(path))
+        for label, fn in (("fil", transcribe_via_file), ("minne", transcribe_in_memory)):
+            runs = []
+            for _ in range(args.runs):
+                timings = {}
+                fn(audio, timings)
+                runs.append(timings)
+            audio_s = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+            print(f"{os.path.basename(path):<20} {label:<7} {audio_s:>7.2f} "
+                  f"{statistics.median(t['convert_ms'] for t in runs):>11.1f} "
+                  f"{statistics.median(t['transcribe_ms'] for t in runs):>11.0f} "
+                  f"{statistics.median(t['total_ms'] for t in runs):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
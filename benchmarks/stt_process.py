@@ -0,0 +1,96 @@
+"""
+Latens för tal-till-text i samma process jämfört med STT-processen
+(stt_worker.py), utan last och medan OCR körs i bakgrundstrådar som
+skärmövervakningen gör.
+
+Kör från projektmappen:
+    python -m benchmarks.stt_process [--runs 5] [--load ocr|python] [--threads 2]
+
+--load ocr tar skärmdumpar och kör pytesseract i en loop (kräver Tesseract),
+--load python är en ren Python-loop som håller GIL på samma sätt.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from Voice import get_whisper_model
+from stt_worker import get_stt_worker
+from benchmarks.clips import CLIP_DIR, find_clips, load_clip
+
+
+def ocr_load(stop):
+    from PIL import ImageGrab
+    import pytesseract
+    while not stop.is_set():
+        pytesseract.image_to_string(ImageGrab.grab())
+
+
+def python_load(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(200000))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def measure(transcribe, clips, runs):
+    latencies = []
+    for _ in range(runs):
+        for samples in clips:
+            t_start = time.perf_counter()
+            transcribe(samples)
+            latencies.append((time.perf_counter() - t_start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="STT i processen vs egen process under OCR-last")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--folder", default=CLIP_DIR)
+    parser.add_argument("--load", choices=["ocr", "python"], default="ocr")
+    parser.add_argument("--threads", type=int, default=2, help="Antal bakgrundstrådar med last")
+    args = parser.parse_args()
+
+    clips = [load_clip(path) for path in find_clips(args.folder)]
+    if not clips:
+        print(f"Inga klipp hittades i {args.folder}")
+        return
+
+    model = get_whisper_model()
+    worker = get_stt_worker()
+    if not worker.wait_ready():
+        print("STT-processen startade inte")
+        return
+
+    def in_process(samples):
+        segments, info = model.transcribe(samples, language="sv", beam_size=1)
+        return "".join([segment.text for segment in segments])
+
+    def in_worker(samples):
+        return worker.transcribe(samples)[0]
+
+    # warm both so neither pays for lazy init
+    in_process(clips[0])
+    in_worker(clips[0])
+
+    load = ocr_load if args.load == "ocr" else python_load
+    print(f"\n{'väg':<16} {'last':<8} {'median ms':>10} {'p95 ms':>8} {'max ms':>8}")
+    for loaded in (False, True):
+        stop = threading.Event()
+        if loaded:
+            for _ in range(args.threads):
+                threading.Thread(target=load, args=(stop,), daemon=True).start()
+            time.sleep(1.0)
+        for label, fn in (("samma process", in_process), ("egen process", in_worker)):
+            latencies = measure(fn, clips, args.runs)
+            print(f"{label:<16} {args.load if loaded else 'ingen':<8} {statistics.median(latencies):>10.0f} "
+                  f"{percentile(latencies, 95):>8.0f} {max(latencies):>8.0f}")
+        stop.set()
+    worker.stop()
+
+
+if __name__ == "__main__":
+    main()
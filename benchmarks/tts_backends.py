@@ -0,0 +1,61 @@
+"""
+Jämför talsyntes-backends: tid till färdigt ljud för första anropet (kall,
+inklusive modell-laddning/anslutning) och för efterföljande anrop (varm).
+
+Kör från projektmappen:
+    python -m benchmarks.tts_backends [--runs 5]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from tts_backends import ALL_BACKENDS
+
+SENTENCES = [
+    "Hej, hur kan jag hjälpa dig?",
+    "Jag har öppnat webbläsaren åt dig.",
+    "Klockan är halv tre på eftermiddagen och det regnar ute.",
+]
+
+
+async def timed(backend, text):
+    t_start = time.perf_counter()
+    try:
+        data = await backend.synthesize(text)
+    except Exception as e:
+        print(f"  {backend.name}: fel ({e})")
+        return None, 0
+    return (time.perf_counter() - t_start) * 1000, len(data or b"")
+
+
+async def run(runs):
+    for backend in ALL_BACKENDS:
+        if not backend.available():
+            print(f"{backend.name}: inte tillgänglig, hoppar över")
+            continue
+        cold_ms, _ = await timed(backend, SENTENCES[0])
+        if cold_ms is None:
+            continue
+        warm, sizes = [], []
+        for _ in range(runs):
+            for text in SENTENCES:
+                ms, size = await timed(backend, text)
+                if ms is not None:
+                    warm.append(ms)
+                    sizes.append(size)
+        if not warm:
+            continue
+        print(f"{backend.name}: kall {cold_ms:.0f} ms, varm median {statistics.median(warm):.0f} ms "
+              f"(min {min(warm):.0f}, max {max(warm):.0f}), {statistics.mean(sizes) / 1024:.0f} kB/mening")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jämför TTS-backends")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.runs))
+
+
+if __name__ == "__main__":
+    main()
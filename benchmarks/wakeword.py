@@ -0,0 +1,95 @@
+"""
+Mäter tvåstegs-vakna-ordet: falsklarm/missar och CPU-kostnad mot att köra
+stora whisper på allt.
+
+Facit tas från en JSON-fil {"klipp.wav": true, ...} om --labels anges,
+annars från den stora modellens transkribering (det gamla beteendet). Utan
+--labels säger falsklarmen bara hur ofta spottern och stora modellen är
+oense; ta med klipp utan vakna-ordet i facit för att mäta riktiga falsklarm.
+
+    python -m benchmarks.wakeword [--folder voicetest] [--labels facit.json] [--runs 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from Voice import SAMPLE_RATE, get_whisper_model, transcribe_audio
+from wakeword import WAKE_WORD, get_spotter_model, spot_wake_word
+from benchmarks.clips import CLIP_DIR, find_clips, load_clip
+
+
+def measure(fn, runs):
+    """Kör fn några gånger, returnerar (resultat, median vägg-s, median cpu-s)."""
+    walls, cpus = [], []
+    result = None
+    for _ in range(runs):
+        w0, c0 = time.perf_counter(), time.process_time()
+        result = fn()
+        walls.append(time.perf_counter() - w0)
+        cpus.append(time.process_time() - c0)
+    return result, statistics.median(walls), statistics.median(cpus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark för wake word-spottern")
+    parser.add_argument("--folder", default=CLIP_DIR)
+    parser.add_argument("--labels", help="JSON med facit per filnamn")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    clips = find_clips(args.folder)
+    if not clips:
+        print(f"Inga klipp hittades i {args.folder}")
+        return
+    if not labels:
+        print("OBS: inget --labels, facit är stora modellens text (falsklarm jämförs mot den)", flush=True)
+
+    # load and warm both models so the numbers are steady state
+    get_spotter_model()
+    warm = load_clip(clips[0])
+    spot_wake_word(warm)
+    # in this process, so its cpu time is counted
+    model = get_whisper_model()
+    transcribe_audio(warm, model=model)
+
+    rows = []
+    for path in clips:
+        name = os.path.basename(path)
+        samples = load_clip(path)
+        (found, heard), spot_wall, spot_cpu = measure(lambda: spot_wake_word(samples), args.runs)
+        full_text, full_wall, full_cpu = measure(lambda: transcribe_audio(samples, model=model), args.runs)
+        truth = labels[name] if name in labels else WAKE_WORD in full_text.lower()
+        rows.append({
+            "clip": name, "audio_s": len(samples) / SAMPLE_RATE, "truth": truth, "spotted": found,
+            "spot_wall": spot_wall, "spot_cpu": spot_cpu, "full_wall": full_wall, "full_cpu": full_cpu,
+        })
+        print(f"{name:<20} facit={truth!s:<5} spotter={found!s:<5} "
+              f"spotter {spot_wall * 1000:6.0f} ms ({spot_cpu:.2f} cpu-s) | "
+              f"stor {full_wall * 1000:6.0f} ms ({full_cpu:.2f} cpu-s) | hörde '{heard}'")
+
+    positives = [r for r in rows if r["truth"]]
+    negatives = [r for r in rows if not r["truth"]]
+    false_rejects = sum(1 for r in positives if not r["spotted"])
+    false_accepts = sum(1 for r in negatives if r["spotted"])
+    audio_total = sum(r["audio_s"] for r in rows)
+    cpu_old = sum(r["full_cpu"] for r in rows)
+    # the gated path always pays for the spotter, and for the big model only on accepts
+    cpu_gated = sum(r["spot_cpu"] + (r["full_cpu"] if r["spotted"] else 0) for r in rows)
+
+    print("\n=== Sammanfattning ===")
+    print(f"Klipp: {len(rows)} ({len(positives)} med vakna-ord, {len(negatives)} utan)")
+    print(f"Falska avvisningar: {false_rejects}/{len(positives)}" + (f" ({false_rejects / len(positives):.0%})" if positives else ""))
+    print(f"Falska larm:        {false_accepts}/{len(negatives)}" + (f" ({false_accepts / len(negatives):.0%})" if negatives else ""))
+    print(f"CPU-s per ljudsekund, stor modell på allt: {cpu_old / audio_total:.2f}")
+    print(f"CPU-s per ljudsekund, med spotter:         {cpu_gated / audio_total:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,35 @@ TEMPERATURE = 0.0
 
 
 SPOTIFY_CLIENT_ID = "spotifyid"
-SPOTIFY_CLIENT_SECRET = "spotifykey"
\ No newline at end of file
+SPOTIFY_CLIENT_SECRET = "spotifykey"
+
+# Whisper (speech to text). None = chosen automatically, calibrated once per computer
+# (see whisper_setup.py). Set a value to force it.
+WHISPER_SIZE = None           # "tiny", "base", "small", "medium", "large-v3"
+WHISPER_DEVICE = None         # "cuda" or "cpu"
+WHISPER_COMPUTE_TYPE = None   # "float16", "int8", "int8_float32"
+WHISPER_CPU_THREADS = None
+WHISPER_NUM_WORKERS = None
+WHISPER_RTF_TARGET = 0.5      # max seconds of compute per second of audio
+# run whisper in its own process (stt_worker.py) so the ui and screen ocr don't slow it down
+STT_WORKER_PROCESS = True
+
+# Wake word spotter (wakeword.py): how many seconds from the start of an utterance it listens for
+# "enigma". None = the whole utterance, like before the spotter. 2.0 is cheaper on long
+# utterances but only accepts the wake word at the start.
+WAKE_WINDOW_S = None
+
+# Text to speech. None = pick the fastest available backend at startup ("edge" or "piper").
+TTS_BACKEND = None
+# Offline Swedish voice for Piper (relative to the project folder), e.g. https://huggingface.co/rhasspy/piper-voices (sv_SE-nst-medium)
+PIPER_MODEL = "voices/sv_SE-nst-medium.onnx"
+
+# Agent answer cache (response_cache.py). Set to a local Ollama embedding model,
+# e.g. "nomic-embed-text", to also match near-identical questions.
+CACHE_EMBED_MODEL = None
+
+# Headless agent server (agent_server.py). 127.0.0.1 = this computer only, "0.0.0.0" to serve other computers.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+# Shared secret other computers must send (Authorization: Bearer <token>). Required unless SERVER_HOST is 127.0.0.1.
+SERVER_TOKEN = None
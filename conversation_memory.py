@@ -0,0 +1,146 @@
+"""
+Samtalsminne med en tokenbudget.
+
+De senaste turerna skickas ordagrant till modellen. Turer som inte längre
+får plats i budgeten viks in i en löpande sammanfattning, som uppdateras i
+en bakgrundstråd så att ingen fråga behöver vänta på den. Tills dess
+skickas de fortfarande ordagrant, så budgeten kan tillfälligt överskridas
+med de turer som väntar. Sammanfattningen görs högst var FOLD_INTERVAL_S
+sekund, så att den inte konkurrerar med varje ny fråga om samma modell.
+"""
+import threading
+import time
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+MEMORY_TOKEN_BUDGET = 1200   # summary + recent turns together
+SUMMARY_TOKEN_BUDGET = 300   # the summary is cut to this
+MIN_RECENT_TURNS = 1         # the last turn is always kept word for word
+CHARS_PER_TOKEN = 3.5        # rough for swedish with llama tokenizers, good enough for a budget
+FOLD_INTERVAL_S = 30.0       # at most one summary request this often
+MAX_PENDING_TOKENS = MEMORY_TOKEN_BUDGET  # if summaries keep failing, the oldest waiting turns go
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+
+class Turn:
+    __slots__ = ("user", "assistant", "tokens")
+
+    def __init__(self, user, assistant):
+        self.user = user
+        self.assistant = assistant
+        self.tokens = estimate_tokens(user) + estimate_tokens(assistant)
+
+
+class ConversationMemory:
+    """
+    summarize(sammanfattning, turer) -> ny sammanfattning. Den anropas i en
+    bakgrundstråd med de turer som fallit ur budgeten; saknas den kastas
+    de turerna bara.
+    """
+    def __init__(self, summarize=None, budget=MEMORY_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET,
+                 fold_interval=FOLD_INTERVAL_S):
+        self.summarize = summarize
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.fold_interval = fold_interval
+        self.last_fold = float("-inf")
+        self.lock = threading.Lock()
+        self.recent = []    # Turn, oldest first, sent verbatim
+        self.pending = []   # Turn that fell out of the budget and wait to be summarized
+        self.summary = ""
+        self.summarizing = False
+        self.turns_total = 0
+        self.summaries = 0
+
+    def add(self, user_text, assistant_text):
+        """Lägger till en tur och flyttar de äldsta till sammanfattningen om budgeten är slut."""
+        with self.lock:
+            self.recent.append(Turn(user_text, assistant_text))
+            self.turns_total += 1
+            self._trim()
+            if self.summarize is None:
+                self.pending = []
+            self._cap_pending()
+            start = (bool(self.pending) and not self.summarizing
+                     and time.monotonic() - self.last_fold >= self.fold_interval)
+            if start:
+                self.summarizing = True
+                self.last_fold = time.monotonic()
+        if start:
+            threading.Thread(target=self._fold, daemon=True).start()
+
+    def _trim(self):
+        # called with the lock held: whatever doesn't fit next to the summary waits to be folded in
+        room = self.budget - estimate_tokens(self.summary)
+        while len(self.recent) > MIN_RECENT_TURNS and sum(t.tokens for t in self.recent) > room:
+            self.pending.append(self.recent.pop(0))
+
+    def _cap_pending(self):
+        # called with the lock held
+        while len(self.pending) > 1 and sum(t.tokens for t in self.pending) > MAX_PENDING_TOKENS:
+            self.pending.pop(0)
+            print("DEBUG: Memory dropped a turn that waited too long for the summary", flush=True)
+
+    def _fold(self):
+        # one summary request per call, turns that fall out meanwhile wait for the next one
+        with self.lock:
+            turns = list(self.pending)
+            summary = self.summary
+        try:
+            new_summary = self.summarize(summary, [(t.user, t.assistant) for t in turns])
+        except Exception as e:
+            # the turns stay in pending (and in the prompt) until a later fold succeeds
+            print(f"DEBUG: Memory summary failed, {len(turns)} turns kept for the next try: {e}", flush=True)
+            with self.lock:
+                self.summarizing = False
+            return
+        max_chars = int(self.summary_budget * CHARS_PER_TOKEN)
+        with self.lock:
+            # the folded turns leave pending only now that the summary holds them
+            self.pending = [t for t in self.pending if t not in turns]
+            self.summary = (new_summary or "").strip()[:max_chars]
+            self.summaries += 1
+            self.summarizing = False
+            self._trim()  # a longer summary leaves less room for verbatim turns
+        usage = self.usage()
+        print(f"DEBUG: Memory folded {len(turns)} turns into the summary, now {usage['tokens']}/{usage['budget']} "
+              f"tokens ({usage['recent_turns']} recent turns, summary {usage['summary_tokens']})", flush=True)
+
+    def messages(self):
+        """Sammanfattningen (om någon) och de senaste turerna, som chattmeddelanden."""
+        with self.lock:
+            messages = []
+            if self.summary:
+                messages.append(SystemMessage(content=f"Sammanfattning av samtalet hittills: {self.summary}"))
+            # turns waiting for the summary are still sent, so nothing goes missing meanwhile
+            for turn in self.pending + self.recent:
+                messages += [HumanMessage(content=turn.user), AIMessage(content=turn.assistant)]
+            return messages
+
+    def key(self):
+        """Det modellen ser av samtalet, som text (svarscachen nycklar vanliga svar på den)."""
+        return "\n".join(m.content for m in self.messages())
+
+    def usage(self):
+        """Minnets storlek: turer, tokens och hur många gånger sammanfattningen uppdaterats."""
+        with self.lock:
+            recent_tokens = sum(t.tokens for t in self.recent)
+            pending_tokens = sum(t.tokens for t in self.pending)
+            summary_tokens = estimate_tokens(self.summary) if self.summary else 0
+            return {
+                "turns_total": self.turns_total,
+                "recent_turns": len(self.recent),
+                "pending_turns": len(self.pending),
+                "recent_tokens": recent_tokens,
+                "pending_tokens": pending_tokens,
+                "summary_tokens": summary_tokens,
+                "tokens": recent_tokens + pending_tokens + summary_tokens,
+                "budget": self.budget,
+                "summaries": self.summaries,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.recent, self.pending, self.summary = [], [], ""
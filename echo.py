@@ -0,0 +1,91 @@
+"""
+Enkel referensbaserad ekodämpning för barge-in.
+
+Det vi själva spelar upp sparas som en energikurva (RMS per ram) med tidsstämplar.
+En mikrofonram räknas bara som användarens röst om den är klart starkare än
+det eko som uppspelningen borde ge i just det ögonblicket.
+"""
+import threading
+import time
+from collections import deque
+import numpy as np
+from vad import frame_rms
+
+ECHO_FRAME_S = 0.03
+ECHO_LATENCY_S = 0.1   # rough speaker -> mic delay incl. mixer buffering
+ECHO_SPREAD_S = 0.1    # look this far around the delay, the real value is never exact
+ECHO_MARGIN = 2.0      # mic must be this many times louder than the expected echo
+REFERENCE_HISTORY_S = 30.0
+
+
+class PlaybackReference:
+    """Energikurvor för det som spelats upp de senaste sekunderna."""
+
+    def __init__(self):
+        self.segments = deque()
+        self.lock = threading.Lock()
+
+    def start(self, pcm, sample_rate):
+        """Registrerar att pcm (int16, mono eller flera kanaler) börjar spelas nu. Returnerar segmentet."""
+        samples = pcm.astype(np.float32)
+        if samples.ndim > 1: samples = samples.mean(axis=1)
+        frame = max(1, int(sample_rate * ECHO_FRAME_S))
+        n_frames = len(samples) // frame
+        envelope = np.sqrt(np.mean(samples[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1)) if n_frames else np.zeros(0)
+        now = time.monotonic()
+        segment = {"start": now, "end": now + len(samples) / sample_rate, "envelope": envelope}
+        with self.lock:
+            self.segments.append(segment)
+            while self.segments and self.segments[0]["end"] < now - REFERENCE_HISTORY_S:
+                self.segments.popleft()
+        return segment
+
+    def stop(self, segment):
+        """Uppspelningen avbröts, inget mer eko efter nu."""
+        with self.lock:
+            segment["end"] = min(segment["end"], time.monotonic())
+
+    def energy_around(self, t, spread=ECHO_SPREAD_S):
+        """Högsta referensenergi inom [t - spread, t + spread]."""
+        best = 0.0
+        with self.lock:
+            for segment in self.segments:
+                lo = max(t - spread, segment["start"])
+                hi = min(t + spread, segment["end"])
+                if hi <= lo: continue
+                i0 = int((lo - segment["start"]) / ECHO_FRAME_S)
+                i1 = int((hi - segment["start"]) / ECHO_FRAME_S) + 1
+                window = segment["envelope"][i0:i1]
+                if len(window): best = max(best, float(window.max()))
+        return best
+
+
+class EchoGate:
+    """
+    Avgör om en mikrofonram är användaren eller vårt eget eko.
+    Hur starkt högtalaren kommer tillbaka i mikrofonen (kopplingen) lärs in
+    som medianen av mic/referens under uppspelning, användaren pratar ju bara
+    en liten del av tiden.
+    """
+
+    def __init__(self, reference, initial_coupling=1.0):
+        self.reference = reference
+        self.initial_coupling = initial_coupling
+        self.ratios = deque(maxlen=100)
+
+    @property
+    def coupling(self):
+        if len(self.ratios) < 10: return self.initial_coupling
+        return float(np.median(self.ratios))
+
+    def is_user_speech(self, pcm, t, threshold):
+        """pcm är en int16-ram inspelad vid tiden t (time.monotonic)."""
+        mic = frame_rms(pcm)
+        ref = self.reference.energy_around(t - ECHO_LATENCY_S)
+        if ref <= 1.0:
+            return mic >= threshold
+        self.ratios.append(mic / ref)
+        return mic >= threshold and mic > ref * self.coupling * ECHO_MARGIN
+
+
+playback_reference = PlaybackReference()
@@ -0,0 +1,129 @@
+"""
+Snabbväg förbi LLM:en för självklara kommandon.
+
+"vad är klockan", "öppna spotify" och "spela jazz" behöver inte skickas
+till modellen med hela systemprompten. Här matchas hela yttrandet mot
+kompilerade mönster; bara när det är entydigt (och argumentet går att
+plocka ut) körs verktyget direkt, annars går texten vidare till LLM:en
+som vanligt.
+"""
+import atexit
+import re
+import threading
+import time
+
+# apps we open without asking the llm. word and anteckningar are left out on
+# purpose: the prompt sends those to create_notes_document/create_research_document
+KNOWN_APPS = {"kalkylator", "miniräknare", "utforskaren", "chrome", "spotify", "excel",
+              "powerpoint", "notepad", "calculator", "explorer"}
+
+# words that mean there's more to the request than one tool call
+COMPOUND = re.compile(r"\b(och|sen|sedan|skriv|fakta|om)\b")
+
+FILLER_START = re.compile(r"^(hej\s+)?(enigma[\s,.!?]+)?((kan|skulle) du\s+(snälla\s+)?)?(snälla\s+)?")
+FILLER_END = re.compile(r"[\s,]*(tack|åt mig|är du snäll)?[\s.!?]*$")
+
+
+def normalize(text):
+    text = text.lower().strip()
+    text = FILLER_START.sub("", text)
+    text = FILLER_END.sub("", text)
+    return re.sub(r"\s+", " ", text)
+
+
+def _no_args(match):
+    return {}
+
+
+def _app(match):
+    app = match.group("app").strip()
+    return {"app_name": app} if app in KNOWN_APPS else None
+
+
+def _music(match):
+    query = match.group("query")
+    query = re.sub(r"^(lite|någon|något|en låt med|låtar med|musik av|musik med|låten)\s+", "", query)
+    query = re.sub(r"\s+(på spotify|i spotify)$", "", query).strip()
+    if not query or query in ("musik", "något", "lite musik") or COMPOUND.search(query):
+        return None
+    return {"query": query}
+
+
+# (intent, tool, patterns, slots). slots turns the match into tool arguments,
+# or None when the match isn't certain enough to skip the llm
+INTENTS = [
+    ("time", "get_current_time", [
+        r"vad är klockan( nu)?",
+        r"hur mycket är klockan( nu)?",
+        r"vilken tid är det( nu)?",
+        r"vad är det för (dag|datum)( idag| i dag)?",
+        r"vilket datum är det( idag| i dag)?",
+    ], _no_args),
+    ("open_app", "open_application", [
+        r"(öppna|starta) (?P<app>[\wåäö .+-]{2,30})",
+    ], _app),
+    ("play_music", "play_music", [
+        r"spela (?!in\b|upp\b)(?P<query>.{2,60})",
+    ], _music),
+]
+COMPILED = [(intent, tool, [re.compile(f"^{p}$") for p in patterns], slots)
+            for intent, tool, patterns, slots in INTENTS]
+
+
+def route(text):
+    """(intent, verktyg, argument) om texten är ett entydigt kommando, annars None."""
+    text = normalize(text)
+    for intent, tool, patterns, slots in COMPILED:
+        for pattern in patterns:
+            match = pattern.match(text)
+            if match:
+                args = slots(match)
+                if args is not None:
+                    return intent, tool, args
+    return None
+
+
+class RouterStats:
+    """Träffar per intent och ungefär hur mycket tid snabbvägen sparade jämfört med LLM:en."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = 0
+        self.hits = {}      # intent -> count
+        self.route_ms = {}  # intent -> summed matching time (the tool runs either way)
+        self.llm_ms = None  # running average of how long the llm takes to decide
+
+    def record_llm(self, ms):
+        with self.lock:
+            self.total += 1
+            self.llm_ms = ms if self.llm_ms is None else 0.8 * self.llm_ms + 0.2 * ms
+
+    def record_hit(self, intent, ms):
+        with self.lock:
+            self.total += 1
+            self.hits[intent] = self.hits.get(intent, 0) + 1
+            self.route_ms[intent] = self.route_ms.get(intent, 0.0) + ms
+
+    def summary(self):
+        with self.lock:
+            if not self.total:
+                return "Snabbväg: inga kommandon än."
+            hits = sum(self.hits.values())
+            lines = [f"Snabbväg: {hits}/{self.total} kommandon ({hits / self.total:.0%}) utan LLM"]
+            for intent, count in sorted(self.hits.items(), key=lambda kv: -kv[1]):
+                avg = self.route_ms[intent] / count
+                saved = f", ~{self.llm_ms - avg:.0f} ms sparat per gång" if self.llm_ms else ""
+                lines.append(f"  {intent:<11} {count:>4} ({count / self.total:.0%}), matchning {avg:.2f} ms{saved}")
+            return "\n".join(lines)
+
+
+router_stats = RouterStats()
+atexit.register(lambda: router_stats.total and print(router_stats.summary(), flush=True))
+
+
+if __name__ == "__main__":
+    import sys
+    for line in (sys.argv[1:] or sys.stdin):
+        t_start = time.perf_counter()
+        result = route(line)
+        print(f"{line.strip()!r:<40} -> {result} ({(time.perf_counter() - t_start) * 1000:.3f} ms)")
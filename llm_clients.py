@@ -0,0 +1,89 @@
+"""
+Ett gemensamt register för alla Ollama-klienter.
+
+Agenten och verktygen (research-dokument, textredigering) skapade förut
+egna ChatOllama-klienter, vissa utan keep_alive, så ett verktygsanrop
+kunde få Ollama att ladda ur modellen eller ladda den på nytt. Här delas
+klienterna ut per roll, alla med samma modell, samma keep_alive och en
+gemensam HTTP-anslutningspool. Varje svar kontrolleras också: tog
+laddningen av modellen märkbar tid räknas det som en omladdning.
+"""
+import atexit
+import threading
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_ollama import ChatOllama
+from config import MODEL_NAME, TEMPERATURE
+
+LLM_KEEP_ALIVE = "1h"      # the same for every request, otherwise the last one sets when the model unloads
+RELOAD_THRESHOLD_MS = 500  # load_duration above this means the model was (re)loaded for the call
+NS_PER_MS = 1_000_000
+
+# per role: temperature. every role uses MODEL_NAME so ollama keeps a single model loaded
+ROLES = {
+    "router": {"temperature": TEMPERATURE},   # the agent: picks tools and answers
+    "summarizer": {"temperature": 0.3},       # research documents, memory summary
+    "editor": {"temperature": 0.1},           # improve_active_document
+}
+
+# one connection pool for every client. the async pool is only used from the agent loop
+_sync_transport = httpx.HTTPTransport(limits=httpx.Limits(max_connections=8, max_keepalive_connections=8))
+_async_transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=8, max_keepalive_connections=8))
+
+
+class ReloadCounter(BaseCallbackHandler):
+    """Räknar anrop och omladdningar av modellen per roll, ur Ollamas load_duration."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.reloads = {}
+
+    def record(self, role, load_ms):
+        with self.lock:
+            self.calls[role] = self.calls.get(role, 0) + 1
+            if load_ms >= RELOAD_THRESHOLD_MS:
+                self.reloads[role] = self.reloads.get(role, 0) + 1
+        if load_ms >= RELOAD_THRESHOLD_MS:
+            print(f"DEBUG: Ollama loaded {MODEL_NAME} for a {role} call ({load_ms:.0f} ms)", flush=True)
+
+    def summary(self):
+        with self.lock:
+            if not self.calls:
+                return ""
+            parts = ", ".join(f"{role} {self.reloads.get(role, 0)}/{n}" for role, n in self.calls.items())
+        return f"LLM reloads per role (reloads/calls): {parts}"
+
+
+reload_counter = ReloadCounter()
+atexit.register(lambda: reload_counter.summary() and print(reload_counter.summary(), flush=True))
+
+
+class _RoleCallback(BaseCallbackHandler):
+    def __init__(self, role):
+        self.role = role
+
+    def on_llm_end(self, response, **kwargs):
+        try:
+            info = response.generations[0][0].generation_info or {}
+        except (IndexError, AttributeError):
+            return
+        reload_counter.record(self.role, (info.get("load_duration") or 0) / NS_PER_MS)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_llm(role):
+    """Den delade klienten för rollen ("router", "summarizer" eller "editor")."""
+    with _clients_lock:
+        if role not in _clients:
+            _clients[role] = ChatOllama(
+                model=MODEL_NAME,
+                keep_alive=LLM_KEEP_ALIVE,
+                sync_client_kwargs={"transport": _sync_transport},
+                async_client_kwargs={"transport": _async_transport},
+                callbacks=[_RoleCallback(role)],
+                **ROLES[role],
+            )
+    return _clients[role]
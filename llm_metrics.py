@@ -0,0 +1,117 @@
+"""
+Ollamas egna räknare för varje LLM-anrop.
+
+Ollama rapporterar hur många prompt-tokens som faktiskt utvärderades
+(prompt_eval_count) och hur lång tid det tog. När början av prompten är
+densamma som förra anropet återanvänds KV-cachen och bara det nya räknas,
+så de här siffrorna visar direkt om cachen träffar.
+
+ToolCallStats räknar hur modellens verktygsanrop ser ut: giltiga, med fel
+namn som fick rättas, eller trasiga (ogiltig JSON, okänt verktyg, argument
+som inte stämmer med verktygets schema).
+"""
+import atexit
+import threading
+
+# print one line per call (benchmarks turn it off)
+LLM_METRICS_LOG = True
+
+NS_PER_MS = 1_000_000
+
+
+def eval_metrics(metadata, ttft_ms=None):
+    """Plockar ut tokens och millisekunder ur ett svars response_metadata (Ollama rapporterar nanosekunder)."""
+    metadata = metadata or {}
+    return {
+        "prompt_tokens": metadata.get("prompt_eval_count") or 0,
+        "prompt_eval_ms": (metadata.get("prompt_eval_duration") or 0) / NS_PER_MS,
+        "eval_tokens": metadata.get("eval_count") or 0,
+        "eval_ms": (metadata.get("eval_duration") or 0) / NS_PER_MS,
+        "load_ms": (metadata.get("load_duration") or 0) / NS_PER_MS,
+        "total_ms": (metadata.get("total_duration") or 0) / NS_PER_MS,
+        "ttft_ms": ttft_ms,
+    }
+
+
+class EvalStats:
+    """
+    Samlar räknarna per anropstyp så att före/efter kan jämföras. Bara summor
+    sparas (servern kör länge), plus det första anropet: det är det enda som
+    utvärderar hela prompten, de senare återanvänder KV-cachen.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}  # kind -> running totals, see record()
+
+    def record(self, kind, metadata, ttft_ms=None):
+        metrics = eval_metrics(metadata, ttft_ms)
+        with self.lock:
+            totals = self.calls.get(kind)
+            if totals is None:
+                totals = self.calls[kind] = {"n": 0, "prompt_tokens": 0, "prompt_eval_ms": 0.0,
+                                             "ttfts": 0, "ttft_ms": 0.0, "first": metrics}
+            totals["n"] += 1
+            totals["prompt_tokens"] += metrics["prompt_tokens"]
+            totals["prompt_eval_ms"] += metrics["prompt_eval_ms"]
+            if ttft_ms is not None:
+                totals["ttfts"] += 1
+                totals["ttft_ms"] += ttft_ms
+        if LLM_METRICS_LOG:
+            ttft = f", first token {ttft_ms:.0f} ms" if ttft_ms is not None else ""
+            print(f"DEBUG: LLM {kind}: prompt {metrics['prompt_tokens']} tok in {metrics['prompt_eval_ms']:.0f} ms, "
+                  f"answer {metrics['eval_tokens']} tok in {metrics['eval_ms']:.0f} ms, "
+                  f"load {metrics['load_ms']:.0f} ms{ttft}", flush=True)
+        return metrics
+
+    def summary(self):
+        lines = []
+        with self.lock:
+            for kind, totals in self.calls.items():
+                n = totals["n"]
+                ttft = f", first token {totals['ttft_ms'] / totals['ttfts']:.0f} ms" if totals["ttfts"] else ""
+                first = totals["first"]
+                lines.append(f"LLM {kind}: {n} calls, prompt eval {totals['prompt_tokens'] / n:.0f} tok / "
+                             f"{totals['prompt_eval_ms'] / n:.0f} ms avg{ttft} (first call {first['prompt_tokens']} tok / "
+                             f"{first['prompt_eval_ms']:.0f} ms)")
+        return "\n".join(lines)
+
+
+llm_stats = EvalStats()
+atexit.register(lambda: llm_stats.summary() and print(llm_stats.summary(), flush=True))
+
+
+class ToolCallStats:
+    """Utfall per källa ("native" = Ollamas tool_calls, "text" = JSON i svarstexten)."""
+
+    OK = "ok"
+    RENAMED = "renamed"
+    MALFORMED = ("bad_json", "unknown_tool", "bad_args")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}  # (source, outcome) -> count
+
+    def record(self, source, outcome, detail=""):
+        with self.lock:
+            self.counts[(source, outcome)] = self.counts.get((source, outcome), 0) + 1
+        if outcome in self.MALFORMED:
+            print(f"DEBUG: Malformed tool call ({source}, {outcome}): {detail}", flush=True)
+
+    def malformed_rate(self):
+        with self.lock:
+            total = sum(self.counts.values())
+            bad = sum(n for (_, outcome), n in self.counts.items() if outcome in self.MALFORMED)
+        return bad / total if total else 0.0
+
+    def summary(self):
+        with self.lock:
+            if not self.counts:
+                return ""
+            total = sum(self.counts.values())
+            parts = ", ".join(f"{source}/{outcome} {n}" for (source, outcome), n in sorted(self.counts.items()))
+        return f"Tool calls: {total} ({self.malformed_rate():.0%} malformed): {parts}"
+
+
+tool_call_stats = ToolCallStats()
+atexit.register(lambda: tool_call_stats.counts and print(tool_call_stats.summary(), flush=True))
@@ -0,0 +1,173 @@
+"""
+Cache för agentens svar, framför LLM-anropen.
+
+"vem är Sveriges statsminister?" kostar annars ett routing-anrop,
+search_web och ett analysanrop varje gång. Svaren sparas under den
+normaliserade frågan; med CACHE_EMBED_MODEL i config.py matchas även
+nästan likadana frågor via inbäddningar från en lokal Ollama-modell.
+
+Hur länge ett svar gäller beror på verktyget (TOOL_TTL): tid och
+handlingar (öppna program, spela musik, skriva dokument) sparas aldrig,
+sökningar bara en kort stund. Vanliga svar beror på samtalet och nycklas
+därför även på historiken.
+"""
+import atexit
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import CACHE_EMBED_MODEL
+
+CACHE_MAX_ENTRIES = 256
+CACHE_SIMILARITY = 0.92     # cosine similarity needed for a near-duplicate question to count
+PLAIN_ANSWER_TTL = 30 * 60  # answers without a tool
+# tool answers are stored under this instead of the conversation. it can't be a real history
+# (those are message text), so a plain answer from an empty history never matches on it
+TOOL_CONTEXT = "\x00tool"
+
+# seconds an answer from the tool stays valid, 0 = never cached.
+# tools that aren't listed are never cached either
+TOOL_TTL = {
+    "search_web": 10 * 60,  # news changes
+    "create_research_document": 0,
+    "get_current_time": 0,
+    "open_application": 0,
+    "play_music": 0,
+}
+
+
+def normalize(text):
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    text = re.sub(r"^\s*(hej\s+)?enigma\b", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class CacheEntry:
+    __slots__ = ("text", "context", "output", "tool", "expires", "vector")
+
+    def __init__(self, text, context, output, tool, expires, vector=None):
+        self.text = text
+        self.context = context
+        self.output = output
+        self.tool = tool
+        self.expires = expires
+        self.vector = vector
+
+
+class ResponseCache:
+    """
+    LRU med högst max_entries svar. get() ger (svar, verktyg) eller None;
+    context är samtalshistoriken för svar som inte kom från ett verktyg.
+    """
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, embed_model=CACHE_EMBED_MODEL, similarity=CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> CacheEntry, least recently used first
+        self.embedder = None
+        if embed_model:
+            try:
+                from langchain_ollama import OllamaEmbeddings
+                self.embedder = OllamaEmbeddings(model=embed_model)
+            except Exception as e:
+                print(f"DEBUG: Response cache without embeddings ({e})", flush=True)
+        self.stats = {"exact": 0, "similar": 0, "miss": 0, "expired": 0, "stored": 0, "evicted": 0}
+
+    @staticmethod
+    def key(text, context=""):
+        return hashlib.sha256(f"{context}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _embed(self, text):
+        if self.embedder is None:
+            return None
+        try:
+            vector = np.asarray(self.embedder.embed_query(text), dtype=np.float32)
+        except Exception as e:
+            # the model isn't pulled or ollama is down: exact matching only from now on
+            print(f"DEBUG: Embedding failed, response cache falls back to exact matches ({e})", flush=True)
+            self.embedder = None
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _live(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= now:
+            del self.entries[key]
+            self.stats["expired"] += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def get(self, text, context=""):
+        text = normalize(text)
+        now = time.time()
+        with self.lock:
+            # tool answers don't depend on the conversation, plain answers do
+            for key in (self.key(text, TOOL_CONTEXT), self.key(text, context)):
+                entry = self._live(key, now)
+                if entry:
+                    self.stats["exact"] += 1
+                    return entry.output, entry.tool
+            if self.embedder is None or not self.entries:
+                self.stats["miss"] += 1
+                return None
+
+        vector = self._embed(text)
+        if vector is None:
+            with self.lock:
+                self.stats["miss"] += 1
+            return None
+        with self.lock:
+            best, best_key, best_score = None, None, self.similarity
+            for key, entry in self.entries.items():
+                if entry.vector is None or entry.expires <= now:
+                    continue
+                if entry.context != (TOOL_CONTEXT if entry.tool is not None else context):
+                    continue
+                score = float(np.dot(vector, entry.vector))
+                if score >= best_score:
+                    best, best_key, best_score = entry, key, score
+            if best is None:
+                self.stats["miss"] += 1
+                return None
+            self.entries.move_to_end(best_key)
+            self.stats["similar"] += 1
+        print(f"DEBUG: Response cache: '{text}' ~ '{best.text}' ({best_score:.2f})", flush=True)
+        return best.output, best.tool
+
+    def put(self, text, output, tool=None, context=""):
+        """Sparar svaret om verktyget får cachas. Svar utan verktyg nycklas på context."""
+        ttl = PLAIN_ANSWER_TTL if tool is None else TOOL_TTL.get(tool, 0)
+        if not ttl or not output:
+            return
+        text = normalize(text)
+        if tool is not None:
+            context = TOOL_CONTEXT
+        vector = self._embed(text)
+        with self.lock:
+            key = self.key(text, context)
+            self.entries[key] = CacheEntry(text, context, output, tool, time.time() + ttl, vector)
+            self.entries.move_to_end(key)
+            self.stats["stored"] += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def summary(self):
+        with self.lock:
+            s = dict(self.stats)
+        lookups = s["exact"] + s["similar"] + s["miss"]
+        if not lookups:
+            return ""
+        hits = s["exact"] + s["similar"]
+        return (f"Response cache: {hits}/{lookups} hits ({hits / lookups:.0%}; exact {s['exact']}, "
+                f"similar {s['similar']}), {s['expired']} expired, {s['stored']} stored, {s['evicted']} evicted")
+
+
+response_cache = ResponseCache()
+atexit.register(lambda: response_cache.summary() and print(response_cache.summary(), flush=True))
@@ -0,0 +1,194 @@
+"""
+Whisper i en egen process.
+
+Tal-till-text delar annars tolk (och GIL) med customtkinter, OCR-loopen och
+allt annat, så tungt arbete där ger ryck i röstturerna. Här laddas modellen
+i en separat process. Ljudet lämnas över genom återanvända
+multiprocessing.shared_memory-block (ingen pickling av samplen), och bara en
+liten beskrivning (blocknamn, längd, prompt) och texten tillbaka går över en Pipe.
+"""
+import atexit
+import multiprocessing
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+import queue
+import numpy as np
+
+SAMPLE_RATE = 16000
+STT_SLOTS = 2              # how many utterances can be in flight at once (stream worker + listen)
+STT_SLOT_SECONDS = 60      # longer audio gets a one-off block
+STT_START_TIMEOUT = 600    # first run on a new computer may calibrate before it is ready
+
+
+def _attach(name):
+    """Öppnar ett befintligt block. Föräldern äger det och tar bort det (unlink)."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # a spawned child shares the parent's resource tracker, registering twice is harmless
+    return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(conn):
+    """Barnprocessen: laddar Whisper en gång och transkriberar det föräldern skickar."""
+    from faster_whisper import WhisperModel
+    from whisper_setup import resolve_whisper_config
+
+    cfg = resolve_whisper_config()
+    try:
+        model = WhisperModel(cfg["size"], device=cfg["device"], compute_type=cfg["compute_type"],
+                             cpu_threads=cfg["cpu_threads"], num_workers=cfg["num_workers"])
+    except Exception:
+        model = WhisperModel(cfg["size"], device="cpu", compute_type="int8",
+                             cpu_threads=cfg["cpu_threads"], num_workers=cfg["num_workers"])
+    conn.send(("ready", cfg))
+
+    blocks = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == "stop":
+            break
+        _, request_id, name, length, prompt, beam_size = message
+        try:
+            if name not in blocks:
+                blocks[name] = _attach(name)
+            samples = np.ndarray((length,), dtype=np.float32, buffer=blocks[name].buf)
+            t_start = time.perf_counter()
+            segments, info = model.transcribe(samples, language="sv", beam_size=beam_size, initial_prompt=prompt)
+            text = "".join([segment.text for segment in segments]).strip()
+            del samples
+            conn.send((request_id, text, (time.perf_counter() - t_start) * 1000))
+        except Exception as e:
+            conn.send((request_id, None, str(e)))
+        if name.startswith("oneoff"):
+            try: blocks.pop(name).close()
+            except Exception: pass
+
+    for shm in blocks.values():
+        try: shm.close()
+        except Exception: pass
+
+
+class STTWorker:
+    """
+    Föräldersidan. transcribe() kopierar samplen till ett ledigt block,
+    skickar en kort beskrivning och väntar på texten.
+    """
+    def __init__(self, slots=STT_SLOTS, slot_seconds=STT_SLOT_SECONDS):
+        self.slot_samples = int(slot_seconds * SAMPLE_RATE)
+        self.blocks = [shared_memory.SharedMemory(create=True, size=self.slot_samples * 4) for _ in range(slots)]
+        self.free = queue.Queue()
+        for block in self.blocks:
+            self.free.put(block)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.ids = 0
+        self.ready = threading.Event()
+        self.cfg = None
+        self.alive = True
+        self.stopped = False
+
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True, name="stt-worker")
+        self.process.start()
+        child_conn.close()
+        threading.Thread(target=self._read_replies, daemon=True).start()
+
+    def _read_replies(self):
+        while True:
+            try:
+                reply = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if reply[0] == "ready":
+                self.cfg = reply[1]
+                self.ready.set()
+                continue
+            request_id, text, extra = reply
+            with self.lock:
+                future = self.pending.pop(request_id, None)
+            if future is None:
+                continue
+            if text is None:
+                future.set_exception(RuntimeError(extra))
+            else:
+                future.set_result((text, extra))
+
+        # the process is gone: nobody will answer what is still waiting
+        self.alive = False
+        self.ready.set()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("STT-processen avslutades"))
+
+    def wait_ready(self, timeout=STT_START_TIMEOUT):
+        """Väntar tills modellen är laddad i barnprocessen. False om den inte startade."""
+        self.ready.wait(timeout)
+        return self.alive and self.cfg is not None
+
+    def transcribe(self, samples, prompt=None, beam_size=1):
+        """(text, millisekunder i whisper) för en float32-array i 16 kHz."""
+        if not self.alive:
+            raise RuntimeError("STT-processen körs inte")
+        samples = np.asarray(samples, dtype=np.float32)
+        oneoff = None
+        if len(samples) > self.slot_samples:
+            block = oneoff = shared_memory.SharedMemory(create=True, size=len(samples) * 4,
+                                                         name=f"oneoff_{uuid.uuid4().hex[:12]}")
+        else:
+            block = self.free.get()
+        try:
+            np.ndarray((len(samples),), dtype=np.float32, buffer=block.buf)[:] = samples
+            future = Future()
+            with self.lock:
+                if not self.alive:
+                    raise RuntimeError("STT-processen körs inte")
+                self.ids += 1
+                request_id = self.ids
+                self.pending[request_id] = future
+                self.conn.send(("transcribe", request_id, block.name, len(samples), prompt, beam_size))
+            return future.result()
+        finally:
+            if oneoff:
+                oneoff.close()
+                oneoff.unlink()
+            else:
+                self.free.put(block)
+
+    def stop(self):
+        """Avslutar processen och tar bort minnesblocken. Körs även vid programslut."""
+        if self.stopped: return
+        self.stopped = True
+        try:
+            self.conn.send(("stop",))
+        except Exception:
+            pass
+        self.process.join(timeout=5)
+        for block in self.blocks:
+            try:
+                block.close()
+                block.unlink()
+            except Exception:
+                pass
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_stt_worker():
+    """Den gemensamma STT-processen, startas första gången den behövs."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = STTWorker()
+            # otherwise the shared memory blocks outlive the app
+            atexit.register(_worker.stop)
+    return _worker
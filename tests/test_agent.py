@@ -0,0 +1,51 @@
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+# the agent's llm clients come from langchain_ollama, nothing talks to ollama here
+agent = pytest.importorskip("agent")
+
+
+@pytest.fixture(scope="module")
+def executor():
+    return agent.get_agent(tool_names=["get_current_time"])
+
+
+def stream(executor, *pieces):
+    """Matar bitarna genom en StreamTurn. Ger (meningar före flush, hela listan, turen)."""
+    said = []
+    turn = agent.StreamTurn(executor, said.append)
+    for piece in pieces:
+        if turn.feed(AIMessageChunk(content=piece)):
+            break
+    before_flush = list(said)
+    if turn.tool_call is None:
+        turn.flush()
+    return before_flush, said, turn
+
+
+def test_sentences_stream_as_they_close():
+    splitter = agent.SentenceSplitter()
+    assert splitter.feed("Hej där. Klockan är ") == ["Hej där."]
+    assert splitter.feed("tre. 3.") == ["Klockan är tre."]
+    assert splitter.flush() == ["3."]
+
+
+def test_json_tool_call_in_the_text_is_held_and_dispatched(executor):
+    before_flush, said, turn = stream(executor, 'Visst. {"name": "get_current_', 'time", "parameters": {}}', " mer text")
+    assert turn.tool_call == ("get_current_time", {})
+    assert said == []
+
+
+def test_braces_that_are_no_tool_call_keep_streaming(executor):
+    before_flush, said, turn = stream(executor, "Mängden {1, 2} har två element. ", "Den är liten. ",
+                                      "Mer kommer ", "sen.")
+    assert turn.tool_call is None
+    # said while the model was still writing, not only at the end
+    assert before_flush == ["Mängden {1, 2} har två element.", "Den är liten."]
+    assert said == before_flush + ["Mer kommer sen."]
+
+
+def test_a_later_tool_call_is_still_caught(executor):
+    before_flush, said, turn = stream(executor, "Svar {a} här. ", '{"name": "get_current_time", "parameters": {}}')
+    assert turn.tool_call == ("get_current_time", {})
+    assert said == ["Svar {a} här."]
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+
+# agent_server needs aiohttp and the agent's llm clients
+agent_server = pytest.importorskip("agent_server")
+FairQueue, QueueFull = agent_server.FairQueue, agent_server.QueueFull
+
+
+def test_sessions_take_turns():
+    async def scenario():
+        queue = FairQueue(max_inflight=1, max_queued=10, per_session=4)
+        order = []
+
+        async def request(session_id):
+            await queue.acquire(session_id)
+            order.append(session_id)
+            await asyncio.sleep(0)
+            queue.release(session_id)
+
+        await queue.acquire("första")
+        tasks = [asyncio.create_task(request(s)) for s in ("girig", "girig", "girig", "a", "b")]
+        await asyncio.sleep(0)
+        queue.release("första")
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["girig", "a", "b", "girig", "girig"]
+
+
+def test_full_queue_rejects():
+    async def scenario():
+        queue = FairQueue(max_inflight=1, max_queued=10, per_session=1)
+        await queue.acquire("a")
+        waiting = asyncio.create_task(queue.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            await queue.acquire("a")
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert queue.queued == 0
+
+    asyncio.run(scenario())
+
+
+class EchoAgent:
+    """Står i för agenten: svarar med frågan, utan LLM."""
+
+    def new_memory(self):
+        return None
+
+    async def ainvoke(self, payload):
+        return {"output": payload["input"]}
+
+
+def post_chat(body):
+    from aiohttp.test_utils import TestClient, TestServer
+
+    async def scenario():
+        async with TestClient(TestServer(agent_server.AgentServer(EchoAgent()).app())) as client:
+            response = await client.post("/chat", json=body)
+            return response.status, await response.json()
+
+    return asyncio.run(scenario())
+
+
+def test_chat_answers():
+    status, reply = post_chat({"input": "hej", "session": "s1"})
+    assert status == 200
+    assert reply == {"session": "s1", "output": "hej"}
+
+
+@pytest.mark.parametrize("body", [["hej"], "hej", 3, None])
+def test_chat_rejects_a_body_that_is_not_an_object(body):
+    status, reply = post_chat(body)
+    assert status == 400
+    assert "error" in reply
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+# audio_capture opens the microphone through these, the buffer itself needs neither
+pytest.importorskip("pyaudio")
+pytest.importorskip("speech_recognition")
+from audio_capture import AudioRingBuffer, CaptureReader
+
+
+def ramp(start, n):
+    return (np.arange(start, start + n) % 30000).astype(np.int16)
+
+
+def test_read_across_the_wrap():
+    buffer = AudioRingBuffer(seconds=1, sample_rate=100)
+    buffer.write(ramp(0, 80))
+    buffer.write(ramp(80, 50))
+    assert buffer.written == 130
+    assert buffer.oldest == 30
+    assert np.array_equal(buffer.read(60, 130), ramp(60, 70))
+
+
+def test_read_clamps_to_what_is_left():
+    buffer = AudioRingBuffer(seconds=1, sample_rate=100)
+    buffer.write(ramp(0, 150))
+    assert np.array_equal(buffer.read(0, 70), ramp(50, 20))
+    assert len(buffer.read(150, 200)) == 0
+
+
+def test_write_larger_than_the_buffer_keeps_positions():
+    buffer = AudioRingBuffer(seconds=1, sample_rate=100)
+    buffer.write(ramp(0, 30))
+    buffer.write(ramp(30, 250))
+    assert buffer.written == 280
+    assert buffer.oldest == 180
+    assert np.array_equal(buffer.read(180, 280), ramp(180, 100))
+    buffer.write(ramp(280, 10))
+    assert np.array_equal(buffer.read(200, 290), ramp(200, 90))
+
+
+def test_reader_that_fell_behind_skips_ahead():
+    buffer = AudioRingBuffer(seconds=1, sample_rate=100)
+    reader = CaptureReader(buffer, 0)
+    buffer.write(ramp(0, 250))
+    assert np.array_equal(reader.read(20, timeout=0), ramp(150, 20))
+    assert reader.position == 170
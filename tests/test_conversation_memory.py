@@ -0,0 +1,83 @@
+import time
+import pytest
+from conversation_memory import ConversationMemory, estimate_tokens
+
+
+def wait_for_fold(memory, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with memory.lock:
+            if not memory.summarizing:
+                return
+        time.sleep(0.01)
+    pytest.fail("the summary thread never finished")
+
+
+def turn(i):
+    return f"fråga nummer {i} " * 5, f"svar nummer {i} " * 5
+
+
+def test_turns_within_budget_stay_verbatim():
+    memory = ConversationMemory(summarize=lambda summary, turns: "borde inte anropas", budget=10_000)
+    for i in range(3):
+        memory.add(*turn(i))
+    assert [m.content for m in memory.messages()] == [part for i in range(3) for part in turn(i)]
+    assert memory.usage()["summaries"] == 0
+
+
+def test_turns_over_budget_fold_into_summary():
+    calls = []
+
+    def summarize(summary, turns):
+        calls.append((summary, turns))
+        return "kort sammanfattning"
+
+    one_turn = estimate_tokens(turn(0)[0]) + estimate_tokens(turn(0)[1])
+    memory = ConversationMemory(summarize=summarize, budget=one_turn * 2 + 20, fold_interval=0)
+    for i in range(3):
+        memory.add(*turn(i))
+    wait_for_fold(memory)
+
+    assert calls == [("", [turn(0)])]
+    messages = memory.messages()
+    assert messages[0].content.endswith("kort sammanfattning")
+    assert [m.content for m in messages[1:]] == [*turn(1), *turn(2)]
+    assert memory.usage()["pending_turns"] == 0
+
+
+def test_failed_fold_keeps_turns_in_the_prompt():
+    def summarize(summary, turns):
+        raise RuntimeError("ollama nere")
+
+    one_turn = estimate_tokens(turn(0)[0]) + estimate_tokens(turn(0)[1])
+    memory = ConversationMemory(summarize=summarize, budget=one_turn + 5, fold_interval=0)
+    memory.add(*turn(0))
+    memory.add(*turn(1))
+    wait_for_fold(memory)
+
+    # nothing lost: the turn that didn't fit is still sent, and waits for the next try
+    assert [m.content for m in memory.messages()] == [*turn(0), *turn(1)]
+    assert memory.usage()["pending_turns"] == 1
+    assert memory.summary == ""
+
+
+def test_fold_waits_for_the_interval():
+    calls = []
+    one_turn = estimate_tokens(turn(0)[0]) + estimate_tokens(turn(0)[1])
+    memory = ConversationMemory(summarize=lambda s, turns: calls.append(turns) or "s",
+                                budget=one_turn + 5, fold_interval=60)
+    for i in range(4):
+        memory.add(*turn(i))
+        wait_for_fold(memory)
+    # one request, the turns that fell out after it wait for the interval
+    assert len(calls) == 1
+    assert memory.usage()["pending_turns"] == 2
+
+
+def test_without_summarize_old_turns_are_dropped():
+    one_turn = estimate_tokens(turn(0)[0]) + estimate_tokens(turn(0)[1])
+    memory = ConversationMemory(budget=one_turn + 5)
+    for i in range(3):
+        memory.add(*turn(i))
+    assert [m.content for m in memory.messages()] == list(turn(2))
+    assert memory.usage()["pending_turns"] == 0
@@ -0,0 +1,42 @@
+import pytest
+from intent_router import FILLER_START, normalize, route
+
+
+@pytest.mark.parametrize("text, rest", [
+    ("enigma vad är klockan", "vad är klockan"),
+    ("enigma, vad är klockan", "vad är klockan"),
+    ("enigma! vad är klockan", "vad är klockan"),
+    ("hej enigma. kan du öppna spotify", "öppna spotify"),
+    ("skulle du snälla öppna spotify", "öppna spotify"),
+    ("snälla öppna spotify", "öppna spotify"),
+    ("enigmatisk musik", "enigmatisk musik"),
+])
+def test_filler_start(text, rest):
+    assert FILLER_START.sub("", text) == rest
+
+
+def test_normalize_strips_both_ends():
+    assert normalize("  Hej Enigma, kan du öppna Spotify åt mig!  ") == "öppna spotify"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Enigma, vad är klockan?", ("time", "get_current_time", {})),
+    ("Vilket datum är det idag", ("time", "get_current_time", {})),
+    ("Kan du öppna Spotify", ("open_app", "open_application", {"app_name": "spotify"})),
+    ("Spela Abba på Spotify", ("play_music", "play_music", {"query": "abba"})),
+])
+def test_route_hits(text, expected):
+    assert route(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "öppna word",                            # the prompt sends this to a document tool
+    "öppna något program jag inte känner",
+    "spela musik",                           # too vague for a query
+    "spela in ett meddelande",
+    "spela abba och skriv en text om dem",   # more than one tool call
+    "vad är klockan i tokyo och vädret där",
+    "vem är sveriges statsminister",
+])
+def test_route_leaves_the_rest_to_the_llm(text):
+    assert route(text) is None
@@ -0,0 +1,22 @@
+import llm_metrics
+from llm_metrics import EvalStats, NS_PER_MS
+
+
+def metadata(tokens, ms):
+    return {"prompt_eval_count": tokens, "prompt_eval_duration": ms * NS_PER_MS}
+
+
+def test_summary_keeps_the_first_call_apart(monkeypatch):
+    monkeypatch.setattr(llm_metrics, "LLM_METRICS_LOG", False)
+    stats = EvalStats()
+    stats.record("ainvoke", metadata(900, 400), ttft_ms=120)
+    for _ in range(999):
+        stats.record("ainvoke", metadata(30, 20), ttft_ms=60)
+
+    assert stats.calls["ainvoke"]["n"] == 1000
+    assert stats.summary() == ("LLM ainvoke: 1000 calls, prompt eval 31 tok / 20 ms avg, first token 60 ms "
+                               "(first call 900 tok / 400 ms)")
+
+
+def test_empty_summary():
+    assert EvalStats().summary() == ""
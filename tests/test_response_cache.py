@@ -0,0 +1,71 @@
+import pytest
+import response_cache
+from response_cache import ResponseCache, PLAIN_ANSWER_TTL, TOOL_TTL
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(clock):
+    return ResponseCache(embed_model=None)
+
+
+def test_normalize_ignores_case_punctuation_and_wake_word():
+    assert response_cache.normalize("Hej Enigma, vem är Sveriges statsminister?") == "vem är sveriges statsminister"
+
+
+def test_plain_answer_depends_on_the_conversation(cache):
+    cache.put("vad heter du", "Enigma", context="historik A")
+    assert cache.get("Vad heter du?", context="historik A") == ("Enigma", None)
+    assert cache.get("vad heter du", context="historik B") is None
+    assert cache.get("vad heter du") is None
+
+
+def test_tool_answer_ignores_the_conversation(cache):
+    cache.put("vem är statsminister", "Ulf Kristersson", tool="search_web", context="historik A")
+    assert cache.get("vem är statsminister", context="historik B") == ("Ulf Kristersson", "search_web")
+    assert cache.get("vem är statsminister") == ("Ulf Kristersson", "search_web")
+
+
+def test_plain_answer_from_empty_history_is_not_a_tool_answer(cache):
+    cache.put("vad heter du", "Enigma")
+    cache.put("vem är statsminister", "Ulf Kristersson", tool="search_web")
+    assert cache.get("vad heter du", context=response_cache.TOOL_CONTEXT) is None
+    assert cache.get("vad heter du") == ("Enigma", None)
+
+
+@pytest.mark.parametrize("tool", ["get_current_time", "open_application", "play_music", "okänt_verktyg"])
+def test_actions_and_time_are_never_cached(cache, tool):
+    cache.put("gör något", "klart", tool=tool)
+    assert cache.get("gör något") is None
+
+
+def test_ttls(cache, clock):
+    cache.put("vad heter du", "Enigma")
+    cache.put("vem är statsminister", "Ulf Kristersson", tool="search_web")
+
+    clock[0] += TOOL_TTL["search_web"] - 1
+    assert cache.get("vem är statsminister") is not None
+    clock[0] += 2
+    assert cache.get("vem är statsminister") is None
+    assert cache.get("vad heter du") is not None
+
+    clock[0] += PLAIN_ANSWER_TTL
+    assert cache.get("vad heter du") is None
+    assert cache.stats["expired"] == 2
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = ResponseCache(max_entries=2, embed_model=None)
+    cache.put("ett", "1")
+    cache.put("två", "2")
+    cache.get("ett")
+    cache.put("tre", "3")
+    assert cache.get("två") is None
+    assert cache.get("ett") == ("1", None)
+    assert cache.get("tre") == ("3", None)
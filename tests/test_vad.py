@@ -0,0 +1,77 @@
+import numpy as np
+from vad import Endpointer, frame_rms, SPEECH_START_S, DEFAULT_HANGOVER_S, NOISE_WINDOW_S
+
+FRAME_S = 0.03
+FRAME = int(16000 * FRAME_S)
+
+
+def frame(level):
+    return np.full(FRAME, level, dtype=np.int16)
+
+
+def feed(endpointer, level, seconds):
+    return [endpointer.process(frame(level))[0] for _ in range(round(seconds / FRAME_S))]
+
+
+def test_frame_rms_accepts_bytes_and_arrays():
+    assert frame_rms(frame(1000)) == frame_rms(frame(1000).tobytes()) == 1000.0
+    assert frame_rms(b"") == 0.0
+
+
+def test_short_click_does_not_start():
+    endpointer = Endpointer(FRAME_S)
+    assert feed(endpointer, 3000, FRAME_S) == ["silence"]
+    assert set(feed(endpointer, 20, 0.5)) == {"silence"}
+    assert not endpointer.in_speech
+
+
+def test_start_and_end():
+    endpointer = Endpointer(FRAME_S)
+    events = feed(endpointer, 20, 0.3) + feed(endpointer, 3000, 0.6)
+    assert events.index("start") == 10 + round(SPEECH_START_S / FRAME_S) - 1
+    events = feed(endpointer, 20, 1.0)
+    assert "end" in events
+    assert events.index("end") + 1 == round(DEFAULT_HANGOVER_S / FRAME_S)
+
+
+def test_hangover_follows_short_pauses():
+    endpointer = Endpointer(FRAME_S, max_hangover=0.8)
+    feed(endpointer, 3000, 0.3)
+    for _ in range(3):
+        feed(endpointer, 20, 0.12)
+        feed(endpointer, 3000, 0.3)
+    assert endpointer.hangover < DEFAULT_HANGOVER_S
+
+
+def test_noise_floor_follows_a_louder_room():
+    endpointer = Endpointer(FRAME_S, energy_threshold=300)
+    before = endpointer.threshold
+    feed(endpointer, 200, 5.0)
+    assert endpointer.threshold > before
+    assert not endpointer.in_speech
+
+
+def test_steady_noise_above_the_threshold_ends_the_utterance():
+    # a fan turning on right after the speech: louder than the threshold, but steady
+    endpointer = Endpointer(FRAME_S)
+    events = feed(endpointer, 20, 0.5) + feed(endpointer, 3000, 1.0) + feed(endpointer, 400, 20.0)
+    assert "end" in events
+    assert events.index("end") * FRAME_S < 0.5 + 1.0 + NOISE_WINDOW_S + 1.0
+
+
+def test_speech_with_gaps_keeps_the_floor_down():
+    endpointer = Endpointer(FRAME_S, max_hangover=0.8)
+    feed(endpointer, 20, 0.5)
+    for _ in range(20):
+        assert "end" not in feed(endpointer, 3000, 0.3) + feed(endpointer, 20, 0.15)
+    assert endpointer.noise_floor < 100
+
+
+def test_utterance_is_cut_at_max_length():
+    endpointer = Endpointer(FRAME_S, max_utterance=5.0)
+    events = feed(endpointer, 20, 0.5)
+    for _ in range(25):
+        # words with short gaps: never enough silence for the hangover
+        events += feed(endpointer, 3000, 0.3) + feed(endpointer, 20, 0.09)
+    assert "end" in events
+    assert abs(events.index("end") * FRAME_S - (0.5 + SPEECH_START_S + 5.0)) < 2 * FRAME_S
@@ -0,0 +1,139 @@
+import asyncio
+import queue
+import threading
+import time
+import types
+import numpy as np
+import pytest
+
+# Voice imports playback, tts and whisper, the streaming logic needs none of them
+Voice = pytest.importorskip("Voice")
+
+FRAME_S = 0.03
+RATE = 16000
+CHUNK = int(RATE * FRAME_S)
+
+
+class FakeSource:
+    """Det listen_streaming läser: ramar med fast nivå enligt (nivå, sekunder), sedan slut."""
+
+    def __init__(self, *parts):
+        self.CHUNK = CHUNK
+        self.SAMPLE_RATE = RATE
+        self.SAMPLE_WIDTH = 2
+        frames = [np.full(CHUNK, level, dtype=np.int16).tobytes()
+                  for level, seconds in parts for _ in range(round(seconds / FRAME_S))]
+        self.stream = types.SimpleNamespace(read=lambda size: frames.pop(0) if frames else b"")
+
+
+def talk(seconds):
+    """Tal med korta glapp mellan orden, som riktigt tal (en jämn ton räknas som brus)."""
+    return [(3000, 0.3), (20, 0.09)] * round(seconds / 0.39)
+
+
+@pytest.fixture
+def transcribed(monkeypatch):
+    """
+    Byter Whisper mot en som svarar 'del 1', 'del 2', ... på bitar med tal
+    (och inget på tystnad, som Whisper) och sparar talbitarnas längd i sekunder.
+    """
+    lengths = []
+
+    def transcribe(samples, prompt=None, **kwargs):
+        if np.abs(samples).max() < 0.05:
+            return ""
+        lengths.append(len(samples) / RATE)
+        return f"del {len(lengths)}"
+
+    monkeypatch.setattr(Voice, "transcribe_audio", transcribe)
+    return lengths
+
+
+def listen(source, **kwargs):
+    recognizer = types.SimpleNamespace(energy_threshold=300, pause_threshold=0.6)
+    partials = []
+    text = Voice.listen_streaming(recognizer, source, on_partial=partials.append, **kwargs)
+    return text, partials
+
+
+def test_pause_cuts_a_chunk(transcribed):
+    source = FakeSource((20, 1.0), (3000, 1.5), (20, 0.3), (3000, 1.2), (20, 1.0))
+    text, partials = listen(source)
+
+    assert text == "del 1 del 2"
+    assert partials == ["del 1", "del 1 del 2"]
+    # the first chunk ends inside the pause, after STREAM_CHUNK_PAUSE of it
+    assert 1.5 + Voice.STREAM_CHUNK_PAUSE <= transcribed[0] <= 1.5 + 0.3 + Voice.UTTERANCE_PRE_ROLL + 0.1
+
+
+def test_short_pause_does_not_cut_before_min_chunk(transcribed):
+    # pre-roll, speech and pause together stay under STREAM_MIN_CHUNK
+    source = FakeSource((20, 1.0), (3000, 0.2), (20, 0.3), (3000, 1.2), (20, 1.0))
+    text, partials = listen(source)
+    assert text == "del 1"
+    assert partials == ["del 1"]
+
+
+def test_long_run_is_cut_at_max_chunk(transcribed):
+    source = FakeSource((20, 1.0), *talk(9.0), (20, 1.0))
+    text, partials = listen(source)
+
+    assert len(transcribed) == 3
+    assert all(length <= Voice.STREAM_MAX_CHUNK + FRAME_S for length in transcribed)
+    assert partials[-1] == text == "del 1 del 2 del 3"
+
+
+def test_silence_gives_nothing(transcribed):
+    text, partials = listen(FakeSource((20, 2.0)), timeout=1.0)
+    assert text is None
+    assert partials == []
+    assert transcribed == []
+
+
+@pytest.fixture
+def spotted(monkeypatch):
+    """Byter spottern mot en som hör vakna-ordet i bit nummer found_in (räknat från 1)."""
+    lengths = []
+    found_in = [None]
+
+    def spot(samples, wake_word, sample_rate=RATE, **kwargs):
+        lengths.append(len(samples) / sample_rate)
+        found = len(lengths) == found_in[0]
+        return found, f"{wake_word} hörd" if found else "prat"
+
+    monkeypatch.setattr(Voice, "spot_wake_word", spot)
+    monkeypatch.setattr(Voice, "WAKE_WINDOW_S", None)
+    spot.lengths, spot.found_in = lengths, found_in
+    return spot
+
+
+def test_spotter_sees_each_chunk_once_plus_overlap(transcribed, spotted):
+    source = FakeSource((20, 1.0), *talk(17.0), (20, 1.0))
+    text, partials = listen(source, wake_word="enigma")
+
+    assert text is None
+    assert partials == []
+    assert transcribed == []
+    # the cost per chunk stays flat however long the chatter goes on
+    assert len(spotted.lengths) >= 5
+    assert max(spotted.lengths) <= Voice.STREAM_MAX_CHUNK + Voice.STREAM_WAKE_OVERLAP + FRAME_S
+
+
+def test_held_chunks_are_transcribed_once_the_wake_word_is_heard(transcribed, spotted):
+    spotted.found_in[0] = 2
+    source = FakeSource((20, 1.0), *talk(9.0), (20, 1.0))
+    text, partials = listen(source, wake_word="enigma")
+
+    assert text == "del 1 del 2 del 3"
+    assert len(spotted.lengths) == 2
+
+
+def test_cancel_stops_a_stream_that_waits_for_the_llm():
+    sentences = queue.Queue()  # the llm hasn't written a sentence yet
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+
+    t_start = time.perf_counter()
+    stats = asyncio.run(Voice.generate_speech_stream(sentences, cancel))
+    assert time.perf_counter() - t_start < 0.2 + 10 * Voice.CANCEL_POLL_S
+    assert stats["sentences"] == 0
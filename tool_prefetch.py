@@ -0,0 +1,135 @@
+"""
+Spekulativ start av verktyg medan LLM:en fortfarande väljer.
+
+För faktafrågor väntar agenten annars först på att modellen ska skriva
+sitt search_web-anrop, sedan på sökningen och sist på analysen. Här
+gissar en billig klassificerare vilket verktyg frågan leder till, och
+verktyget startas direkt, parallellt med LLM-anropet. Väljer modellen
+samma verktyg (och ungefär samma sökning) används resultatet, annars
+slängs det. Bara verktyg utan sidoeffekter får startas så här.
+"""
+import atexit
+import re
+import threading
+import time
+
+# only tools that are safe to run for nothing
+SPECULATIVE_TOOLS = {"search_web", "get_current_time", "describe_screen"}
+QUERY_OVERLAP = 0.4  # share of words the llm's search query must have in common with the guess
+
+SCREEN = re.compile(r"\b(vad ser du|vad är det på skärmen|vad visas på skärmen|beskriv skärmen|vad har jag framför mig)\b")
+TIME = re.compile(r"\b(klockan|vilken tid|vilket datum|vilken dag är det|vad är det för dag)\b")
+SEARCH_COMMAND = re.compile(r"^(sök|googla|kolla upp|leta upp)( efter| på| om)?\s+(?P<query>.+)")
+QUESTION = re.compile(r"^(vem|vilka|vilken|vilket|vad|när|var|hur många|hur mycket|hur gammal)\b")
+# things that change or that the model can't know: the prompt sends these to search_web
+CURRENT = re.compile(r"\b(statsminister|president|regering|minister|kung|drottning|nyheter|nyhet|senaste|"
+                     r"just nu|idag|i dag|aktuell|aktuella|vann|valet|kurs|pris|väder|vädret|ledare|vd)\b")
+FILLER = re.compile(r"^(hej\s+)?(enigma[\s,.!?]+)?((kan|skulle) du\s+)?")
+
+
+def normalize(text):
+    text = FILLER.sub("", text.lower().strip())
+    return re.sub(r"[^\w\s]", " ", text).strip()
+
+
+def words(text):
+    return set(re.findall(r"\w{3,}", text.lower()))
+
+
+def predict(user_text):
+    """(verktyg, argument) som frågan troligen leder till, eller None. Bara mönster, ingen modell."""
+    text = normalize(user_text)
+    if SCREEN.search(text):
+        return "describe_screen", {}
+    if TIME.search(text) and not CURRENT.search(text):
+        return "get_current_time", {}
+    match = SEARCH_COMMAND.match(text)
+    if match:
+        return "search_web", {"query": match.group("query")}
+    if QUESTION.match(text) and CURRENT.search(text):
+        return "search_web", {"query": text}
+    return None
+
+
+def same_call(predicted, tool_name, args):
+    """Kan resultatet av gissningen användas för modellens anrop?"""
+    if predicted[0] != tool_name:
+        return False
+    if tool_name != "search_web":
+        return True
+    guessed, wanted = words(predicted[1].get("query", "")), words(str((args or {}).get("query", "")))
+    if not guessed or not wanted:
+        return False
+    return len(guessed & wanted) / len(wanted) >= QUERY_OVERLAP
+
+
+class PrefetchStats:
+    """Hur ofta gissningen stämde, och hur mycket av verktygets tid som redan var avklarad när den behövdes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = {}    # tool -> count
+        self.used = {}       # tool -> count
+        self.saved_ms = {}   # tool -> summed time the tool had been running when the llm asked for it
+
+    def record_start(self, tool):
+        with self.lock:
+            self.started[tool] = self.started.get(tool, 0) + 1
+
+    def record_use(self, tool, saved_ms):
+        with self.lock:
+            self.used[tool] = self.used.get(tool, 0) + 1
+            self.saved_ms[tool] = self.saved_ms.get(tool, 0.0) + saved_ms
+
+    def summary(self):
+        with self.lock:
+            if not self.started:
+                return ""
+            parts = []
+            for tool, started in self.started.items():
+                used = self.used.get(tool, 0)
+                saved = self.saved_ms.get(tool, 0.0) / used if used else 0.0
+                parts.append(f"{tool} {used}/{started} used, ~{saved:.0f} ms saved each")
+        return "Tool prefetch: " + ", ".join(parts)
+
+
+prefetch_stats = PrefetchStats()
+atexit.register(lambda: prefetch_stats.summary() and print(prefetch_stats.summary(), flush=True))
+
+
+class Speculation:
+    """
+    Ett spekulativt verktygsanrop. run(verktyg, argument) körs i executor direkt;
+    take() ger dess Future om modellen bekräftar gissningen, annars None.
+    """
+    def __init__(self, predicted, run, executor):
+        self.predicted = predicted
+        self.t_start = time.perf_counter()
+        self.t_done = None
+        self.taken = False
+        prefetch_stats.record_start(predicted[0])
+        print(f"DEBUG: Prefetching {predicted[0]}({predicted[1]}) while the LLM decides", flush=True)
+        self.future = executor.submit(run, *predicted)
+        self.future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self.t_done = time.perf_counter()
+
+    def take(self, tool_name, args):
+        if self.taken or not same_call(self.predicted, tool_name, args):
+            return None
+        self.taken = True
+        now = time.perf_counter()
+        # done already: all of it was saved. still running: the part that overlapped the llm call
+        saved = ((self.t_done or now) - self.t_start) * 1000
+        prefetch_stats.record_use(tool_name, saved)
+        print(f"DEBUG: Prefetched {tool_name} confirmed by the LLM (~{saved:.0f} ms saved)", flush=True)
+        return self.future
+
+
+def speculate(user_text, tool_map, run, executor):
+    """Startar det gissade verktyget om det finns och är säkert att köra i onödan. Annars None."""
+    predicted = predict(user_text)
+    if predicted is None or predicted[0] not in SPECULATIVE_TOOLS or predicted[0] not in tool_map:
+        return None
+    return Speculation(predicted, run, executor)
@@ -2,8 +2,7 @@ from langchain_core.tools import tool
 import pyautogui
 import time
 import pyperclip
-from langchain_ollama import ChatOllama
-from config import MODEL_NAME
+from llm_clients import get_llm
 
 @tool
 def improve_active_document(instruction: str):
@@ -28,7 +27,7 @@ def improve_active_document(instruction: str):
             return "Kunde inte hitta text i det aktiva fönstret."
 
         # Improve with AI
-        llm = ChatOllama(model=MODEL_NAME, temperature=0.1)
+        llm = get_llm("editor")
         
         prompt = f"""Du är en expertkorrekturläsare som förbättrar text.
 
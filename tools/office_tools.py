@@ -3,8 +3,7 @@ import time
 import warnings
 from langchain_core.tools import tool
 from docx import Document
-from langchain_ollama import ChatOllama
-from config import MODEL_NAME
+from llm_clients import get_llm
 from ddgs import DDGS
 import wikipedia
 
@@ -177,7 +176,7 @@ def create_research_document(topic: str, filename: str = "Forskning"):
         print(f"DEBUG: Hittade information, sammanfattar...", flush=True)
         
         # Summarize with AI
-        llm = ChatOllama(model=MODEL_NAME, temperature=0.3)
+        llm = get_llm("summarizer")
         
         summary_prompt = f"""Du är en expert på att sammanfatta information. 
         
@@ -0,0 +1,157 @@
+"""
+Transkriberar många inspelningar på en gång, utan mikrofon.
+
+Indata är en mapp (letas igenom rekursivt) eller en manifestfil med en
+sökväg per rad. Filerna fördelas på flera processer som laddar Whisper en
+gång var. Varje resultat skrivs direkt som en rad i en JSONL-fil, och en
+avbruten körning fortsätter där den slutade (filer som redan finns i
+utfilen hoppas över, fel görs om).
+
+    python -m transcribe_batch inspelningar/ --out transkript.jsonl
+    python -m transcribe_batch lista.txt --out transkript.jsonl --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from faster_whisper import WhisperModel, decode_audio
+from whisper_setup import resolve_whisper_config
+
+AUDIO_EXTENSIONS = (".wav", ".m4a", ".mp3", ".flac", ".ogg", ".opus", ".webm")
+SAMPLE_RATE = 16000
+
+_model = None
+_beam_size = 1
+
+
+def find_audio(source):
+    """Ljudfilerna att transkribera, från en mapp eller en manifestfil (en sökväg per rad)."""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding="utf-8") as f:
+            lines = [line.strip() for line in f]
+        paths = [p if os.path.isabs(p) else os.path.join(base, p) for p in lines if p and not p.startswith("#")]
+    return [os.path.abspath(p) for p in paths]
+
+
+def load_done(out_path):
+    """Sökvägar som redan har ett lyckat resultat i utfilen."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # half-written line from an interrupted run
+            if "text" in record:
+                done.add(record["path"])
+    return done
+
+
+def _init_worker(cfg, beam_size):
+    # runs once per process: every file this worker gets reuses the same model
+    global _model, _beam_size
+    _model = WhisperModel(cfg["size"], device=cfg["device"], compute_type=cfg["compute_type"],
+                          cpu_threads=cfg["cpu_threads"], num_workers=1)
+    _beam_size = beam_size
+
+
+def _transcribe_file(path):
+    t_start = time.perf_counter()
+    try:
+        samples = decode_audio(path, sampling_rate=SAMPLE_RATE)
+        segments, info = _model.transcribe(samples, language="sv", beam_size=_beam_size)
+        segments = [{"start": round(s.start, 2), "end": round(s.end, 2), "text": s.text.strip()} for s in segments]
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+    return {
+        "path": path,
+        "text": " ".join(s["text"] for s in segments).strip(),
+        "audio_s": round(len(samples) / SAMPLE_RATE, 2),
+        "seconds": round(time.perf_counter() - t_start, 2),
+        "segments": segments,
+    }
+
+
+def plan_workers(cfg, workers=None):
+    """
+    (processer, trådar per process). På CPU delas kärnorna jämnt så att
+    processerna inte slåss om dem; en GPU delas inte mellan processer.
+    """
+    if cfg["device"] == "cuda":
+        return workers or 1, cfg["cpu_threads"]
+    cores = os.cpu_count() or 1
+    # a couple of threads per process scales better than one process with all cores
+    workers = workers or max(1, cores // 2)
+    return workers, max(1, cores // workers)
+
+
+def transcribe_batch(paths, out_path, workers=None, beam_size=1):
+    """Transkriberar filerna som inte redan finns i out_path och lägger till resultaten där."""
+    done = load_done(out_path)
+    pending = [p for p in paths if p not in done]
+    print(f"{len(paths)} filer, {len(paths) - len(pending)} redan klara, {len(pending)} kvar", flush=True)
+    if not pending:
+        return
+
+    cfg = resolve_whisper_config()
+    workers, cfg["cpu_threads"] = plan_workers(cfg, workers)
+    workers = min(workers, len(pending))
+    print(f"Whisper {cfg['size']} ({cfg['compute_type']}, {cfg['device']}): "
+          f"{workers} processer x {cfg['cpu_threads']} trådar", flush=True)
+
+    # an interrupted run may have left a line without newline, don't glue onto it
+    if os.path.exists(out_path) and os.path.getsize(out_path) > 0:
+        with open(out_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    t_start = time.perf_counter()
+    audio_total = 0.0
+    failed = 0
+    ctx = multiprocessing.get_context("spawn")
+    with open(out_path, "a", encoding="utf-8") as out, \
+         ctx.Pool(workers, initializer=_init_worker, initargs=(cfg, beam_size)) as pool:
+        if needs_newline:
+            out.write("\n")
+        # unordered: a long recording doesn't hold back the results behind it
+        for i, record in enumerate(pool.imap_unordered(_transcribe_file, pending), 1):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if "error" in record:
+                failed += 1
+                print(f"[{i}/{len(pending)}] FEL {record['path']}: {record['error']}", flush=True)
+            else:
+                audio_total += record["audio_s"]
+                print(f"[{i}/{len(pending)}] {os.path.basename(record['path'])} "
+                      f"({record['audio_s']:.0f} s ljud, {record['seconds']:.1f} s)", flush=True)
+
+    wall = time.perf_counter() - t_start
+    print(f"Klart: {len(pending) - failed} filer, {failed} fel, {audio_total / 60:.1f} min ljud på "
+          f"{wall / 60:.1f} min ({audio_total / max(wall, 1e-9):.1f}x realtid)", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transkribera många ljudfiler parallellt")
+    parser.add_argument("source", help="Mapp med ljudfiler eller manifest med en sökväg per rad")
+    parser.add_argument("--out", default="transkript.jsonl", help="JSONL-fil som resultaten läggs till i")
+    parser.add_argument("--workers", type=int, default=None, help="Antal processer (standard: hälften av kärnorna)")
+    parser.add_argument("--beam-size", type=int, default=1)
+    args = parser.parse_args()
+    transcribe_batch(find_audio(args.source), args.out, workers=args.workers, beam_size=args.beam_size)
+
+
+if __name__ == "__main__":
+    main()
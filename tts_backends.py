@@ -0,0 +1,183 @@
+"""
+Talsyntes bakom ett gemensamt gränssnitt.
+
+EdgeTTSBackend är molnrösten vi alltid har haft, PiperBackend en lokal svensk
+röst som fungerar helt offline. Vilken som används väljs automatiskt: alla
+tillgängliga backends provas med en kort fras och den snabbaste går först.
+Misslyckas den under körning flyttas den sist och nästa tar över.
+"""
+import abc
+import asyncio
+import concurrent.futures
+import io
+import os
+import threading
+import time
+import wave
+import edge_tts
+from config import TTS_BACKEND, PIPER_MODEL
+
+try:
+    from piper import PiperVoice
+    PIPER_AVAILABLE = True
+except:
+    PIPER_AVAILABLE = False
+    PiperVoice = None
+
+TTS_VOICE = "sv-SE-SofieNeural"
+TTS_RATE = "+10%"
+PROBE_TEXT = "Hej."
+PROBE_TIMEOUT_S = 5.0
+
+
+class TTSBackend(abc.ABC):
+    """Gränssnittet: synthesize(text) ger ljuddata som pygame kan spela (mp3 eller wav)."""
+    name = "base"
+    voice = ""
+    rate = ""
+
+    def available(self):
+        return True
+
+    async def warm_up(self):
+        """Engångskostnader (ladda en modell) innan något mäts eller spelas."""
+
+    @abc.abstractmethod
+    async def synthesize(self, text):
+        """Ljuddata för texten."""
+
+
+class EdgeTTSBackend(TTSBackend):
+    name = "edge"
+
+    def __init__(self, voice=TTS_VOICE, rate=TTS_RATE):
+        self.voice = voice
+        self.rate = rate
+
+    async def synthesize(self, text):
+        # streamed straight into memory, nothing is written to disk
+        communicate = edge_tts.Communicate(text, self.voice, rate=self.rate)
+        buffer = io.BytesIO()
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                buffer.write(chunk["data"])
+        return buffer.getvalue()
+
+
+class PiperBackend(TTSBackend):
+    """Lokal röst med Piper (t.ex. sv_SE-nst-medium.onnx), ingen nätverkstrafik."""
+    name = "piper"
+    rate = ""
+
+    def __init__(self, model_path=PIPER_MODEL):
+        if model_path and not os.path.isabs(model_path):
+            model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), model_path)
+        self.model_path = model_path
+        self.voice = os.path.basename(model_path or "")
+        self._voice = None
+        self._load_lock = threading.Lock()  # prewarm and playback may both be first
+
+    def available(self):
+        return PIPER_AVAILABLE and bool(self.model_path) and os.path.exists(self.model_path)
+
+    def _load(self):
+        with self._load_lock:
+            if self._voice is None:
+                self._voice = PiperVoice.load(self.model_path)
+        return self._voice
+
+    async def warm_up(self):
+        await asyncio.get_running_loop().run_in_executor(None, self._load)
+
+    def _synthesize_wav(self, text):
+        self._load()
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            # piper-tts >= 1.3 renamed synthesize(text, wav) to synthesize_wav
+            if hasattr(self._voice, "synthesize_wav"):
+                self._voice.synthesize_wav(text, wav_file)
+            else:
+                self._voice.synthesize(text, wav_file)
+        return buffer.getvalue()
+
+    async def synthesize(self, text):
+        # piper is cpu-bound and blocking, keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self._synthesize_wav, text)
+
+
+ALL_BACKENDS = [EdgeTTSBackend(), PiperBackend()]
+
+_ranked = None
+_ranking = None  # concurrent.futures.Future while the first caller measures
+_ranking_lock = threading.Lock()
+
+
+async def probe(backend, text=PROBE_TEXT):
+    """Tid till färdigt ljud för en kort fras, None om backend inte svarar. Laddningen räknas inte."""
+    try:
+        # a cold model load happens once, ranking on it would punish local voices
+        await backend.warm_up()
+    except Exception as e:
+        print(f"TTS: {backend.name} kunde inte laddas ({e})", flush=True)
+        return None
+    t_start = time.perf_counter()
+    try:
+        data = await asyncio.wait_for(backend.synthesize(text), PROBE_TIMEOUT_S)
+    except Exception as e:
+        print(f"TTS: {backend.name} svarar inte ({e})", flush=True)
+        return None
+    return time.perf_counter() - t_start if data else None
+
+
+async def ranked_backends():
+    """
+    Tillgängliga backends, snabbast först. Mäts första gången (eller styrs av
+    TTS_BACKEND i config.py). Anropas den från flera trådar samtidigt (förvärmning
+    och uppspelning har egna event-loopar) mäter bara den första, de andra väntar.
+    """
+    global _ranking
+    with _ranking_lock:
+        if _ranked is not None:
+            return _ranked
+        first = _ranking is None
+        if first:
+            _ranking = concurrent.futures.Future()
+        ranking = _ranking
+    if not first:
+        await asyncio.wrap_future(ranking)
+        return _ranked
+    try:
+        await _rank()
+    except BaseException as e:
+        with _ranking_lock:
+            _ranking = None  # the next caller tries again
+        ranking.set_exception(e)
+        raise
+    ranking.set_result(None)
+    return _ranked
+
+
+async def _rank():
+    """Mäter (eller läser TTS_BACKEND) och sparar ordningen i _ranked."""
+    global _ranked
+    candidates = [b for b in ALL_BACKENDS if b.available()]
+    if TTS_BACKEND:
+        forced = [b for b in candidates if b.name == TTS_BACKEND]
+        ranked = forced + [b for b in candidates if b.name != TTS_BACKEND]
+    else:
+        latencies = await asyncio.gather(*(probe(b) for b in candidates))
+        measured = sorted((lat, i) for i, lat in enumerate(latencies) if lat is not None)
+        ranked = [candidates[i] for _, i in measured] + [b for b, lat in zip(candidates, latencies) if lat is None]
+        summary = ", ".join(f"{candidates[i].name} {lat * 1000:.0f} ms" for lat, i in measured) or "ingen svarade"
+        print(f"TTS: {summary}", flush=True)
+    _ranked = ranked or [ALL_BACKENDS[0]]
+    print(f"TTS: använder {_ranked[0].name}", flush=True)
+    return _ranked
+
+
+def demote(backend):
+    """Flyttar en backend som just misslyckades sist i listan."""
+    global _ranked
+    if _ranked and backend in _ranked and len(_ranked) > 1:
+        _ranked = [b for b in _ranked if b is not backend] + [backend]
+        print(f"TTS: {backend.name} misslyckades, byter till {_ranked[0].name}", flush=True)
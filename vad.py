@@ -0,0 +1,115 @@
+from collections import deque
+import numpy as np
+
+# frame-level endpointing: an adaptive noise floor decides what is speech, and the
+# silence needed to end an utterance follows how long this speaker's own pauses are
+NOISE_RATIO = 2.5            # speech must be this many times louder than the noise floor
+MIN_THRESHOLD = 100          # never go below this (int16 rms), digital silence is not a floor
+NOISE_ADAPT_UP = 0.02        # the floor creeps up slowly when the room gets louder...
+NOISE_ADAPT_DOWN = 0.2       # ...and follows quickly when it gets quieter
+SPEECH_START_S = 0.09        # this much continuous speech starts an utterance (no clicks)
+MIN_HANGOVER_S = 0.25
+DEFAULT_HANGOVER_S = 0.5     # used until the speaker has made a few pauses
+HANGOVER_PAUSE_FACTOR = 1.5  # end after 1.5x the speaker's typical pause
+HANGOVER_MARGIN_S = 0.1
+# steady noise louder than the threshold (a fan starting) would count as speech forever:
+# the floor is also pulled up to a low percentile of the last NOISE_WINDOW_S, speech or not.
+# speech has quiet gaps between words, so its low percentile stays near the real floor
+NOISE_WINDOW_S = 4.0
+NOISE_PERCENTILE = 10
+MAX_UTTERANCE_S = 30.0       # an utterance is cut here whatever the energy says
+
+
+def frame_rms(pcm):
+    """RMS för en ram med 16-bitars PCM (bytes eller int16-array)."""
+    samples = np.frombuffer(pcm, dtype=np.int16) if isinstance(pcm, (bytes, bytearray)) else pcm
+    if len(samples) == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(samples.astype(np.float32) ** 2)))
+
+
+class Endpointer:
+    """
+    Avgör ram för ram när en fras börjar och slutar.
+
+    Brusgolvet följer rummet: tystnaden mellan orden, och en låg percentil
+    av de senaste sekunderna så att ett jämnt brus som plötsligt ligger över
+    tröskeln (en fläkt som startar) inte räknas som tal för alltid.
+    Efterhänget anpassas efter talarens egna pauser inne i frasen: den som
+    pratar snabbt med korta pauser får ett kortare slut, aldrig längre än
+    max_hangover.
+    """
+
+    def __init__(self, frame_s, energy_threshold=300, max_hangover=0.8, max_utterance=MAX_UTTERANCE_S):
+        self.frame_s = frame_s
+        self.max_hangover = max(MIN_HANGOVER_S, max_hangover)
+        self.max_utterance = max_utterance
+        # a calibrated recognizer threshold sits somewhat above the noise, start the floor from it
+        self.noise_floor = max(1.0, energy_threshold / NOISE_RATIO)
+        self.recent_rms = deque(maxlen=max(1, int(NOISE_WINDOW_S / frame_s)))
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.speech_run_s = 0.0
+        self.silence_s = 0.0
+        self.utterance_s = 0.0
+        self.pauses = []
+        self.ended = False
+
+    @property
+    def threshold(self):
+        return max(MIN_THRESHOLD, self.noise_floor * NOISE_RATIO)
+
+    @property
+    def hangover(self):
+        """Hur lång tystnad som avslutar frasen just nu."""
+        if len(self.pauses) < 2:
+            return min(DEFAULT_HANGOVER_S, self.max_hangover)
+        typical = float(np.percentile(self.pauses, 75))
+        return min(self.max_hangover, max(MIN_HANGOVER_S, typical * HANGOVER_PAUSE_FACTOR + HANGOVER_MARGIN_S))
+
+    def is_speech(self, pcm):
+        """Tal i ramen? Uppdaterar brusgolvet när svaret är nej."""
+        rms = frame_rms(pcm)
+        self.recent_rms.append(rms)
+        if len(self.recent_rms) == self.recent_rms.maxlen:
+            # no quiet frame in the whole window: that's the room now, not speech
+            self.noise_floor = max(self.noise_floor, float(np.percentile(self.recent_rms, NOISE_PERCENTILE)))
+        speech = rms >= self.threshold
+        if not speech:
+            rate = NOISE_ADAPT_UP if rms > self.noise_floor else NOISE_ADAPT_DOWN
+            self.noise_floor += rate * (rms - self.noise_floor)
+            self.noise_floor = max(1.0, self.noise_floor)
+        return speech
+
+    def process(self, pcm):
+        """
+        Matar in en ram. Returnerar ("silence" | "start" | "speech" | "end", tal_i_ramen).
+        "start" betyder att frasen började för SPEECH_START_S sedan. En fras
+        längre än max_utterance sekunder avslutas oavsett ljudet.
+        """
+        speech = self.is_speech(pcm)
+        if not self.in_speech:
+            self.speech_run_s = self.speech_run_s + self.frame_s if speech else 0.0
+            if self.speech_run_s >= SPEECH_START_S:
+                self.in_speech = True
+                return "start", speech
+            return "silence", speech
+
+        self.utterance_s += self.frame_s
+        if self.max_utterance and self.utterance_s >= self.max_utterance:
+            self.ended = True
+            return "end", speech
+        if speech:
+            if self.silence_s >= self.frame_s * 2:
+                # a pause inside the phrase, that's how this speaker breathes
+                self.pauses.append(self.silence_s)
+            self.silence_s = 0.0
+            return "speech", speech
+
+        self.silence_s += self.frame_s
+        if self.silence_s >= self.hangover:
+            self.ended = True
+            return "end", speech
+        return "speech", speech
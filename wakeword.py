@@ -0,0 +1,50 @@
+import difflib
+import re
+import threading
+from faster_whisper import WhisperModel
+from config import WAKE_WINDOW_S
+
+# stage 1 of the wake word check: a tiny int8 whisper on cpu. the big model only runs when
+# this one thinks it heard "enigma". WAKE_WINDOW_S in config.py limits it to the start.
+WAKE_WORD = "enigma"
+SPOTTER_SIZE = "tiny"
+SPOTTER_THREADS = 2
+MATCH_RATIO = 0.7     # tiny spells it "Enigma", "Änigma", "En igma"... accept close matches
+
+_spotter_model = None
+_spotter_lock = threading.Lock()
+
+
+def get_spotter_model():
+    """Laddar den lilla spotter-modellen första gången den behövs."""
+    global _spotter_model
+    with _spotter_lock:
+        if _spotter_model is None:
+            print(f"Laddar wake word-spotter (whisper {SPOTTER_SIZE}, int8)...", flush=True)
+            _spotter_model = WhisperModel(SPOTTER_SIZE, device="cpu", compute_type="int8", cpu_threads=SPOTTER_THREADS)
+    return _spotter_model
+
+
+def matches_wake_word(text, wake_word=WAKE_WORD):
+    """True om något ord (eller två ord ihopslagna) liknar vakna-ordet."""
+    words = re.findall(r"\w+", text.lower())
+    candidates = words + [a + b for a, b in zip(words, words[1:])]
+    return any(difflib.SequenceMatcher(None, w, wake_word).ratio() >= MATCH_RATIO for w in candidates)
+
+
+def spot_wake_word(samples, wake_word=WAKE_WORD, sample_rate=16000, window_s=WAKE_WINDOW_S):
+    """
+    Billig första kontroll på 16 kHz float32-ljud, de första window_s sekunderna
+    (None = allt). Returnerar (hittad, text) där text är vad tiny-modellen hörde.
+    """
+    window = samples if window_s is None else samples[:int(window_s * sample_rate)]
+    # no initial_prompt with the wake word: it makes tiny write "Enigma" for anything close
+    segments, info = get_spotter_model().transcribe(
+        window,
+        language="sv",
+        beam_size=1,
+        without_timestamps=True,
+        condition_on_previous_text=False,
+    )
+    text = "".join([segment.text for segment in segments]).strip()
+    return matches_wake_word(text, wake_word), text
@@ -0,0 +1,169 @@
+"""
+Väljer Whisper-modell och trådinställningar för den här datorn.
+
+På en dator utan GPU körs en engångskalibrering: varje kandidat
+(storlek x compute type x cpu_threads x num_workers) transkriberar ett
+referensklipp, och den största modellen vars tid per yttrande klarar
+WHISPER_RTF_TARGET sparas i whisper_calibration.json. Allt kan skrivas över i config.py.
+
+    python -m whisper_setup --recalibrate
+"""
+import argparse
+import json
+import os
+import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
+from faster_whisper import WhisperModel, decode_audio
+from config import (WHISPER_SIZE, WHISPER_DEVICE, WHISPER_COMPUTE_TYPE,
+                    WHISPER_CPU_THREADS, WHISPER_NUM_WORKERS, WHISPER_RTF_TARGET)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CALIBRATION_FILE = os.path.join(BASE_DIR, "whisper_calibration.json")
+REFERENCE_CLIP = os.path.join(BASE_DIR, "voicetest", "temp_test.wav")
+# bumped when the measurement changes, older calibration files are redone
+CALIBRATION_VERSION = 2
+
+# smallest first, so calibration can stop as soon as a size is too slow
+CANDIDATE_SIZES = ["tiny", "base", "small", "medium"]
+CANDIDATE_COMPUTE_TYPES = ["int8", "int8_float32"]
+
+# what we ran before calibration existed: medium is kinda 2-3x faster than
+# large-v3 but understands swedish almost as good, float16 is standard for rtx cards
+GPU_DEFAULT = {"size": "medium", "device": "cuda", "compute_type": "float16", "cpu_threads": 0, "num_workers": 1}
+CPU_DEFAULT = {"size": "medium", "device": "cpu", "compute_type": "int8", "cpu_threads": 0, "num_workers": 1}
+
+
+def cuda_available():
+    try:
+        import ctranslate2
+        return ctranslate2.get_cuda_device_count() > 0
+    except Exception:
+        return False
+
+
+def hardware_fingerprint():
+    """Identifierar datorn så att en kalibrering inte återanvänds på annan hårdvara."""
+    return f"{platform.system()}|{platform.machine()}|{platform.processor()}|{os.cpu_count()}"
+
+
+def thread_candidates():
+    cores = os.cpu_count() or 4
+    return sorted({max(1, cores // 2), cores})
+
+
+def worker_candidates():
+    # num_workers only helps when several transcriptions run at once (stream worker + listen)
+    return [1, 2] if (os.cpu_count() or 1) >= 4 else [1]
+
+
+def _transcribe(model, samples):
+    segments, info = model.transcribe(samples, language="sv", beam_size=1)
+    return "".join([segment.text for segment in segments])
+
+
+def measure_rtf(size, compute_type, cpu_threads, num_workers, samples):
+    """
+    Real-time factor för ett yttrande (dess beräkningstid / ljudtid), efter en
+    uppvärmning. Med num_workers > 1 körs lika många samtidigt och det långsammaste
+    räknas: det är latensen användaren får, inte den sammanlagda genomströmningen.
+    """
+    model = WhisperModel(size, device="cpu", compute_type=compute_type,
+                         cpu_threads=cpu_threads, num_workers=num_workers)
+    _transcribe(model, samples)
+
+    def timed(_):
+        t_start = time.perf_counter()
+        _transcribe(model, samples)
+        return time.perf_counter() - t_start
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        latencies = list(pool.map(timed, range(num_workers)))
+    return max(latencies) / (len(samples) / 16000)
+
+
+def calibrate(target_rtf=WHISPER_RTF_TARGET, clip=REFERENCE_CLIP):
+    """Provar kandidaterna och returnerar (bästa, alla resultat)."""
+    samples = decode_audio(clip, sampling_rate=16000)
+    results = []
+    best = None
+    for size in CANDIDATE_SIZES:
+        fastest = None
+        for compute_type in CANDIDATE_COMPUTE_TYPES:
+            for cpu_threads in thread_candidates():
+                for num_workers in worker_candidates():
+                    try:
+                        rtf = measure_rtf(size, compute_type, cpu_threads, num_workers, samples)
+                    except Exception as e:
+                        print(f"Kalibrering: {size}/{compute_type} misslyckades ({e})", flush=True)
+                        continue
+                    result = {"size": size, "device": "cpu", "compute_type": compute_type,
+                              "cpu_threads": cpu_threads, "num_workers": num_workers, "rtf": round(rtf, 3)}
+                    results.append(result)
+                    print(f"Kalibrering: {size:<7} {compute_type:<13} threads={cpu_threads:<3} workers={num_workers} RTF={rtf:.2f}", flush=True)
+                    if fastest is None or rtf < fastest["rtf"]:
+                        fastest = result
+        if fastest is None: continue
+        if fastest["rtf"] > target_rtf:
+            # a bigger model will only be slower
+            if best is None: best = fastest
+            break
+        best = fastest
+    return best, results
+
+
+def load_calibration():
+    try:
+        with open(CALIBRATION_FILE, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (cached.get("fingerprint") != hardware_fingerprint() or cached.get("target_rtf") != WHISPER_RTF_TARGET
+            or cached.get("version") != CALIBRATION_VERSION):
+        return None
+    return cached.get("best")
+
+
+def save_calibration(best, results):
+    data = {"fingerprint": hardware_fingerprint(), "target_rtf": WHISPER_RTF_TARGET, "version": CALIBRATION_VERSION,
+            "best": best, "results": results}
+    with open(CALIBRATION_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def resolve_whisper_config(recalibrate=False):
+    """
+    Inställningarna Whisper ska laddas med: GPU-standard om CUDA finns (och
+    WHISPER_DEVICE inte säger "cpu"), annars den sparade (eller nya)
+    kalibreringen. Värden i config.py vinner alltid.
+    """
+    use_gpu = WHISPER_DEVICE == "cuda" or (WHISPER_DEVICE is None and cuda_available())
+    if use_gpu:
+        base = dict(GPU_DEFAULT)
+    elif WHISPER_SIZE:
+        base = dict(CPU_DEFAULT)
+    else:
+        base = None if recalibrate else load_calibration()
+        if base is None and os.path.exists(REFERENCE_CLIP):
+            print(f"Kalibrerar Whisper för den här datorn (mål RTF {WHISPER_RTF_TARGET})...", flush=True)
+            base, results = calibrate()
+            if base:
+                save_calibration(base, results)
+        base = dict(base or CPU_DEFAULT)
+
+    overrides = {"size": WHISPER_SIZE, "device": WHISPER_DEVICE, "compute_type": WHISPER_COMPUTE_TYPE,
+                 "cpu_threads": WHISPER_CPU_THREADS, "num_workers": WHISPER_NUM_WORKERS}
+    base.update({k: v for k, v in overrides.items() if v is not None})
+    base.pop("rtf", None)
+    return base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kalibrera Whisper för den här datorn")
+    parser.add_argument("--recalibrate", action="store_true", help="Kör om även om en kalibrering finns")
+    args = parser.parse_args()
+    print(json.dumps(resolve_whisper_config(recalibrate=args.recalibrate), indent=2))
+
+
+if __name__ == "__main__":
+    main()